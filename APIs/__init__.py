@@ -1,2 +1,19 @@
 from . import api
 from . import trading_view
+from . import streams
+from . import exchange_info
+from . import ticker_board
+from . import intervals
+from . import candle_store
+from . import local_analysis
+from . import rate_limiter
+from . import user_stream
+from . import execution
+from . import notifications
+from . import supervisor
+from . import account
+from . import rolling
+from . import klines
+from . import resample
+from . import scanner
+from . import paper
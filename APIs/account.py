@@ -0,0 +1,188 @@
+import asyncio
+import logging
+
+from loader import get_client
+from APIs.rate_limiter import rate_limiter
+from APIs.ticker_board import ticker_board
+from APIs.user_stream import user_stream
+
+OPEN_ORDER_STATUSES = ('NEW', 'PARTIALLY_FILLED', 'PENDING_NEW')
+
+
+def _open_order(symbol, order_id, order_list_id, side, order_type, price, stop_price, orig_qty, executed_qty, status):
+    return {
+        'symbol': symbol,
+        'orderId': order_id,
+        'orderListId': order_list_id,
+        'side': side,
+        'type': order_type,
+        'price': float(price),
+        'stopPrice': float(stop_price),
+        'origQty': float(orig_qty),
+        'executedQty': float(executed_qty),
+        'status': status,
+    }
+
+
+class AccountState:
+    """
+    Balances and open orders of the account, kept in memory.
+
+    One REST snapshot is loaded after the user data stream is connected, then
+    outboundAccountPosition and executionReport events keep it current. Events older than
+    the snapshot are ignored. After a reconnect, when events may have been missed, the next
+    load() takes a new snapshot. Until the stream connects, every load() falls back to a
+    REST snapshot.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        # Asset: [free, locked]
+        self._balances = {}
+        self._open_orders = {}
+        self._updated = 0
+        self._live = False
+        self._reconnects = 0
+        # Set when the stream failed to connect, later loads do not wait for it
+        self._stream_failed = False
+        # Events received while a snapshot is loading, applied after it
+        self._buffer = None
+        self._lock = asyncio.Lock()
+        stream.add_handler('outboundAccountPosition', self._on_account_position)
+        stream.add_handler('executionReport', self._on_execution_report)
+        stream.add_reconnect_handler(self._on_reconnect)
+
+    def _on_reconnect(self):
+        self._live = False
+        self._reconnects += 1
+
+    def _on_account_position(self, event):
+        if self._buffer is not None:
+            self._buffer.append(event)
+            return
+        if event['u'] < self._updated:
+            return
+        self._updated = event['u']
+        for balance in event['B']:
+            self._balances[balance['a']] = [float(balance['f']), float(balance['l'])]
+
+    def _on_execution_report(self, event):
+        if self._buffer is not None:
+            self._buffer.append(event)
+            return
+        if event['X'] in OPEN_ORDER_STATUSES:
+            self._open_orders[event['i']] = _open_order(event['s'], event['i'], event['g'], event['S'], event['o'],
+                                                        event['p'], event['P'], event['q'], event['z'], event['X'])
+        else:
+            self._open_orders.pop(event['i'], None)
+
+    async def _snapshot(self):
+        client = await get_client()
+        self._buffer = []
+        try:
+            account = await rate_limiter.call('account', client.get_account)
+            orders = await rate_limiter.call('open_orders_all', client.get_open_orders)
+        except BaseException:
+            self._buffer = None
+            raise
+        self._updated = account.get('updateTime', 0)
+        self._balances = {balance['asset']: [float(balance['free']), float(balance['locked'])]
+                          for balance in account['balances']}
+        self._open_orders = {
+            order['orderId']: _open_order(order['symbol'], order['orderId'], order['orderListId'], order['side'],
+                                          order['type'], order['price'], order['stopPrice'], order['origQty'],
+                                          order['executedQty'], order['status'])
+            for order in orders
+        }
+        buffered, self._buffer = self._buffer, None
+        for event in buffered:
+            if event['e'] == 'outboundAccountPosition':
+                self._on_account_position(event)
+            else:
+                self._on_execution_report(event)
+
+    async def load(self):
+        """
+        Make sure the account state is loaded and followed by the user data stream.
+
+        Returns:
+            None
+        """
+        if self._live:
+            return
+        async with self._lock:
+            if self._live:
+                return
+            # Connect first, so no event after the snapshot is missed
+            self.stream.connect()
+            if not self.stream.connected and not self._stream_failed:
+                try:
+                    await asyncio.wait_for(self.stream.start(), 10)
+                except asyncio.TimeoutError:
+                    logging.warning('User data stream is not connected, balances are loaded over REST')
+                    self._stream_failed = True
+            live = self.stream.connected
+            if live:
+                self._stream_failed = False
+            reconnects = self._reconnects
+            await self._snapshot()
+            # A reconnect during the snapshot may have lost events after it
+            self._live = live and reconnects == self._reconnects
+
+    def balances(self, value_in_usdt=False):
+        """
+        Get the assets with a non-zero balance.
+
+        Args:
+            value_in_usdt (bool, optional): Add the USDT value of each asset, from the last
+                prices of the ticker board. Defaults to False.
+
+        Returns:
+            list: Dictionaries with 'asset', 'total_balance' and 'locked_balance' keys, and a
+                'usdt_value' key, None for assets without a USDT price, if value_in_usdt is set.
+        """
+        return balance_rows(self._balances, value_in_usdt)
+
+    def open_orders(self, symbol=None):
+        """
+        Get the open orders.
+
+        Args:
+            symbol (str, optional): Only the orders of this symbol. Defaults to every symbol.
+
+        Returns:
+            list: The open orders.
+        """
+        return [order for order in self._open_orders.values() if symbol is None or order['symbol'] == symbol]
+
+
+def balance_rows(balances, value_in_usdt=False):
+    """
+    Get the assets with a non-zero balance from free and locked balances.
+
+    Args:
+        balances (dict): Asset: (free, locked).
+        value_in_usdt (bool, optional): Add the USDT value of each asset, from the last prices
+            of the ticker board. Defaults to False.
+
+    Returns:
+        list: Dictionaries with 'asset', 'total_balance' and 'locked_balance' keys, and a
+            'usdt_value' key, None for assets without a USDT price, if value_in_usdt is set.
+    """
+    balance_data = []
+    for asset, (free_balance, locked_balance) in balances.items():
+        total_balance = free_balance + locked_balance
+        if total_balance > 0:
+            asset_data = {
+                'asset': asset,
+                'total_balance': total_balance,
+                'locked_balance': locked_balance
+            }
+            if value_in_usdt:
+                price = 1.0 if asset == 'USDT' else ticker_board.price(asset + 'USDT')
+                asset_data['usdt_value'] = None if price is None else total_balance * price
+            balance_data.append(asset_data)
+    return balance_data
+
+
+account_state = AccountState(user_stream)
@@ -1,12 +1,21 @@
-from binance.exceptions import BinanceAPIException
-from loader import client
-import pandas as pd
+from loader import ENTRY_SCOPE, EXIT_MODE
+from APIs.streams import price_feed
+from APIs.exchange_info import exchange_info
+from APIs.ticker_board import ticker_board
+from APIs.candle_store import candle_store
+from APIs.klines import Klines
+from APIs.execution import order_request, place_oco_exit, order_tracker
+from APIs.account import account_state, balance_rows
+from APIs.paper import paper_exchange, paper_trading
+from APIs.notifications import notifier, URGENT
+from APIs.rolling import ENTRY_GROWTH, rolling_indicators
+from APIs.scanner import market_scanner
+from utils.metrics import order_fill_latency
 import time
-from states.my_states import AmountState
 import asyncio
 
 
-def place_order(order_type, symbol, amt):
+async def place_order(order_type, symbol, amt):
     """
         Place a trading order.
 
@@ -20,61 +29,58 @@ def place_order(order_type, symbol, amt):
         Returns:
             dict or str: The order details if successful, or an error message if an exception occurs.
     """
+    # Imported here, python-binance is not loaded at startup
+    from binance.exceptions import BinanceAPIException
     try:
-        order = client.create_order(symbol=symbol, side=order_type, type='MARKET', quantity=amt)
+        sent = time.perf_counter()
+        order = await order_request('order', 'create_order', symbol=symbol, side=order_type, type='MARKET', quantity=amt)
+        order_fill_latency.observe(time.perf_counter() - sent, 'market')
         return order
     except BinanceAPIException as e:
         error_message = f"An error occurred while creating the order: {e.message}"
         return error_message
 
 
-def get_symbols():
+async def get_symbols():
     """
         Get a list of tradable spot symbols.
 
-        Retrieves a list of tradable spot symbols from the exchange information.
+        Retrieves a list of tradable spot symbols from the cached exchange information.
 
         Returns:
             list: A list of  spot symbols.
     """
-    exchange_info = client.get_exchange_info()
-    symbols = exchange_info['symbols']
-    spot_symbols = [symbol['symbol'] for symbol in symbols if 'SPOT' in symbol['permissions']]
-    return spot_symbols
+    await exchange_info.load()
+    return sorted(exchange_info.symbols)
 
 
-def get_balance():
+async def get_balance(value_in_usdt=False):
     """
         Get balance information for each tradable asset.
 
-        Retrieves balance information for each tradable asset, including total balance and locked balance.
+        Retrieves balance information for each tradable asset, including total balance and locked balance,
+        from the account state kept current by the user data stream, or from the paper account of the
+        current user when paper trading.
+
+        Args:
+            value_in_usdt (bool, optional): Add the USDT value of each asset as 'usdt_value'. Defaults to False.
 
         Returns:
             list: A list of dictionaries containing balance data for each asset.
                   Each dictionary contains keys 'asset', 'total_balance', and 'locked_balance'.
     """
-
-    account_info = client.get_account()
-
-    balance_data = []
-
-    # Prints balance for each coin
-    for balance in account_info['balances']:
-        asset = balance['asset']
-        free_balance = float(balance['free'])
-        locked_balance = float(balance['locked'])
-        total_balance = free_balance + locked_balance
-        if total_balance > 0:
-            asset_data = {
-                'asset': asset,
-                'total_balance': total_balance,
-                'locked_balance': locked_balance
-            }
-            balance_data.append(asset_data)
-    return balance_data
-
-
-def top_coin():
+    paper = paper_trading()
+    if not paper:
+        await account_state.load()
+    if value_in_usdt:
+        # Asset values come from the shared ticker board
+        await ticker_board.start()
+    if paper:
+        return balance_rows(paper_exchange.balances(), value_in_usdt)
+    return account_state.balances(value_in_usdt)
+
+
+async def top_coin():
     """
         Get the top-performing coin trading against USDT.
 
@@ -83,23 +89,18 @@ def top_coin():
         Returns:
             str: The symbol of the top-performing coin.
     """
-    # Fetch all tickers from the client
-    all_tickers = pd.DataFrame(client.get_ticker())
-    # Filter tickers that are trading against USDT
-    usdt = all_tickers[all_tickers.symbol.str.contains('USDT')]
-    # Remove coins with symbols containing 'UP' or 'DOWN'
-    work = usdt[~((usdt.symbol.str.contains('UP')) | (usdt.symbol.str.contains('DOWN')))]
-    # Sort by price change percent to find the top coin
-    top_coin = work[work.priceChangePercent == work.priceChangePercent.max()]
-    top_coin = top_coin.symbol.values[0]
-    return top_coin
-
-
-def last_data(symbol, interval, lookback):
+    # The shared ticker board is fed by the all-market ticker stream
+    await ticker_board.start()
+    # Leveraged UP/DOWN tokens are excluded by the board's USDT mask
+    return ticker_board.top(1, key='priceChangePercent')[0]
+
+
+async def last_data(symbol, interval, lookback):
     """
         Get the last historical data for a symbol within a specified lookback period.
 
-        Retrieves the last historical data for a given symbol and interval within the specified lookback period.
+        Retrieves the last historical data for a given symbol and interval within the specified lookback period
+        from the local candle store, which downloads only the candles it does not have yet.
 
         Args:
             symbol (str): The trading symbol.
@@ -107,100 +108,155 @@ def last_data(symbol, interval, lookback):
             lookback (str): The lookback period in minutes.
 
         Returns:
-            pandas.DataFrame: Historical data frame containing columns for Time, Open, High, Low, Close, and Volume.
+            Klines: The candles as columns; its frame is a pandas DataFrame with Open, High, Low, Close
+                and Volume columns indexed by Time, built only when it is read.
     """
-    frame = pd.DataFrame(client.get_historical_klines(symbol, interval, lookback + 'min ago UTC'))
-    # Select only the first 6 columns of data
-    frame = frame.iloc[:, :6]
-    # Assign column names
-    frame.columns = ['Time', 'Open', 'High', 'Low', 'Close', 'Volume']
-    # Sort by time and convert time to human-readable format
-    frame = frame.set_index('Time')
-    frame.index = pd.to_datetime(frame.index, unit='ms')
-    # Convert string data to numeric values for comparison
-    frame = frame.astype(float)
-    return frame
+    start_time = int(time.time() * 1000) - int(lookback) * 60 * 1000
+    return Klines(await candle_store.load(symbol, interval, start_time))
 
 
 # функция осуществления торговли
 # buy_amt - тот объем на который му будем заходить в сделку
-async def strategy(message, state, buy_amt, SL=0.985, Target=1.02, open_position=False):
+async def strategy(chat_id, buy_amt, SL=0.985, Target=1.02):
     """
         Execute the trading strategy based on specified parameters.
 
-        Executes the trading strategy by analyzing the most active coin, calculating trade quantity,
-        and placing buy/sell orders according to the strategy's recommendations.
+        Executes the trading strategy by analyzing the most active coin, or with ENTRY_SCOPE
+        'market' the best ranked USDT pair of the market scanner, calculating trade quantity,
+        and placing buy/sell orders according to the strategy's recommendations. The entry is
+        retried every 20 seconds until one trade has been made; the strategy runs as a supervisor
+        task and stops when it is cancelled.
 
         Args:
-            message (types.Message): The incoming message object.
-            state (FSMContext): The state context.
+            chat_id (int): The chat receiving the reports.
             buy_amt (float): The amount for trading.
             SL (float, optional): The stop-loss factor. Defaults to 0.985.
             Target (float, optional): The take-profit factor. Defaults to 1.02.
-            open_position (bool, optional): Indicator for open position. Defaults to False.
 
         Returns:
             None
     """
-    current_state = await state.get_state()
-    if current_state == AmountState.confirm_input:
-        try:
-            # Get the most active coin
-            asset = top_coin()
-            # Check growth using one-minute candles for the last 120 minutes
-            df = last_data(asset, '1m', '120')
-            await message.answer(f'Most active coin: {asset}')
-        except:
-            await message.answer('Failed to get data. Will try again in 1 minute')
-            await asyncio.sleep(61)
-            asset = top_coin()
-            df = last_data(asset, '1m', '120')
-            await message.answer(f'Most active coin: {asset}')
-        # Calculate trade quantity based on buy amount and last closing price
-        qty = round(buy_amt / df.Close.iloc[-1], 1)
-
-        # Check if the price change percent is significant
-        if ((df.Close.pct_change() + 1).cumprod()).iloc[-1] > 100000:
-            await message.answer(f'Creating "BUY" order. Ammount: {qty}\nLast kline close price {df.Close.iloc[-1]}')
-
+    # The rolling window of the most active coin, kept current by its kline stream
+    watched = None
+    try:
+        while True:
+            if ENTRY_SCOPE == 'market':
+                try:
+                    # Every USDT pair is checked by the shared scanner, without requests of this loop
+                    await market_scanner.start()
+                except Exception:
+                    notifier.send(chat_id, 'Failed to get data. Will try again in 1 minute')
+                    await asyncio.sleep(61)
+                    continue
+                candidates = market_scanner.best(1)
+                if candidates:
+                    asset, last_close = candidates[0]['symbol'], candidates[0]['close']
+                    await exchange_info.load()
+                    qty = exchange_info.round_quantity(asset, buy_amt / last_close)
+                    break
+                notifier.status(chat_id, f"Scanned {len(market_scanner.symbols)} coins"
+                                         f"\nNo coin suits your conditions at the moment.\nNext try in 20 sec... ")
+                await asyncio.sleep(20)
+                continue
             try:
-                order = client.create_order(symbol=asset, side='BUY', type='MARKET', quantity=qty)
-            except BinanceAPIException as e:
-                error_message = f"An error occurred while creating the order: {e.message}"
-                await message.answer(error_message)
-                return
-            buyprice = float(order['fills'][0]['price'])
-            await message.answer('Order confirmed!')
-
-            open_position = True
+                # Get the most active coin
+                asset = await top_coin()
+                if asset != watched:
+                    if watched is not None:
+                        await rolling_indicators.unwatch(watched)
+                    await rolling_indicators.watch(asset)
+                    watched = asset
+                # Check growth using one-minute candles for the last 120 minutes
+                window = await rolling_indicators.get(asset)
+                if not len(window):
+                    raise ValueError(f'No candles for {asset}')
+            except Exception:
+                notifier.send(chat_id, 'Failed to get data. Will try again in 1 minute')
+                await asyncio.sleep(61)
+                continue
+            # Status updates of the chat are coalesced into one message edited in place
+            notifier.status(chat_id, f'Most active coin: {asset}')
+            # Calculate trade quantity based on buy amount and last closing price
+            last_close = window.last
+            await exchange_info.load()
+            qty = exchange_info.round_quantity(asset, buy_amt / last_close)
+
+            # Check if the price change percent is significant
+            if window.growth > ENTRY_GROWTH:
+                break
+            notifier.status(chat_id, f"Most active coin: {asset}"
+                                     f"\nAsset doesn't suit your conditions at the moment.\nNext try in 20 sec... ")
+            await asyncio.sleep(20)
+    finally:
+        if watched is not None:
+            await rolling_indicators.unwatch(watched)
 
-            while open_position and current_state == AmountState.confirm_input:
+    notifier.clear_status(chat_id)
+    notifier.send(chat_id, f'Creating "BUY" order. Ammount: {qty}\nLast kline close price {last_close}',
+                  priority=URGENT)
 
-                try:
-                    await message.answer('Checking prices...')
-                    await asyncio.sleep(3)
-                    df = last_data(asset, '1m', '2')
-                except:
-                    await message.answer('Failed to get data. Will continue selling in 1 minute')
-                    time.sleep(61)
-                    df = last_data(asset, '1m', '2')
-
-                await message.answer(f'Price ' + str(df.Close[-1]))
-                await message.answer(f'Target price ' + str(buyprice * Target))
-                await message.answer(f'Stop loss price ' + str(buyprice * SL))
-
-                if df.Close[-1] <= buyprice * SL or df.Close[-1 >= buyprice * Target]:
-                    await message.answer(f'Creating "SELL" order. Ammount: {qty}\nBuy price: {buyprice}')
-                    try:
-                        order = client.create_order(symbol=asset, side='SELL', type='MARKET', quantity=qty)
-                        await message.answer('SELL order confirmed!')
-                        break
-                    except BinanceAPIException as e:
-                        error_message = f"An error occurred while creating the order: {e.message}"
-                        await message.answer(error_message)
-                        break
+    from binance.exceptions import BinanceAPIException
+    try:
+        sent = time.perf_counter()
+        order = await order_request('order', 'create_order', symbol=asset, side='BUY', type='MARKET', quantity=qty)
+        order_fill_latency.observe(time.perf_counter() - sent, 'market')
+    except BinanceAPIException as e:
+        error_message = f"An error occurred while creating the order: {e.message}"
+        notifier.send(chat_id, error_message, priority=URGENT)
+        return
+    buyprice = float(order['fills'][0]['price'])
+    notifier.send(chat_id, 'Order confirmed!', priority=URGENT)
 
+    if EXIT_MODE == 'oco':
+        # The exchange enforces the exits, the bot only follows the order list
+        try:
+            sent = time.perf_counter()
+            order_list = await place_oco_exit(asset, qty, buyprice, SL, Target)
+        except BinanceAPIException as e:
+            error_message = f"An error occurred while creating the OCO order: {e.message}"
+            notifier.send(chat_id, error_message, priority=URGENT)
+            return
+        notifier.send(chat_id, f'OCO exit placed. Ammount: {qty}\nBuy price: {buyprice}'
+                               f'\nTarget price {buyprice * Target}\nStop loss price {buyprice * SL}',
+                      priority=URGENT)
+        fill = await order_tracker.wait(order_list)
+        if fill is None:
+            notifier.send(chat_id, 'OCO order finished without a fill', priority=URGENT)
         else:
-            await message.answer("Asset doesn't suit your conditions at the moment.\nNext try in 20 sec... ")
-            await asyncio.sleep(20)
-            await strategy(message, state, buy_amt)
+            order_fill_latency.observe(time.perf_counter() - sent, 'oco')
+            notifier.send(chat_id, f'SELL order confirmed! {fill["type"]} filled at {fill["price"]}',
+                          priority=URGENT)
+        return
+
+    # Prices are pushed by the kline stream, exits are checked on every update
+    await price_feed.watch(asset)
+    try:
+        while True:
+
+            try:
+                price = await price_feed.get_price(asset)
+            except Exception:
+                notifier.send(chat_id, 'Failed to get data. Will continue selling in 1 minute')
+                await asyncio.sleep(61)
+                continue
+
+            # Every tick updates the status, the notifier limits how often it is edited
+            notifier.status(chat_id, f'Checking prices...\nPrice {price}'
+                                     f'\nTarget price {buyprice * Target}\nStop loss price {buyprice * SL}')
+
+            if price <= buyprice * SL or price >= buyprice * Target:
+                notifier.clear_status(chat_id)
+                notifier.send(chat_id, f'Creating "SELL" order. Ammount: {qty}\nBuy price: {buyprice}',
+                              priority=URGENT)
+                try:
+                    sent = time.perf_counter()
+                    order = await order_request('order', 'create_order',
+                                                symbol=asset, side='SELL', type='MARKET', quantity=qty)
+                    order_fill_latency.observe(time.perf_counter() - sent, 'market')
+                    notifier.send(chat_id, 'SELL order confirmed!', priority=URGENT)
+                except BinanceAPIException as e:
+                    error_message = f"An error occurred while creating the order: {e.message}"
+                    notifier.send(chat_id, error_message, priority=URGENT)
+                break
+    finally:
+        await price_feed.unwatch(asset)
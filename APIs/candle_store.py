@@ -0,0 +1,163 @@
+import asyncio
+import os
+import time
+
+import numpy as np
+
+from loader import get_client, CANDLE_STORE_DIR
+from APIs.intervals import to_binance
+from APIs.klines import KLINE_DTYPE, fetch_klines, parse_klines
+from APIs.rate_limiter import rate_limiter
+
+# Maximum number of candles returned by one klines request
+KLINES_LIMIT = 1000
+
+
+class CandleStore:
+    """
+    On-disk columnar store of klines, one memory-mapped file per symbol and interval.
+
+    Files only grow: new candles are appended and the last, still forming, candle is
+    rewritten in place, so memory maps handed out earlier stay valid. Reading a lookback
+    window is a slice of the memory map; only candles newer than the last stored open time
+    are downloaded.
+    """
+
+    def __init__(self, directory=CANDLE_STORE_DIR, max_staleness=1.0):
+        self.directory = directory
+        self.max_staleness = max_staleness
+        self._locks = {}
+        self._maps = {}
+        self._synced_at = {}
+
+    def _path(self, symbol, interval):
+        # '1M' and '1m' would collide on case-insensitive file systems
+        interval = 'mon' if interval == '1M' else interval
+        return os.path.join(self.directory, f'{symbol}_{interval}.bin')
+
+    def read(self, symbol, interval, start_time=None):
+        """
+        Read stored candles without any network access.
+
+        Args:
+            symbol (str): The trading symbol.
+            interval (str): The kline interval.
+            start_time (int, optional): The first open time to return, in milliseconds.
+
+        Returns:
+            numpy.ndarray: A read-only view of the stored candles of KLINE_DTYPE.
+        """
+        path = self._path(symbol, to_binance(interval))
+        try:
+            size = os.stat(path).st_size
+        except FileNotFoundError:
+            return np.empty(0, dtype=KLINE_DTYPE)
+        cached = self._maps.get(path)
+        if cached is None or cached[0] != size:
+            count = size // KLINE_DTYPE.itemsize
+            if count == 0:
+                return np.empty(0, dtype=KLINE_DTYPE)
+            cached = (size, np.memmap(path, dtype=KLINE_DTYPE, mode='r', shape=(count,)))
+            self._maps[path] = cached
+        records = cached[1]
+        if start_time is not None:
+            records = records[np.searchsorted(records['open_time'], start_time):]
+        return records
+
+    def write(self, symbol, interval, records):
+        """
+        Merge candles into the store.
+
+        Candles with an open time already stored replace the stored ones, newer candles are
+        appended and older ones are merged in before them.
+
+        Args:
+            symbol (str): The trading symbol.
+            interval (str): The kline interval.
+            records (numpy.ndarray): Candles of KLINE_DTYPE sorted by open time.
+
+        Returns:
+            None
+        """
+        if len(records) == 0:
+            return
+        interval = to_binance(interval)
+        path = self._path(symbol, interval)
+        stored = self.read(symbol, interval)
+        os.makedirs(self.directory, exist_ok=True)
+
+        position = np.searchsorted(stored['open_time'], records['open_time'][0]) if len(stored) else 0
+        # Candles stored from position on, rewritten in place when the records cover them all
+        overlap = len(stored) - position
+        if len(stored) and (overlap > len(records) or records['open_time'][0] < stored['open_time'][0]
+                            or records['open_time'][-1] < stored['open_time'][-1]):
+            # Backfill before or inside the stored candles, merge them and swap the file in
+            # atomically, so memory maps handed out earlier keep the old file
+            older = stored[:position]
+            newer = stored[stored['open_time'] > records['open_time'][-1]]
+            merged = np.concatenate([older, records, newer])
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as file:
+                file.write(merged.tobytes())
+            os.replace(tmp_path, path)
+        else:
+            with open(path, 'r+b' if len(stored) else 'wb') as file:
+                file.seek(position * KLINE_DTYPE.itemsize)
+                file.write(records.tobytes())
+        self._maps.pop(path, None)
+
+    async def load(self, symbol, interval, start_time):
+        """
+        Get candles from start_time up to now, downloading only what is missing.
+
+        Args:
+            symbol (str): The trading symbol.
+            interval (str): The kline interval.
+            start_time (int): The first open time to return, in milliseconds.
+
+        Returns:
+            numpy.ndarray: A read-only view of the candles of KLINE_DTYPE.
+        """
+        interval = to_binance(interval)
+        key = (symbol, interval)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            stored = self.read(symbol, interval)
+            if not len(stored) or start_time < stored['open_time'][0]:
+                end_time = int(stored['open_time'][0]) - 1 if len(stored) else None
+                await self._download(symbol, interval, start_time, end_time)
+                if end_time is None:
+                    self._synced_at[key] = time.monotonic()
+            if key not in self._synced_at or time.monotonic() - self._synced_at[key] > self.max_staleness:
+                stored = self.read(symbol, interval)
+                if len(stored):
+                    # Refresh the last stored candle and fetch everything after it
+                    await self._download(symbol, interval, int(stored['open_time'][-1]), None)
+                self._synced_at[key] = time.monotonic()
+        return self.read(symbol, interval, start_time)
+
+    async def _download(self, symbol, interval, start_time, end_time):
+        client = await get_client()
+        # A backfill before the stored candles is merged into the file once, when it is complete
+        chunks = []
+        try:
+            while True:
+                params = {'symbol': symbol, 'interval': interval, 'startTime': start_time, 'limit': KLINES_LIMIT}
+                if end_time is not None:
+                    params['endTime'] = end_time
+                # Parsed from the raw body, without a Python object per field
+                records = parse_klines(await rate_limiter.call('klines', fetch_klines, client, **params))
+                if not len(records):
+                    return
+                if end_time is None:
+                    self.write(symbol, interval, records)
+                else:
+                    chunks.append(records)
+                if len(records) < KLINES_LIMIT:
+                    return
+                start_time = int(records['open_time'][-1]) + 1
+        finally:
+            if chunks:
+                self.write(symbol, interval, np.concatenate(chunks))
+
+candle_store = CandleStore()
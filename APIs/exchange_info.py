@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import time
+from decimal import Decimal, ROUND_DOWN
+
+from loader import get_client
+from APIs.rate_limiter import rate_limiter
+
+# How long a downloaded exchange information snapshot is considered fresh, in seconds
+EXCHANGE_INFO_TTL = 3600
+
+
+def _decimal(value):
+    return Decimal(value).normalize()
+
+
+def _floor_to_step(value, step):
+    if not step:
+        return value
+    steps = (Decimal(str(value)) / step).to_integral_value(rounding=ROUND_DOWN)
+    return float(steps * step)
+
+
+class ExchangeInfoCache:
+    """
+    Process-wide index of the exchange information.
+
+    Downloads exchangeInfo at most once per TTL and indexes it into a set of spot symbols, the
+    base and quote assets and a map of LOT_SIZE, PRICE_FILTER and MIN_NOTIONAL filters per symbol, so symbol checks and
+    quantity rounding are dictionary lookups. A stale index keeps serving lookups while it is
+    refreshed in the background.
+    """
+
+    def __init__(self, ttl=EXCHANGE_INFO_TTL):
+        self.ttl = ttl
+        self.symbols = frozenset()
+        self.assets = {}
+        self.filters = {}
+        self._loaded_at = None
+        self._refresh_task = None
+
+    async def load(self):
+        """
+        Make sure the index is loaded.
+
+        Waits for the download on the first call only; afterwards a stale index triggers a
+        background refresh and the current index is returned immediately.
+
+        Returns:
+            ExchangeInfoCache: The cache itself.
+        """
+        if self._loaded_at is None:
+            await self.refresh()
+        elif time.monotonic() - self._loaded_at > self.ttl:
+            self._start_refresh()
+        return self
+
+    async def refresh(self):
+        """
+        Download the exchange information and rebuild the index.
+
+        Concurrent callers share a single download.
+
+        Returns:
+            None
+        """
+        await asyncio.shield(self._start_refresh())
+
+    def _start_refresh(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._download())
+        return self._refresh_task
+
+    async def _download(self):
+        client = await get_client()
+        try:
+            exchange_info = await rate_limiter.call('exchange_info', client.get_exchange_info)
+        except Exception:
+            if self._loaded_at is None:
+                raise
+            logging.exception('Failed to refresh exchange information, keeping the cached one')
+            return
+
+        symbols = set()
+        assets = {}
+        filters = {}
+        for item in exchange_info['symbols']:
+            symbol = item['symbol']
+            if 'SPOT' in item.get('permissions', ()):
+                symbols.add(symbol)
+            assets[symbol] = (item.get('baseAsset'), item.get('quoteAsset'))
+            symbol_filters = {}
+            for item_filter in item.get('filters', ()):
+                filter_type = item_filter['filterType']
+                if filter_type == 'LOT_SIZE':
+                    symbol_filters['step_size'] = _decimal(item_filter['stepSize'])
+                    symbol_filters['min_qty'] = float(item_filter['minQty'])
+                    symbol_filters['max_qty'] = float(item_filter['maxQty'])
+                elif filter_type == 'PRICE_FILTER':
+                    symbol_filters['tick_size'] = _decimal(item_filter['tickSize'])
+                    symbol_filters['min_price'] = float(item_filter['minPrice'])
+                    symbol_filters['max_price'] = float(item_filter['maxPrice'])
+                elif filter_type in ('MIN_NOTIONAL', 'NOTIONAL'):
+                    symbol_filters['min_notional'] = float(item_filter['minNotional'])
+            filters[symbol] = symbol_filters
+
+        self.symbols = frozenset(symbols)
+        self.assets = assets
+        self.filters = filters
+        self._loaded_at = time.monotonic()
+
+    def is_spot_symbol(self, symbol):
+        """
+        Check whether a symbol is tradable on the spot market.
+
+        Args:
+            symbol (str): The trading symbol.
+
+        Returns:
+            bool: True if the symbol is a spot symbol.
+        """
+        return symbol in self.symbols
+
+    def round_quantity(self, symbol, qty):
+        """
+        Round a quantity down to the LOT_SIZE step of a symbol.
+
+        Args:
+            symbol (str): The trading symbol.
+            qty (float): The quantity.
+
+        Returns:
+            float: The rounded quantity.
+        """
+        return _floor_to_step(qty, self.filters.get(symbol, {}).get('step_size'))
+
+    def round_price(self, symbol, price):
+        """
+        Round a price down to the PRICE_FILTER tick of a symbol.
+
+        Args:
+            symbol (str): The trading symbol.
+            price (float): The price.
+
+        Returns:
+            float: The rounded price.
+        """
+        return _floor_to_step(price, self.filters.get(symbol, {}).get('tick_size'))
+
+    def min_notional(self, symbol):
+        """
+        Get the minimum order value of a symbol.
+
+        Args:
+            symbol (str): The trading symbol.
+
+        Returns:
+            float: The minimum notional, or 0 if the symbol has no such filter.
+        """
+        return self.filters.get(symbol, {}).get('min_notional', 0.0)
+
+
+exchange_info = ExchangeInfoCache()
@@ -0,0 +1,164 @@
+import asyncio
+import logging
+
+from loader import get_client, OCO_STOP_LIMIT_GAP
+from APIs.exchange_info import exchange_info
+from APIs.paper import paper_exchange, paper_trading
+from APIs.rate_limiter import rate_limiter
+from APIs.user_stream import user_stream
+
+# Order lists remembered when they finish before anybody waits for them
+MAX_FINISHED_LISTS = 1000
+
+# Interval of the REST reconciliation used when user stream events are missed, in seconds
+RECONCILE_INTERVAL = 60
+
+FINAL_ORDER_STATUSES = ('FILLED', 'CANCELED', 'EXPIRED', 'REJECTED')
+
+
+async def order_request(endpoint, method, **params):
+    """
+    Send a request to an order endpoint of the exchange, or of the paper exchange.
+
+    Orders of a paper trading context go to the simulated exchange without using the request
+    weight of the account, the others to Binance through the rate limiter.
+
+    Args:
+        endpoint (str): The endpoint name, a key of ENDPOINTS of the rate limiter.
+        method (str): The name of the AsyncClient method, e.g. 'create_order'.
+        **params: The parameters of the request.
+
+    Returns:
+        dict: The response of the exchange.
+    """
+    if paper_trading():
+        return await getattr(paper_exchange, method)(**params)
+    client = await get_client()
+    return await rate_limiter.call(endpoint, getattr(client, method), **params)
+
+
+class OrderListTracker:
+    """
+    Track OCO order lists through the user data stream.
+
+    Collects the fills of every order list and resolves waiters when the list is done, so
+    exits are followed without polling prices or orders. Events of the paper exchange are
+    followed the same way.
+    """
+
+    def __init__(self, *streams):
+        self._waiters = {}
+        self._fills = {}
+        self._finished = {}
+        for stream in streams:
+            stream.add_handler('executionReport', self._on_execution_report)
+            stream.add_handler('listStatus', self._on_list_status)
+
+    @staticmethod
+    def _remember(store, key, value):
+        store[key] = value
+        if len(store) > MAX_FINISHED_LISTS:
+            del store[next(iter(store))]
+
+    def _on_execution_report(self, event):
+        if event['g'] != -1 and event['X'] == 'FILLED':
+            self._remember(self._fills, event['g'], event)
+
+    def _on_list_status(self, event):
+        if event['L'] not in ('ALL_DONE', 'REJECT'):
+            return
+        waiter = self._waiters.pop(event['g'], None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(event)
+        else:
+            self._remember(self._finished, event['g'], event)
+
+    async def _reconcile(self, symbol, order_ids):
+        orders = []
+        for order_id in order_ids:
+            orders.append(await order_request('order_status', 'get_order', symbol=symbol, orderId=order_id))
+        if all(order['status'] in FINAL_ORDER_STATUSES for order in orders):
+            return next((order for order in orders if order['status'] == 'FILLED'), None)
+        return False
+
+    async def wait(self, order_list):
+        """
+        Wait until every order of an OCO order list is done.
+
+        Args:
+            order_list (dict): The order list returned when the OCO order was placed.
+
+        Returns:
+            dict or None: The filled order with 'type', 'price' (average fill price) and
+                'executedQty' keys, or None if no leg was filled.
+        """
+        order_list_id = order_list['orderListId']
+        symbol = order_list['symbol']
+        order_ids = [order['orderId'] for order in order_list['orders']]
+        if order_list_id not in self._finished:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters[order_list_id] = waiter
+            try:
+                while True:
+                    try:
+                        await asyncio.wait_for(asyncio.shield(waiter), RECONCILE_INTERVAL)
+                        break
+                    except asyncio.TimeoutError:
+                        # Events may have been lost during a reconnect, ask the exchange
+                        order = await self._reconcile(symbol, order_ids)
+                        if order is not False:
+                            self._fills.pop(order_list_id, None)
+                            if order is None:
+                                return None
+                            return {
+                                'type': order['type'],
+                                'price': float(order['cummulativeQuoteQty']) / float(order['executedQty']),
+                                'executedQty': float(order['executedQty']),
+                            }
+            finally:
+                self._waiters.pop(order_list_id, None)
+        self._finished.pop(order_list_id, None)
+        fill = self._fills.pop(order_list_id, None)
+        if fill is None:
+            return None
+        return {
+            'type': fill['o'],
+            'price': float(fill['Z']) / float(fill['z']),
+            'executedQty': float(fill['z']),
+        }
+
+
+async def place_oco_exit(symbol, qty, buyprice, SL, Target):
+    """
+    Place the exchange-side exit of an open position as a SELL OCO order.
+
+    The take-profit leg is a limit order at buyprice * Target, the stop leg triggers at
+    buyprice * SL with a limit OCO_STOP_LIMIT_GAP below the trigger.
+
+    Args:
+        symbol (str): The trading symbol.
+        qty (float): The position quantity.
+        buyprice (float): The entry price.
+        SL (float): The stop-loss factor.
+        Target (float): The take-profit factor.
+
+    Returns:
+        dict: The order list returned by the exchange.
+    """
+    await exchange_info.load()
+    take_profit = exchange_info.round_price(symbol, buyprice * Target)
+    stop_price = exchange_info.round_price(symbol, buyprice * SL)
+    stop_limit = exchange_info.round_price(symbol, buyprice * SL * (1 - OCO_STOP_LIMIT_GAP))
+    if not paper_trading():
+        try:
+            # Connect the user stream first, so no event of the new order list is missed
+            await asyncio.wait_for(user_stream.start(), 10)
+        except asyncio.TimeoutError:
+            logging.warning('User data stream is not connected, OCO exit is reconciled over REST')
+    return await order_request('oco_order', 'create_oco_order',
+                               symbol=symbol, side='SELL', quantity=qty,
+                               price=take_profit, stopPrice=stop_price,
+                               stopLimitPrice=stop_limit, stopLimitTimeInForce='GTC')
+
+
+order_tracker = OrderListTracker(user_stream, paper_exchange)
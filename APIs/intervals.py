@@ -0,0 +1,109 @@
+from datetime import datetime, timezone
+
+
+# Interval names offered by the bot mapped to Binance kline intervals
+BINANCE_INTERVALS = {
+    '1m': '1m',
+    '5m': '5m',
+    '15m': '15m',
+    '30m': '30m',
+    '1h': '1h',
+    '2h': '2h',
+    '4h': '4h',
+    '1d': '1d',
+    '1w': '1w',
+    '1mon': '1M',
+}
+
+# Nominal length of Binance kline intervals in seconds, a month is counted as 30 days
+INTERVAL_SECONDS = {
+    '1s': 1,
+    '1m': 60,
+    '3m': 3 * 60,
+    '5m': 5 * 60,
+    '15m': 15 * 60,
+    '30m': 30 * 60,
+    '1h': 3600,
+    '2h': 2 * 3600,
+    '4h': 4 * 3600,
+    '6h': 6 * 3600,
+    '8h': 8 * 3600,
+    '12h': 12 * 3600,
+    '1d': 86400,
+    '3d': 3 * 86400,
+    '1w': 7 * 86400,
+    '1M': 30 * 86400,
+}
+
+
+def to_binance(interval):
+    """
+    Convert an interval name used by the bot to a Binance kline interval.
+
+    Args:
+        interval (str): The interval, e.g. '1h' or '1mon'.
+
+    Returns:
+        str: The Binance interval, e.g. '1h' or '1M'.
+    """
+    return BINANCE_INTERVALS.get(interval, interval)
+
+
+def interval_ms(interval):
+    """
+    Get the nominal length of an interval in milliseconds.
+
+    Args:
+        interval (str): The interval, either a bot or a Binance interval name.
+
+    Returns:
+        int: The interval length in milliseconds.
+    """
+    return INTERVAL_SECONDS[to_binance(interval)] * 1000
+
+
+# Binance weekly candles open on Monday, the Unix epoch was a Thursday
+WEEK_OFFSET_MS = 4 * 86400 * 1000
+
+
+def candle_open_time(interval, timestamp):
+    """
+    Get the open time of the candle containing a timestamp.
+
+    Candles are aligned like on the exchange: to the Unix epoch for intervals up to a day,
+    to Monday for weeks and to the first day of the month for months, all in UTC.
+
+    Args:
+        interval (str): The interval, either a bot or a Binance interval name.
+        timestamp (int): The timestamp in milliseconds.
+
+    Returns:
+        int: The open time of the candle in milliseconds.
+    """
+    interval = to_binance(interval)
+    if interval == '1M':
+        moment = datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc)
+        return int(datetime(moment.year, moment.month, 1, tzinfo=timezone.utc).timestamp() * 1000)
+    step = interval_ms(interval)
+    offset = WEEK_OFFSET_MS if interval == '1w' else 0
+    return (timestamp - offset) // step * step + offset
+
+
+def next_candle_boundary(interval, timestamp):
+    """
+    Get the open time of the candle following the one containing a timestamp.
+
+    Args:
+        interval (str): The interval, either a bot or a Binance interval name.
+        timestamp (int): The timestamp in milliseconds.
+
+    Returns:
+        int: The open time of the next candle in milliseconds.
+    """
+    interval = to_binance(interval)
+    open_time = candle_open_time(interval, timestamp)
+    if interval == '1M':
+        moment = datetime.fromtimestamp(open_time / 1000, tz=timezone.utc)
+        year, month = (moment.year + 1, 1) if moment.month == 12 else (moment.year, moment.month + 1)
+        return int(datetime(year, month, 1, tzinfo=timezone.utc).timestamp() * 1000)
+    return open_time + interval_ms(interval)
@@ -0,0 +1,142 @@
+import numpy as np
+
+# One candle: open time in milliseconds followed by OHLCV
+KLINE_DTYPE = np.dtype([
+    ('open_time', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8'),
+])
+
+# Fields of one kline in a klines response: open time, OHLCV, close time, quote volume,
+# number of trades, taker buy base and quote volumes and an unused field
+KLINE_FIELDS = 12
+
+# Characters of a klines response that are not numbers or separators
+_SYNTAX = b'[]"'
+
+
+def klines_to_records(rows):
+    """
+    Convert klines decoded from JSON to candle records.
+
+    Args:
+        rows (list): Klines as lists of open time followed by OHLCV strings.
+
+    Returns:
+        numpy.ndarray: A structured array of KLINE_DTYPE.
+    """
+    return np.fromiter(
+        ((row[0], float(row[1]), float(row[2]), float(row[3]), float(row[4]), float(row[5])) for row in rows),
+        dtype=KLINE_DTYPE,
+        count=len(rows),
+    )
+
+
+def parse_klines(payload):
+    """
+    Parse the raw body of a klines response into candle records.
+
+    The body is read by NumPy as one flat sequence of numbers once brackets and quotes are
+    removed, without creating a Python object per field. Open times in milliseconds are
+    exact in float64.
+
+    Args:
+        payload (bytes): The JSON array of klines as returned by the exchange.
+
+    Returns:
+        numpy.ndarray: A structured array of KLINE_DTYPE.
+    """
+    values = np.fromstring(payload.translate(None, _SYNTAX), sep=',')
+    if len(values) % KLINE_FIELDS:
+        raise ValueError(f'Malformed klines payload: {payload[:100]!r}')
+    fields = values.reshape(-1, KLINE_FIELDS)
+    records = np.empty(len(fields), dtype=KLINE_DTYPE)
+    for column, name in enumerate(KLINE_DTYPE.names):
+        records[name] = fields[:, column]
+    return records
+
+
+async def fetch_klines(client, **params):
+    """
+    Request klines and return the raw response body.
+
+    Sends the request on the session of the client and keeps the response on the client like
+    its own methods do, so the rate limiter reads the used weight from it.
+
+    Args:
+        client (AsyncClient): The shared Binance client.
+        **params: The query parameters of GET /api/v3/klines.
+
+    Returns:
+        bytes: The JSON array of klines.
+    """
+    from binance.exceptions import BinanceAPIException
+    url = f'{client.API_URL}/v3/klines'
+    async with client.session.get(url, params=params, timeout=client.REQUEST_TIMEOUT) as response:
+        client.response = response
+        payload = await response.read()
+        if response.status >= 300:
+            raise BinanceAPIException(response, response.status, payload.decode())
+    return payload
+
+
+class Klines:
+    """
+    Candle records with column access and a pandas view built on demand.
+
+    Columns are views of the records. The DataFrame, with the Open, High, Low, Close and Volume
+    columns indexed by Time, is only built when frame is read, once.
+    """
+
+    def __init__(self, records):
+        self.records = records
+        self._frame = None
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def open_time(self):
+        return self.records['open_time']
+
+    @property
+    def open(self):
+        return self.records['open']
+
+    @property
+    def high(self):
+        return self.records['high']
+
+    @property
+    def low(self):
+        return self.records['low']
+
+    @property
+    def close(self):
+        return self.records['close']
+
+    @property
+    def volume(self):
+        return self.records['volume']
+
+    @property
+    def frame(self):
+        """
+        Get the candles as a pandas DataFrame.
+        """
+        if self._frame is None:
+            import pandas as pd
+            frame = pd.DataFrame({
+                'Open': self.open,
+                'High': self.high,
+                'Low': self.low,
+                'Close': self.close,
+                'Volume': self.volume,
+            })
+            frame.index = pd.to_datetime(self.open_time, unit='ms')
+            frame.index.name = 'Time'
+            self._frame = frame
+        return self._frame
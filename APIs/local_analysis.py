@@ -0,0 +1,354 @@
+import asyncio
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from APIs.resample import resampler
+from APIs.intervals import to_binance, interval_ms, next_candle_boundary
+
+# Number of closed candles the indicators are computed on, enough for the 200-period averages
+WINDOW = 300
+
+OSCILLATORS = ['RSI', 'Stoch.K', 'CCI', 'ADX', 'AO', 'Mom', 'MACD', 'Stoch.RSI', 'W.R', 'BBP', 'UO']
+MOVING_AVERAGES = [
+    'EMA10', 'SMA10', 'EMA20', 'SMA20', 'EMA30', 'SMA30', 'EMA50', 'SMA50',
+    'EMA100', 'SMA100', 'EMA200', 'SMA200', 'Ichimoku', 'VWMA', 'HullMA',
+]
+
+
+def _shift(x, n=1):
+    out = np.full(len(x), np.nan)
+    if n < len(x):
+        out[n:] = x[:-n]
+    return out
+
+
+def _rolling(x, n, func):
+    out = np.full(len(x), np.nan)
+    if len(x) >= n:
+        out[n - 1:] = func(sliding_window_view(x, n), axis=1)
+    return out
+
+
+def sma(x, n):
+    """
+    Simple moving average.
+
+    Args:
+        x (numpy.ndarray): The input series.
+        n (int): The period.
+
+    Returns:
+        numpy.ndarray: The average, NaN until n values are available.
+    """
+    return _rolling(x, n, np.mean)
+
+
+def wma(x, n):
+    """
+    Linearly weighted moving average.
+
+    Args:
+        x (numpy.ndarray): The input series.
+        n (int): The period.
+
+    Returns:
+        numpy.ndarray: The average, NaN until n values are available.
+    """
+    weights = np.arange(1, n + 1, dtype=float)
+    out = np.full(len(x), np.nan)
+    if len(x) >= n:
+        out[n - 1:] = sliding_window_view(x, n) @ weights / weights.sum()
+    return out
+
+
+def ema(x, n, alpha=None):
+    """
+    Exponential moving average seeded with the simple average of the first n values.
+
+    Leading NaN values of the input are skipped.
+
+    Args:
+        x (numpy.ndarray): The input series.
+        n (int): The period.
+        alpha (float, optional): The smoothing factor. Defaults to 2 / (n + 1).
+
+    Returns:
+        numpy.ndarray: The average, NaN until n values are available.
+    """
+    alpha = 2 / (n + 1) if alpha is None else alpha
+    out = np.full(len(x), np.nan)
+    valid = np.flatnonzero(~np.isnan(x))
+    if len(valid) < n:
+        return out
+    start = valid[0] + n - 1
+    value = float(np.mean(x[valid[0]:start + 1]))
+    values = [value]
+    for item in x[start + 1:].tolist():
+        value += alpha * (item - value)
+        values.append(value)
+    out[start:] = values
+    return out
+
+
+def rma(x, n):
+    """
+    Wilder's moving average.
+
+    Args:
+        x (numpy.ndarray): The input series.
+        n (int): The period.
+
+    Returns:
+        numpy.ndarray: The average, NaN until n values are available.
+    """
+    return ema(x, n, alpha=1 / n)
+
+
+def rsi(close, n=14):
+    change = np.diff(close, prepend=np.nan)
+    gain = rma(np.maximum(change, 0), n)
+    loss = rma(np.maximum(-change, 0), n)
+    return 100 - 100 / (1 + gain / loss)
+
+
+def _stochastic(high, low, close, k, smooth_k, d):
+    highest = _rolling(high, k, np.max)
+    lowest = _rolling(low, k, np.min)
+    k_line = sma(100 * (close - lowest) / (highest - lowest), smooth_k)
+    return k_line, sma(k_line, d)
+
+
+def _vote(buy, sell, *inputs):
+    valid = np.logical_and.reduce([~np.isnan(item) for item in inputs])
+    return np.where(valid, np.where(buy, 1.0, np.where(sell, -1.0, 0.0)), np.nan)
+
+
+def indicator_votes(open_, high, low, close, volume):
+    """
+    Compute the TradingView-style vote of every indicator on every candle.
+
+    Args:
+        open_ (numpy.ndarray): Open prices.
+        high (numpy.ndarray): High prices.
+        low (numpy.ndarray): Low prices.
+        close (numpy.ndarray): Close prices.
+        volume (numpy.ndarray): Volumes.
+
+    Returns:
+        tuple: Two arrays of shape (indicators, candles) for the oscillators and the moving
+            averages, holding 1 for BUY, -1 for SELL, 0 for NEUTRAL and NaN where an indicator
+            has not enough data.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        prev_close = _shift(close)
+        hl2 = (high + low) / 2
+
+        rsi_line = rsi(close)
+        rsi_prev = _shift(rsi_line)
+
+        stoch_k, stoch_d = _stochastic(high, low, close, 14, 3, 3)
+        stoch_k1, stoch_d1 = _shift(stoch_k), _shift(stoch_d)
+
+        typical = (high + low + close) / 3
+        deviation = _rolling(typical, 20, lambda w, axis: np.mean(np.abs(w - w.mean(axis=axis, keepdims=True)), axis=axis))
+        cci = (typical - sma(typical, 20)) / (0.015 * deviation)
+        cci_prev = _shift(cci)
+
+        up_move = np.diff(high, prepend=np.nan)
+        down_move = -np.diff(low, prepend=np.nan)
+        plus_dm = np.where((up_move > down_move) & (up_move > 0), up_move, 0.0)
+        minus_dm = np.where((down_move > up_move) & (down_move > 0), down_move, 0.0)
+        plus_dm[:1] = np.nan
+        minus_dm[:1] = np.nan
+        true_range = np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+        atr = rma(true_range, 14)
+        plus_di = 100 * rma(plus_dm, 14) / atr
+        minus_di = 100 * rma(minus_dm, 14) / atr
+        adx = rma(100 * np.abs(plus_di - minus_di) / (plus_di + minus_di), 14)
+        adx_prev, plus_di1, minus_di1 = _shift(adx), _shift(plus_di), _shift(minus_di)
+
+        ao = sma(hl2, 5) - sma(hl2, 34)
+        ao1, ao2 = _shift(ao), _shift(ao, 2)
+
+        mom = close - _shift(close, 10)
+        mom_prev = _shift(mom)
+
+        macd = ema(close, 12) - ema(close, 26)
+        macd_signal = ema(macd, 9)
+
+        rsi_k, rsi_d = _stochastic(rsi_line, rsi_line, rsi_line, 14, 3, 3)
+        rsi_k1, rsi_d1 = _shift(rsi_k), _shift(rsi_d)
+
+        highest14 = _rolling(high, 14, np.max)
+        lowest14 = _rolling(low, 14, np.min)
+        williams = -100 * (highest14 - close) / (highest14 - lowest14)
+        williams_prev = _shift(williams)
+
+        ema13 = ema(close, 13)
+        bull_power = high - ema13
+        bear_power = low - ema13
+        trend_up = ema13 > _shift(ema13)
+        trend_down = ema13 < _shift(ema13)
+
+        buying = close - np.fmin(low, prev_close)
+        ranges = np.fmax(high, prev_close) - np.fmin(low, prev_close)
+        ratios = [_rolling(buying, n, np.sum) / _rolling(ranges, n, np.sum) for n in (7, 14, 28)]
+        uo = 100 * (4 * ratios[0] + 2 * ratios[1] + ratios[2]) / 7
+
+        oscillators = np.vstack([
+            _vote((rsi_line < 30) & (rsi_prev < rsi_line), (rsi_line > 70) & (rsi_prev > rsi_line), rsi_line, rsi_prev),
+            _vote((stoch_k < 20) & (stoch_d < 20) & (stoch_k > stoch_d) & (stoch_k1 < stoch_d1),
+                  (stoch_k > 80) & (stoch_d > 80) & (stoch_k < stoch_d) & (stoch_k1 > stoch_d1),
+                  stoch_k, stoch_d, stoch_k1, stoch_d1),
+            _vote((cci < -100) & (cci > cci_prev), (cci > 100) & (cci < cci_prev), cci, cci_prev),
+            _vote((adx > 20) & (adx_prev < adx) & (plus_di > minus_di) & (plus_di1 < minus_di1),
+                  (adx > 20) & (adx_prev < adx) & (plus_di < minus_di) & (plus_di1 > minus_di1),
+                  adx, adx_prev, plus_di1, minus_di1),
+            _vote(((ao > 0) & (ao1 < 0)) | ((ao > 0) & (ao1 > 0) & (ao > ao1) & (ao2 > ao1)),
+                  ((ao < 0) & (ao1 > 0)) | ((ao < 0) & (ao1 < 0) & (ao < ao1) & (ao2 < ao1)),
+                  ao, ao1, ao2),
+            _vote(mom > mom_prev, mom < mom_prev, mom, mom_prev),
+            _vote(macd > macd_signal, macd < macd_signal, macd, macd_signal),
+            _vote((rsi_k < 20) & (rsi_d < 20) & (rsi_k > rsi_d) & (rsi_k1 < rsi_d1),
+                  (rsi_k > 80) & (rsi_d > 80) & (rsi_k < rsi_d) & (rsi_k1 > rsi_d1),
+                  rsi_k, rsi_d, rsi_k1, rsi_d1),
+            _vote((williams < -80) & (williams > williams_prev), (williams > -20) & (williams < williams_prev),
+                  williams, williams_prev),
+            _vote(trend_up & (bear_power < 0) & (bear_power > _shift(bear_power)),
+                  trend_down & (bull_power > 0) & (bull_power < _shift(bull_power)),
+                  ema13, _shift(ema13), _shift(bear_power)),
+            _vote(uo > 70, uo < 30, uo),
+        ])
+
+        averages = []
+        for n in (10, 20, 30, 50, 100, 200):
+            averages.append(ema(close, n))
+            averages.append(sma(close, n))
+        averages.append((_rolling(high, 26, np.max) + _rolling(low, 26, np.min)) / 2)
+        averages.append(sma(close * volume, 20) / sma(volume, 20))
+        averages.append(wma(2 * wma(close, 4) - wma(close, 9), 3))
+        moving_averages = np.vstack([_vote(line < close, line > close, line) for line in averages])
+
+    return oscillators, moving_averages
+
+
+def recommendation(value):
+    """
+    Convert a recommendation value between -1 and 1 to a TradingView label.
+
+    Args:
+        value (float): The recommendation value.
+
+    Returns:
+        str: One of 'STRONG_SELL', 'SELL', 'NEUTRAL', 'BUY' or 'STRONG_BUY'.
+    """
+    if value >= 0.5:
+        return 'STRONG_BUY'
+    if value >= 0.1:
+        return 'BUY'
+    if value > -0.1:
+        return 'NEUTRAL'
+    if value > -0.5:
+        return 'SELL'
+    return 'STRONG_SELL'
+
+
+def _group_value(votes):
+    count = np.sum(~np.isnan(votes), axis=0)
+    total = np.nansum(votes, axis=0)
+    return np.divide(total, count, out=np.zeros(len(total)), where=count > 0)
+
+
+def recommendation_series(open_, high, low, close, volume):
+    """
+    Compute the recommendation value and vote counts on every candle.
+
+    The value is the average of the mean oscillator vote and the mean moving average vote,
+    as in the TradingView technical ratings.
+
+    Args:
+        open_ (numpy.ndarray): Open prices.
+        high (numpy.ndarray): High prices.
+        low (numpy.ndarray): Low prices.
+        close (numpy.ndarray): Close prices.
+        volume (numpy.ndarray): Volumes.
+
+    Returns:
+        tuple: Arrays of the recommendation value and of the BUY, SELL and NEUTRAL counts.
+    """
+    oscillators, moving_averages = indicator_votes(open_, high, low, close, volume)
+    value = (_group_value(oscillators) + _group_value(moving_averages)) / 2
+    votes = np.vstack([oscillators, moving_averages])
+    return value, np.sum(votes == 1, axis=0), np.sum(votes == -1, axis=0), np.sum(votes == 0, axis=0)
+
+
+def analyze(records):
+    """
+    Summarize the indicators on the last candle of a kline window.
+
+    Args:
+        records (numpy.ndarray): Candles of the candle store dtype.
+
+    Returns:
+        dict: A summary with 'RECOMMENDATION', 'BUY', 'SELL' and 'NEUTRAL' keys, like the
+            TradingView analysis summary.
+    """
+    if len(records) == 0:
+        return {'RECOMMENDATION': 'NEUTRAL', 'BUY': 0, 'SELL': 0, 'NEUTRAL': 0}
+    columns = [np.ascontiguousarray(records[name]) for name in ('open', 'high', 'low', 'close', 'volume')]
+    value, buy, sell, neutral = recommendation_series(*columns)
+    return {
+        'RECOMMENDATION': recommendation(value[-1]),
+        'BUY': int(buy[-1]),
+        'SELL': int(sell[-1]),
+        'NEUTRAL': int(neutral[-1]),
+    }
+
+
+class LocalAnalyzer:
+    """
+    Technical analysis computed locally from the candles of the resampler.
+
+    The summary of a symbol and interval is computed on closed candles and recomputed only
+    after the next candle closes; in between it is served from memory.
+    """
+
+    def __init__(self, store, window=WINDOW):
+        self.window = window
+        self._store = store
+        self._summaries = {}
+        self._locks = {}
+
+    async def summary(self, symbol, interval):
+        """
+        Get the analysis summary of a symbol.
+
+        Args:
+            symbol (str): The trading symbol.
+            interval (str): The trading interval.
+
+        Returns:
+            dict: A summary compatible with the TradingView analysis summary.
+        """
+        interval = to_binance(interval)
+        key = (symbol, interval)
+        cached = self._summaries.get(key)
+        if cached is not None and time.time() * 1000 < cached[0]:
+            return cached[1]
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            cached = self._summaries.get(key)
+            now = int(time.time() * 1000)
+            if cached is not None and now < cached[0]:
+                return cached[1]
+            step = interval_ms(interval)
+            records = await self._store.load(symbol, interval, now - (self.window + 1) * step)
+            # The last candle is still forming
+            summary = analyze(records[:-1])
+            expires_at = next_candle_boundary(interval, int(records['open_time'][-1]) if len(records) else now)
+            self._summaries[key] = (expires_at, summary)
+            return summary
+
+
+local_analyzer = LocalAnalyzer(resampler)
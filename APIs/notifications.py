@@ -0,0 +1,242 @@
+import asyncio
+import bisect
+import contextvars
+import itertools
+import logging
+import time
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+from loader import get_bot
+from APIs.rate_limiter import TokenBucket
+from utils.metrics import current_user
+
+# Message priorities, lower values are sent first
+URGENT = 0
+INFO = 1
+STATUS = 2
+
+# Telegram allows about 30 messages per second in total and one per second in a chat,
+# short bursts in a chat are tolerated
+GLOBAL_LIMIT = 30
+GLOBAL_PERIOD = 1
+CHAT_LIMIT = 3
+CHAT_PERIOD = 3
+
+# Minimum number of seconds between two edits of a status message
+STATUS_INTERVAL = 3
+
+# Separates the status messages of tasks running in the same chat, set by the task supervisor
+status_key = contextvars.ContextVar('status_key', default=None)
+
+
+class _Status:
+    """
+    The status message of a chat: the latest text and the message showing it.
+    """
+
+    def __init__(self):
+        self.text = None
+        self.shown = None
+        self.message_id = None
+        self.next_edit = 0
+        self.queued = False
+
+
+class Notifier:
+    """
+    Outbound queue of the messages the bot sends on its own, outside of handler replies.
+
+    Messages are sent by one worker within a global budget and a budget per chat, urgent
+    messages such as order confirmations first. Status updates are coalesced: a chat keeps
+    a single status message per status_key which is edited in place with the latest text, at
+    most every STATUS_INTERVAL seconds, so a monitor loop can report every tick without flooding
+    the chat.
+    Flood control replies block the chat for the requested time and the message is retried.
+    """
+
+    def __init__(self, bot=None, status_interval=STATUS_INTERVAL):
+        self._bot = bot
+        self.status_interval = status_interval
+        self.global_bucket = TokenBucket(GLOBAL_LIMIT, GLOBAL_PERIOD)
+        self._chat_buckets = {}
+        self._statuses = {}
+        self._queue = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    @property
+    def bot(self):
+        """
+        Get the bot sending the messages, the shared bot unless another one was given.
+        """
+        if self._bot is None:
+            self._bot = get_bot()
+        return self._bot
+
+    def send(self, chat_id, text, priority=INFO, **kwargs):
+        """
+        Queue a message.
+
+        Args:
+            chat_id (int): The chat id.
+            text (str): The message text.
+            priority (int, optional): URGENT or INFO. Defaults to INFO.
+            **kwargs: Further arguments of Bot.send_message.
+
+        Returns:
+            None
+        """
+        self._push(priority, chat_id, (text, kwargs))
+
+    def status(self, chat_id, text):
+        """
+        Show text in the status message of a chat, replacing the previous status.
+
+        Args:
+            chat_id (int): The chat id.
+            text (str): The status text.
+
+        Returns:
+            None
+        """
+        key = (chat_id, status_key.get())
+        status = self._statuses.setdefault(key, _Status())
+        status.text = text
+        if not status.queued and text != status.shown:
+            status.queued = True
+            self._push(STATUS, chat_id, key)
+
+    def clear_status(self, chat_id):
+        """
+        Leave the current status message as it is, the next status starts a new message.
+
+        Args:
+            chat_id (int): The chat id.
+
+        Returns:
+            None
+        """
+        key = (chat_id, status_key.get())
+        status = self._statuses.get(key)
+        if status is not None and not status.queued:
+            del self._statuses[key]
+        elif status is not None:
+            status.message_id = None
+
+    async def close(self):
+        """
+        Stop the worker, messages still queued are dropped.
+
+        Returns:
+            None
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _push(self, priority, chat_id, payload):
+        bisect.insort(self._queue, (priority, next(self._counter), chat_id, payload))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(CHAT_LIMIT, CHAT_PERIOD)
+        return bucket
+
+    def _wait_time(self, entry):
+        priority, _, chat_id, payload = entry
+        wait = self._chat_bucket(chat_id).wait_time(1)
+        if priority == STATUS:
+            wait = max(wait, self._statuses[payload].next_edit - time.monotonic())
+        return wait
+
+    def _next(self):
+        # The first entry that may be sent now, otherwise the shortest wait
+        delay = None
+        for index, entry in enumerate(self._queue):
+            wait = self._wait_time(entry)
+            if wait <= 0:
+                return self._queue.pop(index), None
+            delay = wait if delay is None else min(delay, wait)
+        return None, delay
+
+    def _prune(self):
+        # A full bucket is the same as a new one
+        for chat_id, bucket in list(self._chat_buckets.items()):
+            if bucket.wait_time(bucket.capacity) == 0:
+                del self._chat_buckets[chat_id]
+
+    async def _run(self):
+        while True:
+            if not self._queue:
+                self._prune()
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            global_wait = self.global_bucket.wait_time(1)
+            if global_wait > 0:
+                await asyncio.sleep(global_wait)
+                continue
+            entry, delay = self._next()
+            if entry is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self.global_bucket.take(1)
+            self._chat_bucket(entry[2]).take(1)
+            await self._deliver(entry)
+
+    async def _deliver(self, entry):
+        priority, _, chat_id, payload = entry
+        # Count the request for the user of the private chat, not for whoever started the worker
+        current_user.set(chat_id)
+        try:
+            if priority == STATUS:
+                await self._show_status(chat_id, payload)
+            else:
+                text, kwargs = payload
+                await self.bot.send_message(chat_id, text, **kwargs)
+        except TelegramRetryAfter as e:
+            logging.warning('Telegram flood control in chat %s, retrying in %s s', chat_id, e.retry_after)
+            self._chat_bucket(chat_id).block(e.retry_after)
+            bisect.insort(self._queue, entry)
+        except Exception:
+            logging.exception('Failed to send a message to chat %s', chat_id)
+            if priority == STATUS:
+                self._statuses.pop(payload, None)
+
+    async def _show_status(self, chat_id, key):
+        status = self._statuses[key]
+        text = status.text
+        if status.message_id is not None:
+            try:
+                await self.bot.edit_message_text(text, chat_id=chat_id, message_id=status.message_id)
+            except TelegramBadRequest as e:
+                if 'not modified' not in e.message:
+                    # The status message is gone, show the status in a new one
+                    status.message_id = None
+        if status.message_id is None:
+            message = await self.bot.send_message(chat_id, text)
+            status.message_id = message.message_id
+        status.shown = text
+        status.next_edit = time.monotonic() + self.status_interval
+        status.queued = False
+        # The status changed while this one was being sent
+        if status.text != status.shown:
+            status.queued = True
+            bisect.insort(self._queue, (STATUS, next(self._counter), chat_id, key))
+
+
+notifier = Notifier()
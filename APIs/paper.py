@@ -0,0 +1,564 @@
+import asyncio
+import heapq
+import itertools
+import json
+import time
+from decimal import Decimal
+
+from loader import PAPER_BALANCE, PAPER_FEE_RATE, PAPER_USER_IDS, TRADING_MODE
+from APIs.exchange_info import exchange_info
+from APIs.streams import market_data
+from utils.metrics import current_user
+
+# Seconds an order waits for the first quote of a symbol before it is rejected
+QUOTE_TIMEOUT = 5
+
+# Paper order and order list ids start here, far above the ids of the live account, so the
+# order list tracker can follow both
+FIRST_ID = 10 ** 12
+
+OPEN_STATUSES = ('NEW', 'PARTIALLY_FILLED')
+
+# Finished orders kept for get_order, older ones are forgotten with their order lists
+MAX_FINISHED_ORDERS = 1000
+# Finished orders of a symbol after which the dead entries of its heaps may be dropped
+COMPACT_MIN = 1000
+
+
+def paper_trading():
+    """
+    Tell whether the orders of the current context go to the paper exchange.
+
+    Returns:
+        bool: True when TRADING_MODE is 'paper' or the current user is in PAPER_USER_IDS.
+    """
+    return TRADING_MODE == 'paper' or current_user.get() in PAPER_USER_IDS
+
+
+def _rejection(code, message):
+    # Rejections are raised like the client raises them, so callers handle both the same way
+    from binance.exceptions import BinanceAPIException
+    return BinanceAPIException(None, 400, json.dumps({'code': code, 'msg': message}))
+
+
+def _text(value):
+    return f'{value:.8f}'
+
+
+class PaperExchange:
+    """
+    Simulated exchange for paper trading, a drop-in for the order endpoints of AsyncClient.
+
+    Implements create_order (MARKET, LIMIT and LIMIT_MAKER), create_oco_order, get_order and
+    cancel_order with the responses and errors of the exchange. Orders are matched against the
+    best bid and ask of their symbol, streamed from its bookTicker stream through the market
+    data hub or fed with on_quote(), e.g. from recorded book data. Market and marketable orders
+    take the top of the book, resting limit and stop orders are kept in price-ordered heaps and
+    matched on every quote. Fills are not limited by the quantity at the top of the book.
+
+    Orders must pass the LOT_SIZE, PRICE_FILTER and MIN_NOTIONAL filters of the symbol and
+    the balance of the account, which starts with `balance` USDT; every fill pays fee_rate of
+    its quote value in the quote asset. Accounts are kept per Telegram user, from current_user.
+    Order events are dispatched to handlers in the format of the user data stream, so the order
+    list tracker follows paper OCO exits like live ones. Finished orders are kept for get_order
+    until MAX_FINISHED_ORDERS newer ones finish.
+    """
+
+    def __init__(self, hub, balance=PAPER_BALANCE, fee_rate=PAPER_FEE_RATE):
+        self.balance = balance
+        self.fee_rate = fee_rate
+        self._hub = hub
+        self._handlers = {}
+        # symbol: (bid, bid quantity, ask, ask quantity)
+        self._quotes = {}
+        self._quote_events = {}
+        self._streamed = set()
+        # symbol: {'bids', 'asks', 'stop_buys', 'stop_sells'} heaps of (key, order id)
+        self._books = {}
+        self._orders = {}
+        self._lists = {}
+        # Ids of finished orders, oldest first
+        self._finished = {}
+        # symbol: orders finished since its heaps were last compacted
+        self._stale = {}
+        # account: {asset: [free, locked]}
+        self._accounts = {}
+        self._ids = itertools.count(FIRST_ID)
+        hub.add_listener('book_ticker', self._on_book_ticker)
+
+    def add_handler(self, event_type, handler):
+        """
+        Register a handler for an event type, like on the user data stream.
+
+        Args:
+            event_type (str): The event type, 'executionReport' or 'listStatus'.
+            handler (callable): A function called with the event dict.
+
+        Returns:
+            None
+        """
+        self._handlers.setdefault(event_type, []).append(handler)
+
+    def balances(self, account=None):
+        """
+        Get the balances of a paper account.
+
+        Args:
+            account (int, optional): The Telegram user id. Defaults to the current user.
+
+        Returns:
+            dict: Asset: (free, locked).
+        """
+        account = current_user.get() if account is None else account
+        return {asset: tuple(balance) for asset, balance in self._account(account).items()}
+
+    async def close(self):
+        """
+        Release the bookTicker streams of the traded symbols.
+
+        Returns:
+            None
+        """
+        for symbol in self._streamed:
+            await self._hub.release('book_ticker', symbol)
+        self._streamed.clear()
+
+    def on_quote(self, symbol, bid, bid_qty, ask, ask_qty):
+        """
+        Update the best bid and ask of a symbol and match its resting orders.
+
+        Args:
+            symbol (str): The trading symbol.
+            bid (float): The best bid price.
+            bid_qty (float): The quantity at the best bid.
+            ask (float): The best ask price.
+            ask_qty (float): The quantity at the best ask.
+
+        Returns:
+            None
+        """
+        self._quotes[symbol] = (bid, bid_qty, ask, ask_qty)
+        event = self._quote_events.pop(symbol, None)
+        if event is not None:
+            event.set()
+        book = self._books.get(symbol)
+        if book is not None:
+            self._match(symbol, book, bid, ask)
+
+    async def create_order(self, symbol, side, type, quantity, price=None, timeInForce='GTC', **params):
+        """
+        Place an order.
+
+        Args:
+            symbol (str): The trading symbol.
+            side (str): 'BUY' or 'SELL'.
+            type (str): 'MARKET', 'LIMIT' or 'LIMIT_MAKER'.
+            quantity (float): The base quantity.
+            price (float, optional): The limit price of limit orders.
+            timeInForce (str, optional): Only 'GTC' is simulated. Defaults to 'GTC'.
+            **params: Other parameters of the endpoint, ignored.
+
+        Returns:
+            dict: The order with its fills, as in a FULL response.
+        """
+        if type not in ('MARKET', 'LIMIT', 'LIMIT_MAKER'):
+            raise _rejection(-1116, 'Invalid orderType.')
+        if type != 'MARKET' and price is None:
+            raise _rejection(-1102, "Mandatory parameter 'price' was not sent, was empty/null, or malformed.")
+        quantity = float(quantity)
+        limit = None if type == 'MARKET' else float(price)
+        bid, _, ask, _ = await self._quote(symbol)
+        await self._check_filters(symbol, quantity, limit, ask if side == 'BUY' else bid)
+        taker = ask if side == 'BUY' else bid
+        marketable = limit is None or (limit >= ask if side == 'BUY' else limit <= bid)
+        if type == 'LIMIT_MAKER' and marketable:
+            raise _rejection(-2010, 'Order would immediately match and take.')
+
+        account = current_user.get()
+        order = self._new_order(account, symbol, side, type, quantity, limit, timeInForce)
+        if marketable:
+            # Takers pay the top of the book, a limit order never more than its limit
+            self._reserve(order, order, quantity, taker)
+            self._orders[order['orderId']] = order
+            self._report(order, 'NEW')
+            self._fill(order, taker)
+        else:
+            self._reserve(order, order, quantity, limit)
+            self._orders[order['orderId']] = order
+            self._report(order, 'NEW')
+            self._rest(order)
+        return self._response(order)
+
+    async def create_oco_order(self, symbol, side, quantity, price, stopPrice, stopLimitPrice=None,
+                               stopLimitTimeInForce='GTC', **params):
+        """
+        Place an OCO order list of a LIMIT_MAKER leg and a STOP_LOSS_LIMIT leg.
+
+        Args:
+            symbol (str): The trading symbol.
+            side (str): 'BUY' or 'SELL'.
+            quantity (float): The base quantity of both legs.
+            price (float): The limit price of the LIMIT_MAKER leg.
+            stopPrice (float): The trigger price of the stop leg.
+            stopLimitPrice (float, optional): The limit price of the stop leg. Defaults to
+                stopPrice.
+            stopLimitTimeInForce (str, optional): Only 'GTC' is simulated. Defaults to 'GTC'.
+            **params: Other parameters of the endpoint, ignored.
+
+        Returns:
+            dict: The order list, as returned by the exchange.
+        """
+        quantity, price, stop_price = float(quantity), float(price), float(stopPrice)
+        stop_limit = stop_price if stopLimitPrice is None else float(stopLimitPrice)
+        bid, _, ask, _ = await self._quote(symbol)
+        if side == 'SELL':
+            valid = price > bid and stop_price < bid
+        else:
+            valid = price < ask and stop_price > ask
+        if not valid:
+            raise _rejection(-2010, 'The relationship of the prices for the orders is not correct.')
+        await self._check_filters(symbol, quantity, price, price)
+        await self._check_filters(symbol, quantity, stop_limit, stop_limit)
+
+        account = current_user.get()
+        order_list = {
+            'orderListId': next(self._ids),
+            'contingencyType': 'OCO',
+            'listStatusType': 'EXEC_STARTED',
+            'listOrderStatus': 'EXECUTING',
+            'symbol': symbol,
+            'transactionTime': int(time.time() * 1000),
+            '_account': account,
+            '_lock': None,
+        }
+        stop = self._new_order(account, symbol, side, 'STOP_LOSS_LIMIT', quantity, stop_limit,
+                               stopLimitTimeInForce, stop_price, order_list['orderListId'])
+        limit = self._new_order(account, symbol, side, 'LIMIT_MAKER', quantity, price, 'GTC', None,
+                                order_list['orderListId'])
+        # Both legs sell or buy the same quantity, it is reserved once for the list
+        self._reserve(limit, order_list, quantity, max(price, stop_limit) if side == 'BUY' else price)
+        order_list['_legs'] = (stop['orderId'], limit['orderId'])
+        self._lists[order_list['orderListId']] = order_list
+        for order in (stop, limit):
+            self._orders[order['orderId']] = order
+        self._list_status(order_list)
+        for order in (stop, limit):
+            self._report(order, 'NEW')
+            self._rest(order)
+        return self._list_response(order_list)
+
+    async def get_order(self, symbol, orderId, **params):
+        """
+        Get an order.
+
+        Args:
+            symbol (str): The trading symbol.
+            orderId (int): The order id.
+            **params: Other parameters of the endpoint, ignored.
+
+        Returns:
+            dict: The order.
+        """
+        order = self._orders.get(int(orderId))
+        if order is None or order['symbol'] != symbol:
+            raise _rejection(-2013, 'Order does not exist.')
+        return self._response(order)
+
+    async def cancel_order(self, symbol, orderId, **params):
+        """
+        Cancel an open order, and the other leg when it belongs to an OCO order list.
+
+        Args:
+            symbol (str): The trading symbol.
+            orderId (int): The order id.
+            **params: Other parameters of the endpoint, ignored.
+
+        Returns:
+            dict: The canceled order.
+        """
+        order = self._orders.get(int(orderId))
+        if order is None or order['symbol'] != symbol or order['status'] not in OPEN_STATUSES:
+            raise _rejection(-2011, 'Unknown order sent.')
+        order_list = self._lists.get(order['orderListId'])
+        if order_list is None:
+            self._cancel(order)
+            self._unreserve(order)
+        else:
+            for order_id in order_list['_legs']:
+                if self._is_open(order_id):
+                    self._cancel(self._orders[order_id])
+            self._unreserve(order_list)
+            self._finish_list(order_list)
+        return self._response(order)
+
+    def _account(self, account):
+        balances = self._accounts.get(account)
+        if balances is None:
+            balances = self._accounts[account] = {'USDT': [self.balance, 0.0]}
+        return balances
+
+    def _assets(self, symbol):
+        base, quote = exchange_info.assets.get(symbol, (None, None))
+        if base is None:
+            # Without exchange information the quote asset is the usual USDT
+            base, quote = symbol[:-4], symbol[-4:]
+        return base, quote
+
+    async def _quote(self, symbol):
+        quote = self._quotes.get(symbol)
+        if quote is not None:
+            return quote
+        if symbol not in self._streamed:
+            self._streamed.add(symbol)
+            await self._hub.acquire('book_ticker', symbol)
+        event = self._quote_events.setdefault(symbol, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), QUOTE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise _rejection(-1, f'No market data for {symbol}.') from None
+        return self._quotes[symbol]
+
+    def _on_book_ticker(self, data):
+        self.on_quote(data['s'], float(data['b']), float(data['B']), float(data['a']), float(data['A']))
+
+    async def _check_filters(self, symbol, quantity, price, reference_price):
+        filters = exchange_info.filters.get(symbol)
+        if filters is None:
+            await exchange_info.load()
+            filters = exchange_info.filters.get(symbol, {})
+        step = filters.get('step_size')
+        if (quantity < filters.get('min_qty', 0) or quantity > filters.get('max_qty', float('inf'))
+                or step and Decimal(str(quantity)) % step):
+            raise _rejection(-1013, 'Filter failure: LOT_SIZE')
+        tick = filters.get('tick_size')
+        # A maximum price of 0 disables the rule, like on the exchange
+        max_price = filters.get('max_price') or float('inf')
+        if price is not None and (price < filters.get('min_price', 0) or price > max_price
+                                  or tick and Decimal(str(price)) % tick):
+            raise _rejection(-1013, 'Filter failure: PRICE_FILTER')
+        if quantity * reference_price < filters.get('min_notional', 0):
+            raise _rejection(-1013, 'Filter failure: NOTIONAL')
+
+    def _new_order(self, account, symbol, side, order_type, quantity, price, time_in_force, stop_price=None,
+                   order_list_id=-1):
+        now = int(time.time() * 1000)
+        order_id = next(self._ids)
+        return {
+            'symbol': symbol,
+            'orderId': order_id,
+            'orderListId': order_list_id,
+            'clientOrderId': f'paper{order_id}',
+            'price': price or 0.0,
+            'origQty': quantity,
+            'executedQty': 0.0,
+            'cummulativeQuoteQty': 0.0,
+            'status': 'NEW',
+            'timeInForce': time_in_force,
+            'type': order_type,
+            'side': side,
+            'stopPrice': stop_price or 0.0,
+            'time': now,
+            'updateTime': now,
+            'fills': [],
+            '_account': account,
+            '_lock': None,
+            '_triggered': False,
+        }
+
+    def _reserve(self, order, holder, quantity, price):
+        # Moves what the order may spend from free to locked, the fee of buys included
+        base, quote = self._assets(order['symbol'])
+        balances = self._account(order['_account'])
+        if order['side'] == 'BUY':
+            asset, amount = quote, quantity * price * (1 + self.fee_rate)
+        else:
+            asset, amount = base, quantity
+        balance = balances.setdefault(asset, [0.0, 0.0])
+        if balance[0] < amount - 1e-12:
+            raise _rejection(-2010, 'Account has insufficient balance for requested action.')
+        balance[0] -= amount
+        balance[1] += amount
+        holder['_lock'] = (asset, amount)
+
+    def _unreserve(self, holder):
+        if holder['_lock'] is None:
+            return
+        asset, amount = holder['_lock']
+        balance = self._account(holder['_account'])[asset]
+        balance[0] += amount
+        balance[1] -= amount
+        holder['_lock'] = None
+
+    def _rest(self, order):
+        book = self._books.get(order['symbol'])
+        if book is None:
+            book = self._books[order['symbol']] = {'bids': [], 'asks': [], 'stop_buys': [], 'stop_sells': []}
+        if order['type'] == 'STOP_LOSS_LIMIT' and not order['_triggered']:
+            if order['side'] == 'BUY':
+                heapq.heappush(book['stop_buys'], (order['stopPrice'], order['orderId']))
+            else:
+                heapq.heappush(book['stop_sells'], (-order['stopPrice'], order['orderId']))
+        elif order['side'] == 'BUY':
+            heapq.heappush(book['bids'], (-order['price'], order['orderId']))
+        else:
+            heapq.heappush(book['asks'], (order['price'], order['orderId']))
+
+    def _pop_open(self, heap):
+        # Canceled and filled orders are dropped from the heaps when they reach the top
+        while heap and not self._is_open(heap[0][1]):
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def _is_open(self, order_id):
+        order = self._orders.get(order_id)
+        return order is not None and order['status'] in OPEN_STATUSES
+
+    def _retire(self, order):
+        # Finished orders stay readable with get_order until MAX_FINISHED_ORDERS newer ones finish
+        self._finished[order['orderId']] = None
+        if len(self._finished) > MAX_FINISHED_ORDERS:
+            order_id = next(iter(self._finished))
+            del self._finished[order_id]
+            old = self._orders.pop(order_id)
+            self._lists.pop(old['orderListId'], None)
+        symbol = order['symbol']
+        stale = self._stale[symbol] = self._stale.get(symbol, 0) + 1
+        book = self._books.get(symbol)
+        if book is None or stale < COMPACT_MIN or stale * 2 < sum(len(heap) for heap in book.values()):
+            return
+        # Entries below the top are only popped when the price gets there, drop the dead ones
+        for heap in book.values():
+            heap[:] = [entry for entry in heap if self._is_open(entry[1])]
+            heapq.heapify(heap)
+        self._stale[symbol] = 0
+
+    def _match(self, symbol, book, bid, ask):
+        while True:
+            top = self._pop_open(book['stop_sells'])
+            if top is None or -top[0] < bid:
+                break
+            heapq.heappop(book['stop_sells'])
+            self._trigger(self._orders[top[1]], bid, ask)
+        while True:
+            top = self._pop_open(book['stop_buys'])
+            if top is None or top[0] > ask:
+                break
+            heapq.heappop(book['stop_buys'])
+            self._trigger(self._orders[top[1]], bid, ask)
+        while True:
+            top = self._pop_open(book['bids'])
+            if top is None or -top[0] < ask:
+                break
+            heapq.heappop(book['bids'])
+            order = self._orders[top[1]]
+            self._fill(order, order['price'])
+        while True:
+            top = self._pop_open(book['asks'])
+            if top is None or top[0] > bid:
+                break
+            heapq.heappop(book['asks'])
+            order = self._orders[top[1]]
+            self._fill(order, order['price'])
+
+    def _trigger(self, order, bid, ask):
+        # A triggered stop becomes a limit order, taking the book when its limit allows it
+        order['_triggered'] = True
+        if order['side'] == 'SELL' and order['price'] <= bid:
+            self._fill(order, bid)
+        elif order['side'] == 'BUY' and order['price'] >= ask:
+            self._fill(order, ask)
+        else:
+            self._rest(order)
+
+    def _fill(self, order, price):
+        quantity = order['origQty']
+        base, quote = self._assets(order['symbol'])
+        order_list = self._lists.get(order['orderListId'])
+        holder = order if order_list is None else order_list
+        balances = self._account(order['_account'])
+        value = quantity * price
+        fee = value * self.fee_rate
+        asset, amount = holder['_lock']
+        if order['side'] == 'BUY':
+            spent = value + fee
+            balances[quote][1] -= amount
+            balances[quote][0] += amount - spent
+            balances.setdefault(base, [0.0, 0.0])[0] += quantity
+        else:
+            balances[base][1] -= amount
+            balances[base][0] += amount - quantity
+            balances.setdefault(quote, [0.0, 0.0])[0] += value - fee
+        holder['_lock'] = None
+
+        order['executedQty'] = quantity
+        order['cummulativeQuoteQty'] = value
+        order['status'] = 'FILLED'
+        order['updateTime'] = int(time.time() * 1000)
+        order['fills'].append({'price': _text(price), 'qty': _text(quantity), 'commission': _text(fee),
+                               'commissionAsset': quote, 'tradeId': next(self._ids)})
+        self._report(order, 'TRADE', price, quantity, fee, quote)
+        self._retire(order)
+        if order_list is not None:
+            for order_id in order_list['_legs']:
+                if self._is_open(order_id):
+                    self._cancel(self._orders[order_id])
+            self._finish_list(order_list)
+
+    def _cancel(self, order):
+        order['status'] = 'CANCELED'
+        order['updateTime'] = int(time.time() * 1000)
+        self._report(order, 'CANCELED')
+        self._retire(order)
+
+    def _finish_list(self, order_list):
+        order_list['listStatusType'] = 'ALL_DONE'
+        order_list['listOrderStatus'] = 'ALL_DONE'
+        order_list['transactionTime'] = int(time.time() * 1000)
+        self._list_status(order_list)
+
+    def _dispatch(self, event):
+        for handler in list(self._handlers.get(event['e'], ())):
+            handler(event)
+
+    def _report(self, order, execution_type, last_price=0.0, last_quantity=0.0, fee=0.0, fee_asset=None):
+        if 'executionReport' not in self._handlers:
+            return
+        self._dispatch({
+            'e': 'executionReport', 'E': order['updateTime'], 's': order['symbol'], 'c': order['clientOrderId'],
+            'S': order['side'], 'o': order['type'], 'f': order['timeInForce'], 'q': _text(order['origQty']),
+            'p': _text(order['price']), 'P': _text(order['stopPrice']), 'x': execution_type, 'X': order['status'],
+            'i': order['orderId'], 'l': _text(last_quantity), 'z': _text(order['executedQty']),
+            'L': _text(last_price), 'n': _text(fee), 'N': fee_asset, 'T': order['updateTime'],
+            'g': order['orderListId'], 'Z': _text(order['cummulativeQuoteQty']),
+        })
+
+    def _list_status(self, order_list):
+        if 'listStatus' not in self._handlers:
+            return
+        self._dispatch({
+            'e': 'listStatus', 'E': order_list['transactionTime'], 's': order_list['symbol'],
+            'g': order_list['orderListId'], 'c': order_list['contingencyType'],
+            'l': order_list['listStatusType'], 'L': order_list['listOrderStatus'], 'r': 'NONE',
+            'T': order_list['transactionTime'],
+            'O': [{'s': order_list['symbol'], 'i': order_id} for order_id in order_list['_legs']],
+        })
+
+    @staticmethod
+    def _response(order):
+        response = {key: value for key, value in order.items() if not key.startswith('_')}
+        for key in ('price', 'origQty', 'executedQty', 'cummulativeQuoteQty', 'stopPrice'):
+            response[key] = _text(response[key])
+        response['transactTime'] = order['updateTime']
+        response['fills'] = list(order['fills'])
+        return response
+
+    def _list_response(self, order_list):
+        response = {key: value for key, value in order_list.items() if not key.startswith('_')}
+        response['orders'] = [{'symbol': order_list['symbol'], 'orderId': order_id,
+                               'clientOrderId': self._orders[order_id]['clientOrderId']}
+                              for order_id in order_list['_legs']]
+        response['orderReports'] = [self._response(self._orders[order_id]) for order_id in order_list['_legs']]
+        return response
+
+
+paper_exchange = PaperExchange(market_data)
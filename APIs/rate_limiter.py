@@ -0,0 +1,230 @@
+import asyncio
+import bisect
+import itertools
+import logging
+import time
+
+from loader import get_client
+from utils.metrics import registry, binance_requests, binance_latency, binance_wait
+
+# Request priorities, lower values are served first
+ORDER = 0
+ACCOUNT = 1
+MARKET_DATA = 2
+
+# Binance spot limits: request weight per IP and order count per account
+WEIGHT_LIMIT = 6000
+WEIGHT_PERIOD = 60
+ORDER_LIMIT = 50
+ORDER_PERIOD = 10
+DAILY_ORDER_LIMIT = 160000
+
+# Weight kept free for orders and account requests, market data can never use it
+RESERVED_WEIGHT = 300
+
+# Endpoint name: (request weight, order count, priority)
+ENDPOINTS = {
+    'ping': (1, 0, MARKET_DATA),
+    'exchange_info': (20, 0, MARKET_DATA),
+    'ticker': (2, 0, MARKET_DATA),
+    'ticker_all': (80, 0, MARKET_DATA),
+    'klines': (2, 0, MARKET_DATA),
+    'account': (20, 0, ACCOUNT),
+    'open_orders': (6, 0, ACCOUNT),
+    'open_orders_all': (80, 0, ACCOUNT),
+    'order_status': (4, 0, ACCOUNT),
+    'order_list': (4, 0, ACCOUNT),
+    'listen_key': (2, 0, ACCOUNT),
+    'order': (1, 1, ORDER),
+    'cancel_order': (1, 0, ORDER),
+    'oco_order': (1, 2, ORDER),
+}
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously, at capacity tokens per period.
+    """
+
+    def __init__(self, capacity, period):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = capacity
+        self.blocked_until = 0
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount, reserve=0):
+        """
+        Get the number of seconds until amount tokens are available.
+
+        Args:
+            amount (float): The number of tokens.
+            reserve (float, optional): Tokens that must remain in the bucket. Defaults to 0.
+
+        Returns:
+            float: Zero if the tokens can be taken now.
+        """
+        self._refill()
+        missing = amount + reserve - self.tokens
+        blocked = max(0.0, self.blocked_until - time.monotonic())
+        return max(blocked, missing / self.rate if missing > 0 else 0.0)
+
+    def take(self, amount):
+        self._refill()
+        self.tokens -= amount
+
+    def sync(self, used):
+        """
+        Align the bucket with the usage reported by the server.
+
+        Args:
+            used (float): Tokens the server counts as used in the current window.
+
+        Returns:
+            None
+        """
+        self._refill()
+        self.tokens = min(self.tokens, self.capacity - used)
+
+    def block(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class RequestScheduler:
+    """
+    Central scheduler of Binance REST requests.
+
+    Every request takes its weight from the per-IP bucket and its order count from the
+    per-account buckets before it is sent. Buckets are corrected with the X-MBX-USED-WEIGHT
+    and X-MBX-ORDER-COUNT headers of the responses and blocked for Retry-After seconds on
+    429/418 replies. Waiting requests are served by priority, and market data can not use the
+    reserved weight, so a stop-loss order is never delayed by screening.
+    """
+
+    def __init__(self, weight_limit=WEIGHT_LIMIT, order_limit=ORDER_LIMIT,
+                 daily_order_limit=DAILY_ORDER_LIMIT, reserved_weight=RESERVED_WEIGHT):
+        self.weight = TokenBucket(weight_limit, WEIGHT_PERIOD)
+        self.orders = TokenBucket(order_limit, ORDER_PERIOD)
+        self.daily_orders = TokenBucket(daily_order_limit, 86400)
+        self.reserved_weight = reserved_weight
+        self._waiters = []
+        self._counter = itertools.count()
+        self._timer = None
+
+    def _wait_time(self, weight, orders, priority):
+        reserve = self.reserved_weight if priority == MARKET_DATA else 0
+        weight_wait = self.weight.wait_time(weight, reserve)
+        order_wait = max(self.orders.wait_time(orders), self.daily_orders.wait_time(orders)) if orders else 0.0
+        return weight_wait, order_wait
+
+    def _take(self, weight, orders):
+        self.weight.take(weight)
+        if orders:
+            self.orders.take(orders)
+            self.daily_orders.take(orders)
+
+    async def acquire(self, weight, orders=0, priority=MARKET_DATA):
+        """
+        Wait until a request may be sent and take its weight and order count.
+
+        Args:
+            weight (int): The request weight.
+            orders (int, optional): The number of orders the request creates. Defaults to 0.
+            priority (int, optional): ORDER, ACCOUNT or MARKET_DATA. Defaults to MARKET_DATA.
+
+        Returns:
+            None
+        """
+        if not self._waiters and self._wait_time(weight, orders, priority) == (0.0, 0.0):
+            self._take(weight, orders)
+            return
+        future = asyncio.get_running_loop().create_future()
+        bisect.insort(self._waiters, (priority, next(self._counter), weight, orders, future))
+        self._drain()
+        await future
+
+    def _drain(self):
+        delay = None
+        for entry in list(self._waiters):
+            priority, _, weight, orders, future = entry
+            if future.done():
+                self._waiters.remove(entry)
+                continue
+            weight_wait, order_wait = self._wait_time(weight, orders, priority)
+            if weight_wait == 0 and order_wait == 0:
+                self._waiters.remove(entry)
+                self._take(weight, orders)
+                future.set_result(None)
+                continue
+            wait = max(weight_wait, order_wait)
+            delay = wait if delay is None else min(delay, wait)
+            if weight_wait > 0:
+                # Keep the weight for this request instead of giving it to lower priorities
+                break
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if delay is not None:
+            self._timer = asyncio.get_running_loop().call_later(delay, self._drain)
+
+    def _sync(self, response):
+        if response is None:
+            return
+        headers = response.headers
+        used_weight = headers.get('x-mbx-used-weight-1m')
+        if used_weight is not None:
+            self.weight.sync(float(used_weight))
+        order_count = headers.get('x-mbx-order-count-10s')
+        if order_count is not None:
+            self.orders.sync(float(order_count))
+        daily_count = headers.get('x-mbx-order-count-1d')
+        if daily_count is not None:
+            self.daily_orders.sync(float(daily_count))
+
+    async def call(self, endpoint, func, *args, **kwargs):
+        """
+        Send a request through the scheduler.
+
+        Args:
+            endpoint (str): The endpoint name, a key of ENDPOINTS.
+            func (callable): The AsyncClient method sending the request.
+            *args: Positional arguments for func.
+            **kwargs: Keyword arguments for func.
+
+        Returns:
+            The result of func.
+        """
+        weight, orders, priority = ENDPOINTS[endpoint]
+        queued = time.perf_counter()
+        await self.acquire(weight, orders, priority)
+        client = await get_client()
+        # Imported here, python-binance is loaded by get_client() and not at startup
+        from binance.exceptions import BinanceAPIException
+        registry.count_user_call()
+        started = time.perf_counter()
+        binance_wait.observe(started - queued, endpoint)
+        outcome = 'ok'
+        try:
+            return await func(*args, **kwargs)
+        except BinanceAPIException as e:
+            outcome = str(e.status_code)
+            if e.status_code in (418, 429):
+                retry_after = float(e.response.headers.get('Retry-After', WEIGHT_PERIOD))
+                logging.warning('Binance rate limit hit (%s), pausing requests for %s s', e.status_code, retry_after)
+                self.weight.block(retry_after)
+            raise
+        except Exception as e:
+            outcome = type(e).__name__
+            raise
+        finally:
+            binance_latency.observe(time.perf_counter() - started, endpoint)
+            binance_requests.inc(endpoint, outcome)
+            self._sync(getattr(client, 'response', None))
+
+
+rate_limiter = RequestScheduler()
@@ -0,0 +1,240 @@
+import asyncio
+import math
+import time
+
+import numpy as np
+
+from APIs.candle_store import candle_store
+from APIs.intervals import BINANCE_INTERVALS, candle_open_time, to_binance
+from APIs.klines import KLINE_DTYPE
+from APIs.streams import market_data
+
+# Intervals built from the one-minute stream, every interval offered by the keyboard
+RESAMPLED_INTERVALS = tuple(BINANCE_INTERVALS.values())
+
+
+class PartialCandle:
+    """
+    A candle of any interval built from the one-minute candles inside it.
+
+    The one-minute candles that closed are folded into the open, high, low and volume of the
+    candle, the one still forming is kept apart and replaced by every update, so repeated
+    updates of a minute are never counted twice.
+    """
+
+    __slots__ = ('open_time', 'open', 'high', 'low', 'close', 'volume', 'minute', '_last')
+
+    def __init__(self, open_time, open_, high=-math.inf, low=math.inf, close=None, volume=0.0):
+        self.open_time = open_time
+        self.open = open_
+        self.high = high
+        self.low = low
+        self.close = open_ if close is None else close
+        self.volume = volume
+        # Open time and (high, low, close, volume) of the forming one-minute candle
+        self.minute = None
+        self._last = None
+
+    @classmethod
+    def from_record(cls, record):
+        return cls(int(record['open_time']), float(record['open']), float(record['high']),
+                   float(record['low']), float(record['close']), float(record['volume']))
+
+    def update(self, minute, high, low, close, volume):
+        """
+        Apply a one-minute candle inside this candle.
+
+        Args:
+            minute (int): The open time of the one-minute candle in milliseconds.
+            high (float): Its high.
+            low (float): Its low.
+            close (float): Its close, or last price while it is forming.
+            volume (float): Its volume so far.
+
+        Returns:
+            None
+        """
+        if minute != self.minute and self._last is not None:
+            # The previous minute is final once a later one arrives
+            self._fold()
+        self.minute = minute
+        self._last = (high, low, close, volume)
+
+    def split_minute(self, minute, high, low, close, volume):
+        """
+        Keep the forming one-minute candle apart from a candle that already includes it.
+
+        A candle loaded from the exchange counts the volume of its forming minute so far, the
+        stream then sends that minute again with its whole volume.
+
+        Args:
+            minute (int): The open time of the forming one-minute candle in milliseconds.
+            high (float): Its high.
+            low (float): Its low.
+            close (float): Its last price.
+            volume (float): Its volume so far.
+
+        Returns:
+            None
+        """
+        self.volume = max(self.volume - volume, 0.0)
+        self.minute = minute
+        self._last = (high, low, close, volume)
+
+    def _fold(self):
+        high, low, close, volume = self._last
+        self.high = max(self.high, high)
+        self.low = min(self.low, low)
+        self.close = close
+        self.volume += volume
+        self._last = None
+
+    def record(self):
+        """
+        Get the candle including the forming minute.
+
+        Returns:
+            tuple: The open time followed by OHLCV, a record of KLINE_DTYPE.
+        """
+        if self._last is None:
+            return self.open_time, self.open, self.high, self.low, self.close, self.volume
+        high, low, close, volume = self._last
+        return (self.open_time, self.open, max(self.high, high), min(self.low, low), close,
+                self.volume + volume)
+
+
+class Resampler:
+    """
+    Candles of every interval of a symbol kept current from its one-minute kline stream.
+
+    The history of an interval is loaded once from the candle store, then the forming candle
+    of every interval is updated in memory by each kline message and written to the store
+    when a minute closes. Candle boundaries are those of the exchange, from candle_open_time.
+    Serving another interval of a watched symbol costs no stream subscription and, after its
+    history, no request.
+
+    The candle forming when an interval is loaded comes from the exchange, its running minute
+    is split from it with the one-minute candle of the store. After a reconnect the candles
+    are loaded again, as minutes may have been missed. The one-minute streams are shared
+    through the market data hub.
+    """
+
+    def __init__(self, hub, store, intervals=RESAMPLED_INTERVALS):
+        self.intervals = tuple(to_binance(interval) for interval in intervals)
+        self._hub = hub
+        self._store = store
+        # (symbol, interval): PartialCandle
+        self._candles = {}
+        self._locks = {}
+        hub.add_listener('kline', self._on_kline, '1m', on_idle=self._forget)
+        hub.add_reconnect_handler(self._on_reconnect)
+
+    async def watch(self, symbol):
+        """
+        Start resampling a symbol.
+
+        Args:
+            symbol (str): The trading symbol.
+
+        Returns:
+            None
+        """
+        await self._hub.acquire('kline', symbol, '1m')
+
+    async def unwatch(self, symbol):
+        """
+        Stop resampling a symbol once no coroutine watches it.
+
+        Args:
+            symbol (str): The trading symbol.
+
+        Returns:
+            None
+        """
+        await self._hub.release('kline', symbol, '1m')
+
+    async def load(self, symbol, interval, start_time):
+        """
+        Get candles from start_time up to now, with the forming candle kept by the stream.
+
+        Symbols without a one-minute stream and intervals that are not resampled are loaded from
+        the candle store as is.
+
+        Args:
+            symbol (str): The trading symbol.
+            interval (str): The kline interval.
+            start_time (int): The first open time to return, in milliseconds.
+
+        Returns:
+            numpy.ndarray: The candles of KLINE_DTYPE.
+        """
+        interval = to_binance(interval)
+        key = (symbol, interval)
+        if not self._hub.is_live('kline', symbol, '1m') or interval not in self.intervals:
+            return await self._store.load(symbol, interval, start_time)
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            candle = self._candles.get(key)
+            if candle is None:
+                records = await self._store.load(symbol, interval, start_time)
+                if len(records):
+                    candle = await self._seed(symbol, interval, records[-1])
+                    if self._hub.is_live('kline', symbol, '1m'):
+                        self._candles[key] = candle
+                return records
+            stored = self._store.read(symbol, interval)
+            if not len(stored) or start_time < stored['open_time'][0]:
+                # Older history than stored, the forming candle below still wins
+                await self._store.load(symbol, interval, start_time)
+            records = self._store.read(symbol, interval, start_time)
+        forming = np.array([candle.record()], dtype=KLINE_DTYPE)
+        if len(records) and records['open_time'][-1] == candle.open_time:
+            return np.concatenate((records[:-1], forming))
+        return np.concatenate((records, forming))
+
+    async def _seed(self, symbol, interval, record):
+        candle = PartialCandle.from_record(record)
+        if interval == '1m':
+            minute = record
+        else:
+            minutes = await self._store.load(symbol, '1m', candle_open_time('1m', int(time.time() * 1000)))
+            if not len(minutes) or candle_open_time(interval, int(minutes['open_time'][-1])) != candle.open_time:
+                return candle
+            minute = minutes[-1]
+        # The stream updates the running minute with its whole volume, it is counted once
+        candle.split_minute(int(minute['open_time']), float(minute['high']), float(minute['low']),
+                            float(minute['close']), float(minute['volume']))
+        return candle
+
+    def _persist(self, symbol, interval, candle):
+        self._store.write(symbol, interval, np.array([candle.record()], dtype=KLINE_DTYPE))
+
+    def _forget(self, symbol):
+        for interval in self.intervals:
+            self._candles.pop((symbol, interval), None)
+
+    def _on_reconnect(self):
+        self._candles.clear()
+
+    def _on_kline(self, data):
+        symbol = data['s']
+        kline = data['k']
+        minute = kline['t']
+        high, low, close, volume = float(kline['h']), float(kline['l']), float(kline['c']), float(kline['v'])
+        for interval in self.intervals:
+            key = (symbol, interval)
+            candle = self._candles.get(key)
+            if candle is None:
+                continue
+            open_time = candle_open_time(interval, minute)
+            if open_time < candle.open_time:
+                continue
+            if open_time > candle.open_time:
+                # The candle closed, it is final in the store before the next one starts
+                self._persist(symbol, interval, candle)
+                candle = self._candles[key] = PartialCandle(open_time, float(kline['o']))
+            candle.update(minute, high, low, close, volume)
+            if kline['x']:
+                self._persist(symbol, interval, candle)
+
+
+resampler = Resampler(market_data, candle_store)
@@ -0,0 +1,263 @@
+import asyncio
+import collections
+import math
+import time
+
+import numpy as np
+
+from APIs.candle_store import candle_store
+from APIs.intervals import interval_ms, to_binance
+from APIs.streams import market_data
+
+# Number of one-minute candles the entry rule of strategy() looks at
+ENTRY_WINDOW = 120
+# Growth over the window, last close divided by the first, above which strategy() enters
+ENTRY_GROWTH = 100000
+
+
+class RollingWindow:
+    """
+    The closes of the last `size` candles of a symbol in a ring buffer.
+
+    Pushing a candle updates the cumulative return, minimum, maximum, mean and volatility in
+    O(1): sums are kept running and the minimum and maximum come from monotonic deques of the
+    earlier candles and the last close. The close of the still forming candle is replaced in
+    place until a candle with a later open time arrives, only then it enters the deques. The
+    running sums are recomputed from the buffer once every `size` candles, so rounding errors
+    do not accumulate.
+    """
+
+    def __init__(self, size):
+        if size < 2:
+            raise ValueError('A rolling window needs at least 2 candles')
+        self.size = size
+        self.open_time = None
+        # Candles pushed since the window was created, the absolute index of the next candle
+        self.count = 0
+        self._closes = np.empty(size)
+        self._close_sum = 0.0
+        # Sum and sum of squares of the candle-to-candle returns inside the window
+        self._return_sum = 0.0
+        self._return_squares = 0.0
+        # (absolute index, close) of the candles before the last one, with increasing closes
+        # for the minimum and decreasing closes for the maximum
+        self._lows = collections.deque()
+        self._highs = collections.deque()
+        self._appends = 0
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def _close(self, index):
+        return float(self._closes[index % self.size])
+
+    def push(self, open_time, close):
+        """
+        Add a candle, or update the close of the last one if it has the same open time.
+
+        Candles older than the last one are ignored.
+
+        Args:
+            open_time (int): The open time of the candle in milliseconds.
+            close (float): The close, or last price of a forming candle.
+
+        Returns:
+            None
+        """
+        if self.count and open_time == self.open_time:
+            self._replace(close)
+        elif self.open_time is None or open_time > self.open_time:
+            self._append(close)
+            self.open_time = open_time
+
+    def _append(self, close):
+        index = self.count
+        if index >= self.size:
+            oldest = index - self.size
+            dropped = self._close(oldest)
+            self._close_sum -= dropped
+            change = self._close(oldest + 1) / dropped - 1
+            self._return_sum -= change
+            self._return_squares -= change * change
+            if self._lows[0][0] == oldest:
+                self._lows.popleft()
+            if self._highs[0][0] == oldest:
+                self._highs.popleft()
+        if index:
+            previous = self._close(index - 1)
+            change = close / previous - 1
+            self._return_sum += change
+            self._return_squares += change * change
+            # The previous candle is final now
+            self._track(index - 1, previous)
+        self._closes[index % self.size] = close
+        self._close_sum += close
+        self.count = index + 1
+        self._appends += 1
+        if self._appends >= self.size:
+            self._resum()
+
+    def _replace(self, close):
+        index = self.count - 1
+        previous = self._close(index)
+        self._close_sum += close - previous
+        if index:
+            before = self._close(index - 1)
+            old_change, change = previous / before - 1, close / before - 1
+            self._return_sum += change - old_change
+            self._return_squares += change * change - old_change * old_change
+        self._closes[index % self.size] = close
+
+    def _track(self, index, close):
+        while self._lows and self._lows[-1][1] >= close:
+            self._lows.pop()
+        self._lows.append((index, close))
+        while self._highs and self._highs[-1][1] <= close:
+            self._highs.pop()
+        self._highs.append((index, close))
+
+    def _resum(self):
+        closes = self.values()
+        self._close_sum = float(closes.sum())
+        changes = closes[1:] / closes[:-1] - 1
+        self._return_sum = float(changes.sum())
+        self._return_squares = float(changes @ changes)
+        self._appends = 0
+
+    def values(self):
+        """
+        Get the closes in the window from the oldest to the newest.
+
+        Returns:
+            numpy.ndarray: A copy of the closes.
+        """
+        start = self.count % self.size
+        if self.count <= self.size:
+            return self._closes[:self.count].copy()
+        return np.concatenate((self._closes[start:], self._closes[:start]))
+
+    @property
+    def first(self):
+        return self._close(self.count - len(self))
+
+    @property
+    def last(self):
+        return self._close(self.count - 1)
+
+    @property
+    def growth(self):
+        """
+        Get the last close divided by the first, the cumulative product of 1 + returns.
+        """
+        return self.last / self.first
+
+    @property
+    def low(self):
+        return min(self._lows[0][1], self.last) if self._lows else self.last
+
+    @property
+    def high(self):
+        return max(self._highs[0][1], self.last) if self._highs else self.last
+
+    @property
+    def mean(self):
+        return self._close_sum / len(self)
+
+    @property
+    def volatility(self):
+        """
+        Get the sample standard deviation of the candle-to-candle returns in the window.
+        """
+        n = len(self) - 1
+        if n < 2:
+            return 0.0
+        variance = (self._return_squares - self._return_sum * self._return_sum / n) / (n - 1)
+        return math.sqrt(max(variance, 0.0))
+
+
+class RollingIndicators:
+    """
+    Rolling windows of many symbols, kept current by their kline streams.
+
+    A window is filled once from the candle store and then updated by every kline message in
+    O(1). When the stream reconnects or skips a candle, the window is refilled on the next get().
+    Symbols are watched through the market data hub, a window lives as long as its stream.
+    """
+
+    def __init__(self, hub, store, size=ENTRY_WINDOW, interval='1m'):
+        self.size = size
+        self.interval = to_binance(interval)
+        self._step = interval_ms(interval)
+        self._hub = hub
+        self._store = store
+        self._windows = {}
+        self._stale = set()
+        self._locks = {}
+        hub.add_listener('kline', self._on_kline, self.interval, on_idle=self._forget)
+        hub.add_reconnect_handler(self._on_reconnect)
+
+    async def watch(self, symbol):
+        """
+        Start keeping the window of a symbol.
+
+        Args:
+            symbol (str): The trading symbol.
+
+        Returns:
+            None
+        """
+        await self._hub.acquire('kline', symbol, self.interval)
+
+    async def unwatch(self, symbol):
+        """
+        Stop keeping the window of a symbol once no coroutine watches it.
+
+        Args:
+            symbol (str): The trading symbol.
+
+        Returns:
+            None
+        """
+        await self._hub.release('kline', symbol, self.interval)
+
+    async def get(self, symbol):
+        """
+        Get the current window of a watched symbol, filling it from the candle store if needed.
+
+        Args:
+            symbol (str): The trading symbol.
+
+        Returns:
+            RollingWindow: The window, updated in place by the stream.
+        """
+        lock = self._locks.setdefault(symbol, asyncio.Lock())
+        async with lock:
+            if symbol in self._stale or symbol not in self._windows:
+                self._stale.discard(symbol)
+                start_time = int(time.time() * 1000) - self.size * self._step
+                records = await self._store.load(symbol, self.interval, start_time)
+                window = RollingWindow(self.size)
+                for open_time, close in zip(records['open_time'].tolist(), records['close'].tolist()):
+                    window.push(open_time, close)
+                self._windows[symbol] = window
+        return self._windows[symbol]
+
+    def _forget(self, symbol):
+        self._windows.pop(symbol, None)
+        self._stale.discard(symbol)
+
+    def _on_reconnect(self):
+        self._stale.update(self._windows)
+
+    def _on_kline(self, data):
+        window = self._windows.get(data['s'])
+        if window is None:
+            return
+        kline = data['k']
+        if window.open_time is not None and kline['t'] > window.open_time + self._step:
+            # A candle was missed, the window is refilled on the next get()
+            self._stale.add(data['s'])
+        window.push(kline['t'], float(kline['c']))
+
+
+rolling_indicators = RollingIndicators(market_data, candle_store)
@@ -0,0 +1,322 @@
+import asyncio
+import concurrent.futures
+import logging
+import multiprocessing
+import time
+
+import numpy as np
+
+from loader import SCANNER_SCORES, SCANNER_WORKERS
+from APIs.candle_store import candle_store
+from APIs.exchange_info import exchange_info
+from APIs.rolling import ENTRY_GROWTH, ENTRY_WINDOW
+from APIs.ticker_board import ticker_board
+
+# Seconds between two samples of the ticker board and between two scans
+SAMPLE_INTERVAL = 1
+SCAN_INTERVAL = 5
+# Symbols whose history is downloaded at the same time when the scanner starts
+BACKFILL_CONCURRENCY = 8
+# Candles the momentum score looks back
+MOMENTUM_SPAN = 15
+RSI_PERIOD = 14
+
+MINUTE_MS = 60 * 1000
+
+
+def growth(closes):
+    """
+    Last close divided by the first, the entry rule of strategy().
+
+    Args:
+        closes (numpy.ndarray): Closes of symbols x time, oldest first.
+
+    Returns:
+        numpy.ndarray: One score per symbol.
+    """
+    return closes[:, -1] / closes[:, 0]
+
+
+def momentum(closes):
+    """
+    Return over the last MOMENTUM_SPAN candles.
+
+    Args:
+        closes (numpy.ndarray): Closes of symbols x time, oldest first.
+
+    Returns:
+        numpy.ndarray: One score per symbol.
+    """
+    return closes[:, -1] / closes[:, -MOMENTUM_SPAN - 1] - 1
+
+
+def volatility(closes):
+    """
+    Sample standard deviation of the candle-to-candle returns.
+
+    Args:
+        closes (numpy.ndarray): Closes of symbols x time, oldest first.
+
+    Returns:
+        numpy.ndarray: One score per symbol.
+    """
+    return np.std(closes[:, 1:] / closes[:, :-1] - 1, axis=1, ddof=1)
+
+
+def trend(closes):
+    """
+    Least squares slope of the log closes, per candle.
+
+    Args:
+        closes (numpy.ndarray): Closes of symbols x time, oldest first.
+
+    Returns:
+        numpy.ndarray: One score per symbol.
+    """
+    t = np.arange(closes.shape[1]) - (closes.shape[1] - 1) / 2
+    y = np.log(closes)
+    return (y - y.mean(axis=1, keepdims=True)) @ t / (t @ t)
+
+
+def sharpe(closes):
+    """
+    Mean log return over its standard deviation, scaled to the window.
+
+    Args:
+        closes (numpy.ndarray): Closes of symbols x time, oldest first.
+
+    Returns:
+        numpy.ndarray: One score per symbol.
+    """
+    returns = np.diff(np.log(closes), axis=1)
+    std = returns.std(axis=1, ddof=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(std > 0, returns.mean(axis=1) / std * np.sqrt(returns.shape[1]), 0.0)
+
+
+def rsi(closes):
+    """
+    Relative strength index of the last candle with Wilder smoothing over RSI_PERIOD.
+
+    Args:
+        closes (numpy.ndarray): Closes of symbols x time, oldest first.
+
+    Returns:
+        numpy.ndarray: One score per symbol.
+    """
+    changes = np.diff(closes, axis=1)
+    gains = np.clip(changes, 0, None)
+    losses = np.clip(-changes, 0, None)
+    average_gain = gains[:, :RSI_PERIOD].mean(axis=1)
+    average_loss = losses[:, :RSI_PERIOD].mean(axis=1)
+    # The smoothing is recursive in time, one vectorized step per candle for all symbols
+    for column in range(RSI_PERIOD, changes.shape[1]):
+        average_gain = (average_gain * (RSI_PERIOD - 1) + gains[:, column]) / RSI_PERIOD
+        average_loss = (average_loss * (RSI_PERIOD - 1) + losses[:, column]) / RSI_PERIOD
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(average_loss > 0, 100 - 100 / (1 + average_gain / average_loss), 100.0)
+
+
+# Score name: function of a symbols x time matrix of closes returning one score per symbol
+SCORES = {
+    'growth': growth,
+    'momentum': momentum,
+    'volatility': volatility,
+    'trend': trend,
+    'sharpe': sharpe,
+    'rsi': rsi,
+}
+# Scores computed on the process pool when one is configured
+HEAVY_SCORES = frozenset({'rsi'})
+
+
+def compute_scores(closes, names):
+    """
+    Compute scores for every row of a matrix of closes.
+
+    Module level, so it can run in the worker processes of the scanner.
+
+    Args:
+        closes (numpy.ndarray): Closes of symbols x time, oldest first, without gaps.
+        names (tuple): Names of SCORES to compute.
+
+    Returns:
+        dict: Score name: numpy.ndarray with one score per row.
+    """
+    return {name: SCORES[name](closes) for name in names}
+
+
+class MarketScanner:
+    """
+    Entry rule and ranking scores of every tradable USDT pair, evaluated on one matrix.
+
+    The closes of the last `window` one-minute candles of all pairs are kept in a symbols x
+    time matrix. The history is downloaded once from the candle store; afterwards the ticker
+    board, fed by the all-market ticker stream, is sampled every second and its last prices
+    when a minute ends become the closes of that minute. The current prices stand for the
+    forming candle, as in the rolling windows of strategy().
+
+    Every few seconds the entry rule and the ranking scores are computed for all pairs at once
+    with vectorized NumPy, the heavier scores on a process pool, and the ranked candidates are
+    kept for strategies to read without requests of their own. Pairs listed after the start
+    are not scanned, and a pair whose history could not be downloaded is scanned once the
+    samples fill its window.
+    """
+
+    def __init__(self, board, store, window=ENTRY_WINDOW, scores=SCANNER_SCORES, workers=SCANNER_WORKERS):
+        unknown = [name for name in scores if name not in SCORES]
+        if unknown:
+            raise ValueError(f'Unknown scanner scores {unknown}, expected some of {list(SCORES)}')
+        self.window = window
+        self.scores = tuple(dict.fromkeys(('growth',) + tuple(scores)))
+        self.rank_by = scores[0] if scores else 'growth'
+        self.workers = workers
+        self.symbols = []
+        self.candidates = []
+        self.scanned_at = None
+        self._board = board
+        self._store = store
+        self._slots = None
+        # Closes of the candles before the forming one, oldest first
+        self._closed = None
+        # Last sample of the forming minute and its open time
+        self._forming = None
+        self._minute = None
+        self._pool = None
+        self._task = None
+        self._start_lock = asyncio.Lock()
+
+    async def start(self):
+        """
+        Download the history of every pair and start scanning, on the first call.
+
+        Returns:
+            None
+        """
+        if self._task is not None:
+            return
+        async with self._start_lock:
+            if self._task is not None:
+                return
+            await self._board.start()
+            await exchange_info.load()
+            size = self._board.size
+            self.symbols = [symbol for symbol, usdt in zip(self._board.symbols, self._board.usdt_mask[:size])
+                            if usdt and exchange_info.is_spot_symbol(symbol)]
+            self._slots = self._board.slots(self.symbols)
+            self._closed = np.full((len(self.symbols), self.window - 1), np.nan)
+            self._minute = int(time.time() * 1000) // MINUTE_MS * MINUTE_MS
+            self._forming = self._board.last_price[self._slots].copy()
+            await self._backfill()
+            await self.scan()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """
+        Stop scanning and the worker processes.
+
+        Returns:
+            None
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def best(self, k=1, entry=True):
+        """
+        Get the best ranked candidates of the last scan.
+
+        Args:
+            k (int, optional): The number of candidates. Defaults to 1.
+            entry (bool, optional): Only candidates meeting the entry rule. Defaults to True.
+
+        Returns:
+            list: Candidates as dicts with 'symbol', 'close', 'entry' and one key per score,
+                from the highest ranked.
+        """
+        candidates = [candidate for candidate in self.candidates if candidate['entry'] or not entry]
+        return candidates[:k]
+
+    async def _backfill(self):
+        start_time = self._minute - (self.window - 1) * MINUTE_MS
+        semaphore = asyncio.Semaphore(BACKFILL_CONCURRENCY)
+
+        async def fill(row, symbol):
+            async with semaphore:
+                try:
+                    records = await self._store.load(symbol, '1m', start_time)
+                except Exception as e:
+                    logging.warning('Scanner history of %s not loaded: %s', symbol, e)
+                    return
+            records = records[records['open_time'] < self._minute]
+            offsets = (records['open_time'] - start_time) // MINUTE_MS
+            self._closed[row, offsets] = records['close']
+
+        await asyncio.gather(*(fill(row, symbol) for row, symbol in enumerate(self.symbols)))
+
+    def _sample(self):
+        minute = int(time.time() * 1000) // MINUTE_MS * MINUTE_MS
+        if minute > self._minute:
+            # The last sample of a minute is its close, minutes without a sample repeat it
+            shift = min((minute - self._minute) // MINUTE_MS, self.window - 1)
+            self._closed[:, :-shift] = self._closed[:, shift:]
+            self._closed[:, -shift:] = self._forming[:, None]
+            self._minute = minute
+        self._forming = self._board.last_price[self._slots]
+
+    async def _run(self):
+        scanned = time.monotonic()
+        while True:
+            await asyncio.sleep(SAMPLE_INTERVAL)
+            self._sample()
+            if time.monotonic() - scanned >= SCAN_INTERVAL:
+                scanned = time.monotonic()
+                try:
+                    await self.scan()
+                except Exception:
+                    logging.exception('Market scan failed')
+
+    async def scan(self):
+        """
+        Evaluate the entry rule and the scores of every pair and rank the candidates.
+
+        Returns:
+            list: The ranked candidates, also kept in candidates.
+        """
+        closes = np.hstack((self._closed, self._forming[:, None]))
+        # Pairs with gaps in their window or without a price are left out
+        rows = np.flatnonzero((closes > 0).all(axis=1))
+        closes = closes[rows]
+        scores = compute_scores(closes, tuple(name for name in self.scores if name not in HEAVY_SCORES or not self.workers))
+        heavy = tuple(name for name in self.scores if name in HEAVY_SCORES and self.workers)
+        if heavy and len(rows):
+            scores.update(await self._compute_in_pool(closes, heavy))
+
+        order = np.argsort(-np.nan_to_num(scores[self.rank_by], nan=-np.inf), kind='stable')
+        entry = scores['growth'] > ENTRY_GROWTH
+        last = closes[:, -1]
+        self.candidates = [
+            {'symbol': self.symbols[rows[i]], 'close': float(last[i]), 'entry': bool(entry[i]),
+             **{name: float(values[i]) for name, values in scores.items()}}
+            for i in order.tolist()
+        ]
+        self.scanned_at = time.time()
+        return self.candidates
+
+    async def _compute_in_pool(self, closes, names):
+        if self._pool is None:
+            # Spawned, so the workers do not inherit the threads of the bot process
+            self._pool = concurrent.futures.ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context('spawn'))
+        loop = asyncio.get_running_loop()
+        chunks = np.array_split(closes, min(self.workers, len(closes)))
+        results = await asyncio.gather(*(loop.run_in_executor(self._pool, compute_scores, chunk, names)
+                                         for chunk in chunks))
+        return {name: np.concatenate([result[name] for result in results]) for name in names}
+
+
+market_scanner = MarketScanner(ticker_board, candle_store)
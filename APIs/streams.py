@@ -0,0 +1,407 @@
+import asyncio
+import functools
+import json
+import logging
+import time
+
+import websockets
+
+from loader import BINANCE_STREAM_URL, STREAM_IDLE_TIMEOUT
+
+STREAM_URL = f'{BINANCE_STREAM_URL}/stream'
+
+# Binance accepts at most 5 control messages per second on one connection
+SUBSCRIBE_CHUNK = 200
+SUBSCRIBE_PAUSE = 0.25
+
+# Stream names of the market data types, by data type
+STREAM_NAMES = {
+    'kline': '{symbol}@kline_{interval}',
+    'ticker': '{symbol}@ticker',
+    'book_ticker': '{symbol}@bookTicker',
+    'trade': '{symbol}@trade',
+}
+
+
+class StreamManager:
+    """
+    Multiplex Binance market streams over a single websocket connection.
+
+    Streams are subscribed and unsubscribed on the live connection. The connection is opened
+    with the first subscription, closed with the last one, and re-established automatically
+    with the full subscription set after a disconnect.
+    """
+
+    def __init__(self, url=STREAM_URL, max_backoff=30):
+        self.url = url
+        self.max_backoff = max_backoff
+        self._handlers = {}
+        self._reconnect_handlers = []
+        self._ws = None
+        self._task = None
+        self._request_id = 0
+
+    def add_reconnect_handler(self, handler):
+        """
+        Register a callback invoked every time the connection drops.
+
+        Args:
+            handler (callable): A function without arguments.
+
+        Returns:
+            None
+        """
+        self._reconnect_handlers.append(handler)
+
+    async def subscribe(self, stream, handler):
+        """
+        Subscribe a handler to a stream.
+
+        Args:
+            stream (str): The stream name, e.g. 'btcusdt@kline_1m'.
+            handler (callable): A function called with the 'data' part of every message.
+
+        Returns:
+            None
+        """
+        handlers = self._handlers.setdefault(stream, [])
+        handlers.append(handler)
+        if len(handlers) == 1:
+            await self._send('SUBSCRIBE', [stream])
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def unsubscribe(self, stream, handler):
+        """
+        Remove a handler from a stream, unsubscribing the stream when no handlers are left.
+
+        Args:
+            stream (str): The stream name.
+            handler (callable): The handler passed to subscribe().
+
+        Returns:
+            None
+        """
+        handlers = self._handlers.get(stream)
+        if not handlers or handler not in handlers:
+            return
+        handlers.remove(handler)
+        if not handlers:
+            del self._handlers[stream]
+            await self._send('UNSUBSCRIBE', [stream])
+        if not self._handlers:
+            await self.close()
+
+    async def close(self):
+        """
+        Close the connection and stop reconnecting.
+
+        Returns:
+            None
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _send(self, method, params):
+        # Without an open connection the subscription set is sent on connect
+        if self._ws is None:
+            return
+        for start in range(0, len(params), SUBSCRIBE_CHUNK):
+            self._request_id += 1
+            request = {'method': method, 'params': params[start:start + SUBSCRIBE_CHUNK], 'id': self._request_id}
+            try:
+                await self._ws.send(json.dumps(request))
+            except websockets.ConnectionClosed:
+                return
+            if start + SUBSCRIBE_CHUNK < len(params):
+                await asyncio.sleep(SUBSCRIBE_PAUSE)
+
+    def _dispatch(self, raw):
+        message = json.loads(raw)
+        stream = message.get('stream')
+        if stream is None:
+            # Replies to SUBSCRIBE/UNSUBSCRIBE requests
+            return
+        for handler in list(self._handlers.get(stream, ())):
+            try:
+                handler(message['data'])
+            except Exception:
+                logging.exception('Stream handler failed for %s', stream)
+
+    async def _run(self):
+        backoff = 1
+        while self._handlers:
+            try:
+                async with websockets.connect(self.url, ping_interval=20, max_size=None) as ws:
+                    self._ws = ws
+                    backoff = 1
+                    await self._send('SUBSCRIBE', list(self._handlers))
+                    async for raw in ws:
+                        self._dispatch(raw)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning('Binance stream connection lost: %s', e)
+            finally:
+                self._ws = None
+                for handler in self._reconnect_handlers:
+                    handler()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+
+class MarketDataHub:
+    """
+    Market data subscriptions shared by every user of the process.
+
+    Subscriptions are reference counted per (data type, symbol, interval) and each one is a
+    single upstream stream whatever the number of coroutines watching it. Every message fans
+    out to the listeners registered for its data type and interval, which keep their own state
+    per symbol, so the upstream load grows with the distinct instruments and not with users.
+
+    When the last reference is released the stream is kept for idle_timeout seconds: a symbol
+    watched again meanwhile, like the top coin of strategy() loops, keeps its stream and the
+    state built from it. After that the stream is torn down and the listeners drop the symbol.
+    """
+
+    def __init__(self, manager, idle_timeout=STREAM_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._manager = manager
+        # (data type, interval): [(handler, on_idle)]
+        self._listeners = {}
+        # (data type, symbol, interval): references
+        self._refs = {}
+        # (data type, symbol, interval): handler subscribed to the upstream stream
+        self._live = {}
+        # (data type, symbol, interval): task tearing the idle stream down
+        self._teardowns = {}
+
+    def add_listener(self, kind, handler, interval=None, on_idle=None):
+        """
+        Register a callback for every message of a data type.
+
+        Args:
+            kind (str): The data type, a key of STREAM_NAMES.
+            handler (callable): A function called with the 'data' part of every message.
+            interval (str, optional): The kline interval, for klines.
+            on_idle (callable, optional): A function called with the symbol when its stream
+                is torn down.
+
+        Returns:
+            None
+        """
+        self._listeners.setdefault((kind, interval), []).append((handler, on_idle))
+
+    def add_reconnect_handler(self, handler):
+        """
+        Register a callback invoked every time the upstream connection drops.
+
+        Args:
+            handler (callable): A function without arguments.
+
+        Returns:
+            None
+        """
+        self._manager.add_reconnect_handler(handler)
+
+    def is_live(self, kind, symbol, interval=None):
+        """
+        Tell whether the stream of a symbol is subscribed, watched or idle.
+
+        Args:
+            kind (str): The data type.
+            symbol (str): The trading symbol.
+            interval (str, optional): The kline interval, for klines.
+
+        Returns:
+            bool: True if messages of the symbol are being received.
+        """
+        return (kind, symbol, interval) in self._live
+
+    async def acquire(self, kind, symbol, interval=None):
+        """
+        Take a reference to the stream of a symbol, subscribing it if needed.
+
+        Args:
+            kind (str): The data type.
+            symbol (str): The trading symbol.
+            interval (str, optional): The kline interval, for klines.
+
+        Returns:
+            None
+        """
+        key = (kind, symbol, interval)
+        self._refs[key] = self._refs.get(key, 0) + 1
+        teardown = self._teardowns.pop(key, None)
+        if teardown is not None:
+            teardown.cancel()
+        if key not in self._live:
+            handler = self._live[key] = functools.partial(self._fan_out, (kind, interval))
+            await self._manager.subscribe(self._stream(key), handler)
+
+    async def release(self, kind, symbol, interval=None):
+        """
+        Drop a reference taken by acquire(); the stream is torn down once idle.
+
+        Args:
+            kind (str): The data type.
+            symbol (str): The trading symbol.
+            interval (str, optional): The kline interval, for klines.
+
+        Returns:
+            None
+        """
+        key = (kind, symbol, interval)
+        if key not in self._refs:
+            return
+        self._refs[key] -= 1
+        if self._refs[key] == 0:
+            del self._refs[key]
+            if self.idle_timeout:
+                self._teardowns[key] = asyncio.create_task(self._linger(key))
+            else:
+                await self._teardown(key)
+
+    async def close(self):
+        """
+        Tear every stream down.
+
+        Returns:
+            None
+        """
+        for teardown in self._teardowns.values():
+            teardown.cancel()
+        self._teardowns.clear()
+        self._refs.clear()
+        for key in list(self._live):
+            await self._teardown(key)
+
+    @staticmethod
+    def _stream(key):
+        kind, symbol, interval = key
+        return STREAM_NAMES[kind].format(symbol=symbol.lower(), interval=interval)
+
+    async def _linger(self, key):
+        await asyncio.sleep(self.idle_timeout)
+        self._teardowns.pop(key, None)
+        await self._teardown(key)
+
+    async def _teardown(self, key):
+        if key in self._refs or key not in self._live:
+            return
+        handler = self._live.pop(key)
+        kind, symbol, interval = key
+        for _, on_idle in self._listeners.get((kind, interval), ()):
+            if on_idle is not None:
+                on_idle(symbol)
+        await self._manager.unsubscribe(self._stream(key), handler)
+
+    def _fan_out(self, listeners_key, data):
+        for handler, _ in self._listeners.get(listeners_key, ()):
+            try:
+                handler(data)
+            except Exception:
+                logging.exception('Market data listener failed for %s', data.get('s'))
+
+
+class PriceFeed:
+    """
+    Latest prices of watched symbols, pushed by one-minute kline streams.
+
+    The streams are shared through the market data hub, so the prices of every symbol with a
+    one-minute kline stream are kept. Waiting for a price falls back to a REST request only
+    when the stream has been silent for too long.
+    """
+
+    def __init__(self, hub, gap_timeout=10):
+        self.gap_timeout = gap_timeout
+        self._hub = hub
+        self._prices = {}
+        self._events = {}
+        hub.add_listener('kline', self._on_kline, '1m', on_idle=self._forget)
+        hub.add_reconnect_handler(self._prices.clear)
+
+    async def watch(self, symbol):
+        """
+        Start receiving prices for a symbol.
+
+        Args:
+            symbol (str): The trading symbol.
+
+        Returns:
+            None
+        """
+        await self._hub.acquire('kline', symbol, '1m')
+
+    async def unwatch(self, symbol):
+        """
+        Stop receiving prices for a symbol once no coroutine watches it.
+
+        Args:
+            symbol (str): The trading symbol.
+
+        Returns:
+            None
+        """
+        await self._hub.release('kline', symbol, '1m')
+
+    def last_price(self, symbol):
+        """
+        Get the last streamed price of a symbol without waiting.
+
+        Args:
+            symbol (str): The trading symbol.
+
+        Returns:
+            float or None: The last price, or None if nothing has been received yet.
+        """
+        entry = self._prices.get(symbol)
+        return entry[0] if entry else None
+
+    async def get_price(self, symbol):
+        """
+        Wait for the next price update of a watched symbol.
+
+        Falls back to the last REST kline if no update arrives within gap_timeout seconds.
+
+        Args:
+            symbol (str): The trading symbol.
+
+        Returns:
+            float: The latest price.
+        """
+        event = self._events.setdefault(symbol, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), self.gap_timeout)
+            entry = self._prices.get(symbol)
+            if entry is not None:
+                return entry[0]
+        except asyncio.TimeoutError:
+            pass
+        # The stream is silent or reconnecting, fill the gap over REST
+        from APIs.api import last_data
+        klines = await last_data(symbol, '1m', '2')
+        price = float(klines.close[-1])
+        self._prices[symbol] = (price, time.monotonic())
+        return price
+
+    def _forget(self, symbol):
+        self._prices.pop(symbol, None)
+
+    def _on_kline(self, data):
+        symbol = data['s']
+        self._prices[symbol] = (float(data['k']['c']), time.monotonic())
+        # Wake every coroutine waiting for this symbol
+        event = self._events.pop(symbol, None)
+        if event is not None:
+            event.set()
+
+
+stream_manager = StreamManager()
+market_data = MarketDataHub(stream_manager)
+price_feed = PriceFeed(market_data)
@@ -0,0 +1,135 @@
+import asyncio
+import itertools
+import logging
+import time
+
+from loader import MAX_TASKS_PER_USER
+from APIs.notifications import notifier, status_key, URGENT
+
+
+class Session:
+    """
+    A strategy running as a background task of a chat.
+    """
+
+    def __init__(self, session_id, chat_id, name):
+        self.id = session_id
+        self.chat_id = chat_id
+        self.name = name
+        self.started = time.time()
+        self.task = None
+        self.error = None
+
+    @property
+    def status(self):
+        """
+        Get the state of the task: 'running', 'finished', 'failed' or 'cancelled'.
+        """
+        if not self.task.done():
+            return 'running'
+        if self.task.cancelled():
+            return 'cancelled'
+        return 'failed' if self.error is not None else 'finished'
+
+    def describe(self):
+        minutes, seconds = divmod(int(time.time() - self.started), 60)
+        return f'#{self.id} {self.name}: {self.status} for {minutes} min {seconds} s'
+
+
+class TaskSupervisor:
+    """
+    Runs strategies as asyncio tasks keyed by chat.
+
+    Handlers start a strategy and return at once, the task keeps running until it finishes
+    or is cancelled from the chat. Each chat runs at most max_per_chat strategies at a time.
+    A failed strategy is logged and reported to its chat.
+    """
+
+    def __init__(self, max_per_chat=MAX_TASKS_PER_USER):
+        self.max_per_chat = max_per_chat
+        self._sessions = {}
+        self._ids = itertools.count(1)
+
+    def start(self, chat_id, name, func, *args, **kwargs):
+        """
+        Start a strategy for a chat.
+
+        Args:
+            chat_id (int): The chat id.
+            name (str): A description shown by list().
+            func (callable): The strategy coroutine function.
+            *args: Positional arguments for func.
+            **kwargs: Keyword arguments for func.
+
+        Returns:
+            Session or None: The new session, or None if the chat already runs max_per_chat strategies.
+        """
+        sessions = self._sessions.setdefault(chat_id, {})
+        if len(sessions) >= self.max_per_chat:
+            return None
+        session = Session(next(self._ids), chat_id, name)
+        session.task = asyncio.create_task(self._run(session, func, args, kwargs))
+        sessions[session.id] = session
+        return session
+
+    def list(self, chat_id):
+        """
+        Get the running strategies of a chat.
+
+        Args:
+            chat_id (int): The chat id.
+
+        Returns:
+            list: The sessions in the order they were started.
+        """
+        return list(self._sessions.get(chat_id, {}).values())
+
+    async def cancel(self, chat_id, session_id=None):
+        """
+        Cancel strategies of a chat and wait until they have stopped.
+
+        Args:
+            chat_id (int): The chat id.
+            session_id (int, optional): The session to cancel. Defaults to every session of the chat.
+
+        Returns:
+            int: The number of cancelled strategies.
+        """
+        sessions = self.list(chat_id)
+        if session_id is not None:
+            sessions = [session for session in sessions if session.id == session_id]
+        for session in sessions:
+            session.task.cancel()
+        await asyncio.gather(*(session.task for session in sessions), return_exceptions=True)
+        return len(sessions)
+
+    async def close(self):
+        """
+        Cancel every strategy.
+
+        Returns:
+            None
+        """
+        for chat_id in list(self._sessions):
+            await self.cancel(chat_id)
+
+    async def _run(self, session, func, args, kwargs):
+        # Each session keeps its own status message in the chat
+        status_key.set(session.id)
+        try:
+            await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            session.error = e
+            logging.exception('Strategy %s of chat %s failed', session.name, session.chat_id)
+            notifier.send(session.chat_id, f'{session.name} stopped with an error: {e}', priority=URGENT)
+        finally:
+            notifier.clear_status(session.chat_id)
+            sessions = self._sessions.get(session.chat_id, {})
+            sessions.pop(session.id, None)
+            if not sessions:
+                self._sessions.pop(session.chat_id, None)
+
+
+supervisor = TaskSupervisor()
@@ -0,0 +1,165 @@
+import asyncio
+
+import numpy as np
+
+from loader import get_client
+from APIs.streams import stream_manager
+from APIs.rate_limiter import rate_limiter
+
+# All-market 24h rolling window ticker stream
+TICKER_STREAM = '!ticker@arr'
+
+# Initial number of symbol slots, the arrays grow if the exchange lists more symbols
+CAPACITY = 4096
+
+
+def is_tradable_usdt(symbol):
+    """
+    Check whether a symbol is a USDT pair that is not a leveraged token.
+
+    Args:
+        symbol (str): The trading symbol.
+
+    Returns:
+        bool: True for pairs quoted in USDT, excluding UP/DOWN leveraged tokens.
+    """
+    if not symbol.endswith('USDT'):
+        return False
+    base = symbol[:-4]
+    return not (base.endswith('UP') or base.endswith('DOWN'))
+
+
+class TickerBoard:
+    """
+    Shared in-memory board of 24h tickers for every symbol on the exchange.
+
+    Tickers are kept in preallocated NumPy arrays indexed by symbol slot and updated from the
+    all-market ticker stream, so ranking queries never touch the network.
+    """
+
+    def __init__(self, manager, capacity=CAPACITY):
+        self._manager = manager
+        self._index = {}
+        self._started = False
+        self._start_lock = asyncio.Lock()
+        self.symbols = []
+        self.price_change_percent = np.full(capacity, np.nan)
+        self.last_price = np.full(capacity, np.nan)
+        self.volume = np.full(capacity, np.nan)
+        self.quote_volume = np.full(capacity, np.nan)
+        self.usdt_mask = np.zeros(capacity, dtype=bool)
+
+    @property
+    def size(self):
+        return len(self.symbols)
+
+    def _grow(self):
+        capacity = len(self.usdt_mask) * 2
+        for name in ('price_change_percent', 'last_price', 'volume', 'quote_volume'):
+            array = np.full(capacity, np.nan)
+            array[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, array)
+        mask = np.zeros(capacity, dtype=bool)
+        mask[:self.size] = self.usdt_mask[:self.size]
+        self.usdt_mask = mask
+
+    def _slot(self, symbol):
+        slot = self._index.get(symbol)
+        if slot is None:
+            if self.size == len(self.usdt_mask):
+                self._grow()
+            slot = self.size
+            self._index[symbol] = slot
+            self.symbols.append(symbol)
+            self.usdt_mask[slot] = is_tradable_usdt(symbol)
+        return slot
+
+    def _on_tickers(self, tickers):
+        for ticker in tickers:
+            slot = self._slot(ticker['s'])
+            self.price_change_percent[slot] = float(ticker['P'])
+            self.last_price[slot] = float(ticker['c'])
+            self.volume[slot] = float(ticker['v'])
+            self.quote_volume[slot] = float(ticker['q'])
+
+    async def start(self):
+        """
+        Subscribe to the ticker stream, seeding the board over REST on the first call.
+
+        Returns:
+            None
+        """
+        if self._started:
+            return
+        async with self._start_lock:
+            if self._started:
+                return
+            client = await get_client()
+            for ticker in await rate_limiter.call('ticker_all', client.get_ticker):
+                slot = self._slot(ticker['symbol'])
+                self.price_change_percent[slot] = float(ticker['priceChangePercent'])
+                self.last_price[slot] = float(ticker['lastPrice'])
+                self.volume[slot] = float(ticker['volume'])
+                self.quote_volume[slot] = float(ticker['quoteVolume'])
+            await self._manager.subscribe(TICKER_STREAM, self._on_tickers)
+            self._started = True
+
+    def slots(self, symbols):
+        """
+        Get the slots of symbols, to read their columns in one operation.
+
+        Args:
+            symbols (list): Symbols present on the board.
+
+        Returns:
+            numpy.ndarray: The slot of every symbol.
+        """
+        return np.fromiter((self._index[symbol] for symbol in symbols), dtype=np.intp, count=len(symbols))
+
+    def price(self, symbol):
+        """
+        Get the last price of a symbol.
+
+        Args:
+            symbol (str): The trading symbol.
+
+        Returns:
+            float or None: The last price, or None for an unknown symbol.
+        """
+        slot = self._index.get(symbol)
+        return None if slot is None else float(self.last_price[slot])
+
+    def top(self, k=1, key='priceChangePercent', score=None):
+        """
+        Get the best USDT pairs, excluding leveraged tokens.
+
+        Args:
+            k (int, optional): The number of symbols to return. Defaults to 1.
+            key (str, optional): The ranking column: 'priceChangePercent', 'volume',
+                'quoteVolume' or 'lastPrice'. Defaults to 'priceChangePercent'.
+            score (callable, optional): A function taking the board and returning an array of
+                scores per slot. Overrides key when given.
+
+        Returns:
+            list: Up to k symbols ordered from the highest score.
+        """
+        size = self.size
+        if score is not None:
+            values = np.asarray(score(self), dtype=float)[:size]
+        else:
+            values = {
+                'priceChangePercent': self.price_change_percent,
+                'volume': self.volume,
+                'quoteVolume': self.quote_volume,
+                'lastPrice': self.last_price,
+            }[key][:size]
+        values = np.where(self.usdt_mask[:size] & ~np.isnan(values), values, -np.inf)
+        k = min(k, size)
+        if k <= 0:
+            return []
+        best = np.argpartition(values, -k)[-k:]
+        best = best[np.argsort(values[best])[::-1]]
+        return [self.symbols[slot] for slot in best if values[slot] != -np.inf]
+
+
+ticker_board = TickerBoard(stream_manager)
@@ -1,15 +1,74 @@
-from tradingview_ta import TA_Handler, Interval, Exchange, TradingView
 from APIs.api import place_order
-from aiogram.fsm.context import FSMContext
-from states.my_states import SBuyState
+from APIs.local_analysis import local_analyzer
+from APIs.resample import resampler
+from APIs.intervals import interval_ms, next_candle_boundary
+from loader import TA_SOURCE, TV_CACHE_FRACTION
+from APIs.notifications import notifier, URGENT
+from utils.metrics import registry, tradingview_latency
 
 import asyncio
+import time
 
+# TradingView analyses by (symbol, interval): (expiry timestamp in milliseconds, summary)
+_analysis_cache = {}
+# Requests in flight by (symbol, interval), shared by every coroutine asking for the same key
+_pending_requests = {}
 
-def get_data(symbol, interval):
+
+async def get_data(symbol, interval):
     """
     Get trading data and analysis for a specific symbol and interval.
 
+    Computes the analysis locally from cached klines, or requests it from TradingView
+    when TA_SOURCE is 'tradingview'. TradingView analyses are cached per symbol and interval
+    and concurrent callers share one request.
+
+    Args:
+        symbol (str): The trading symbol.
+        interval (str): The trading interval.
+
+    Returns:
+        dict: Analysis summary for the provided symbol and interval.
+    """
+    if TA_SOURCE == 'local':
+        return await local_analyzer.summary(symbol, interval)
+
+    key = (symbol, interval)
+    cached = _analysis_cache.get(key)
+    if cached is not None and time.time() * 1000 < cached[0]:
+        return cached[1]
+    request = _pending_requests.get(key)
+    if request is None:
+        request = asyncio.create_task(_request_analysis(symbol, interval))
+        _pending_requests[key] = request
+        request.add_done_callback(lambda _: _pending_requests.pop(key, None))
+    # A cancelled caller must not cancel the request shared with other callers
+    return await asyncio.shield(request)
+
+
+async def _request_analysis(symbol, interval):
+    registry.count_user_call()
+    started = time.perf_counter()
+    outcome = 'ok'
+    try:
+        # TA_Handler is synchronous, keep it off the event loop
+        activity = await asyncio.to_thread(get_tradingview_data, symbol, interval)
+    except Exception as e:
+        outcome = type(e).__name__
+        raise
+    finally:
+        tradingview_latency.observe(time.perf_counter() - started, outcome)
+    # Expire after a share of the interval, or when the next candle opens if that comes first
+    now = int(time.time() * 1000)
+    expires_at = min(now + int(interval_ms(interval) * TV_CACHE_FRACTION), next_candle_boundary(interval, now))
+    _analysis_cache[(symbol, interval)] = (expires_at, activity)
+    return activity
+
+
+def get_tradingview_data(symbol, interval):
+    """
+    Get trading data and analysis for a specific symbol and interval from TradingView.
+
     Retrieves trading data and analysis for the provided symbol and interval.
 
     Args:
@@ -19,6 +78,8 @@ def get_data(symbol, interval):
     Returns:
         dict: Analysis summary for the provided symbol and interval.
     """
+    # Imported here, tradingview_ta is only needed when TA_SOURCE is 'tradingview'
+    from tradingview_ta import TA_Handler, Interval
     if interval == '1m':
         interval = Interval.INTERVAL_1_MINUTE
     elif interval == '5m':
@@ -51,16 +112,17 @@ def get_data(symbol, interval):
     return activity
 
 
-async def tw_script(message, state, symbol, interval, amt):
+async def tw_script(chat_id, symbol, interval, amt):
     """
     Execute the trading strategy based on symbol, interval, and amount.
 
     Executes the trading strategy by continuously analyzing the provided symbol and interval,
-    and placing buy/sell orders according to the strategy's recommendations.
+    and placing buy/sell orders according to the strategy's recommendations, until the
+    supervisor task running it is cancelled. With local analysis the candles of the symbol are
+    resampled from its one-minute stream meanwhile.
 
     Args:
-        message (types.Message): The incoming message object.
-        state (FSMContext): The state context.
+        chat_id (int): The chat receiving the reports.
         symbol (str): The trading symbol.
         interval (str): The trading interval.
         amt (int): The trading amount.
@@ -70,29 +132,37 @@ async def tw_script(message, state, symbol, interval, amt):
     """
     buy = False
     sell = False
-    current_state = await state.get_state()
-
-    while current_state == SBuyState.conf_input:
-
-        data = get_data(symbol, interval)
-        await message.answer(f"<b>Recommendation: {data['RECOMMENDATION']}</b>"
-                             f"\nBuy: {data['BUY']}"
-                             f"\nSell {data['SELL']}")
-
-        if data['RECOMMENDATION'] == 'STRONG_BUY' and not buy:
-            await message.answer('PLACING  !!!___BUY___!!!  ORDER')
-            result = place_order('BUY', symbol, amt)
-            print(str(result))
-            buy = True
-            sell = False
-
-        # When recommendation is STRONG_SELL and we haven't sold yet
-        if data['RECOMMENDATION'] == 'STRONG_SELL' and not sell:
-            await message.answer('PLACING  !!!___SELL___!!!  ORDER')
-            result = place_order('SELL', symbol, amt)
-            await message.answer(str(result))
-            buy = False
-            sell = True
-
-        await asyncio.sleep(1)
-        current_state = await state.get_state()
\ No newline at end of file
+    if TA_SOURCE == 'local':
+        # Candles of the interval are kept current from the one-minute stream of the symbol
+        await resampler.watch(symbol)
+
+    try:
+        while True:
+
+            data = await get_data(symbol, interval)
+            # The recommendation is kept in one status message edited in place
+            notifier.status(chat_id, f"<b>Recommendation: {data['RECOMMENDATION']}</b>"
+                                     f"\nBuy: {data['BUY']}"
+                                     f"\nSell {data['SELL']}")
+
+            if data['RECOMMENDATION'] == 'STRONG_BUY' and not buy:
+                notifier.clear_status(chat_id)
+                notifier.send(chat_id, 'PLACING  !!!___BUY___!!!  ORDER', priority=URGENT)
+                result = await place_order('BUY', symbol, amt)
+                print(str(result))
+                buy = True
+                sell = False
+
+            # When recommendation is STRONG_SELL and we haven't sold yet
+            if data['RECOMMENDATION'] == 'STRONG_SELL' and not sell:
+                notifier.clear_status(chat_id)
+                notifier.send(chat_id, 'PLACING  !!!___SELL___!!!  ORDER', priority=URGENT)
+                result = await place_order('SELL', symbol, amt)
+                notifier.send(chat_id, str(result), priority=URGENT)
+                buy = False
+                sell = True
+
+            await asyncio.sleep(1)
+    finally:
+        if TA_SOURCE == 'local':
+            await resampler.unwatch(symbol)
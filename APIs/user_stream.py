@@ -0,0 +1,143 @@
+import asyncio
+import json
+import logging
+
+import websockets
+
+from loader import get_client, BINANCE_STREAM_URL
+from APIs.rate_limiter import rate_limiter
+
+USER_STREAM_URL = f'{BINANCE_STREAM_URL}/ws/'
+
+# Listen keys expire after 60 minutes without a keepalive
+KEEPALIVE_INTERVAL = 30 * 60
+
+
+class UserDataStream:
+    """
+    Binance user data stream of the account behind the API key.
+
+    Obtains a listen key, keeps it alive and dispatches account, order and order list events
+    to handlers registered by event type. The stream reconnects with a fresh listen key after
+    a disconnect or a listenKeyExpired event.
+    """
+
+    def __init__(self, url=USER_STREAM_URL, max_backoff=30):
+        self.url = url
+        self.max_backoff = max_backoff
+        self._handlers = {}
+        self._reconnect_handlers = []
+        self._connected = asyncio.Event()
+        self._listen_key = None
+        self._task = None
+
+    def add_handler(self, event_type, handler):
+        """
+        Register a handler for an event type.
+
+        Args:
+            event_type (str): The event type, e.g. 'executionReport'.
+            handler (callable): A function called with the event dict.
+
+        Returns:
+            None
+        """
+        self._handlers.setdefault(event_type, []).append(handler)
+
+    def add_reconnect_handler(self, handler):
+        """
+        Register a callback invoked after every reconnect, when events may have been missed.
+
+        Args:
+            handler (callable): A function without arguments.
+
+        Returns:
+            None
+        """
+        self._reconnect_handlers.append(handler)
+
+    @property
+    def connected(self):
+        return self._connected.is_set()
+
+    def connect(self):
+        """
+        Connect the stream in the background if it is not running.
+
+        Returns:
+            None
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def start(self):
+        """
+        Connect the stream if needed and wait until it is connected.
+
+        Returns:
+            None
+        """
+        self.connect()
+        await self._connected.wait()
+
+    async def close(self):
+        """
+        Close the stream.
+
+        Returns:
+            None
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _keepalive(self, client):
+        while True:
+            await asyncio.sleep(KEEPALIVE_INTERVAL)
+            await rate_limiter.call('listen_key', client.stream_keepalive, self._listen_key)
+
+    def _dispatch(self, event):
+        for handler in list(self._handlers.get(event.get('e'), ())):
+            try:
+                handler(event)
+            except Exception:
+                logging.exception('User stream handler failed for %s', event.get('e'))
+
+    async def _run(self):
+        backoff = 1
+        reconnect = False
+        while True:
+            keepalive = None
+            try:
+                client = await get_client()
+                self._listen_key = await rate_limiter.call('listen_key', client.stream_get_listen_key)
+                keepalive = asyncio.create_task(self._keepalive(client))
+                async with websockets.connect(self.url + self._listen_key, ping_interval=20) as ws:
+                    self._connected.set()
+                    backoff = 1
+                    if reconnect:
+                        for handler in self._reconnect_handlers:
+                            handler()
+                    async for raw in ws:
+                        event = json.loads(raw)
+                        if event.get('e') == 'listenKeyExpired':
+                            break
+                        self._dispatch(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning('Binance user data stream lost: %s', e)
+            finally:
+                self._connected.clear()
+                if keepalive is not None:
+                    keepalive.cancel()
+            reconnect = True
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+
+user_stream = UserDataStream()
@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from loader import close_client
+from APIs.candle_store import candle_store
+from APIs.intervals import to_binance
+from backtest.grid import run_momentum_grid, run_signal_grid
+
+
+def parse_values(values):
+    """
+    Expand command line values, where 'start:stop:step' stands for a range including stop.
+
+    Args:
+        values (list): Values as strings.
+
+    Returns:
+        list: The values as floats.
+    """
+    result = []
+    for value in values:
+        if ':' in value:
+            start, stop, step = (float(part) for part in value.split(':'))
+            result.extend(np.round(np.arange(start, stop + step / 2, step), 10).tolist())
+        else:
+            result.append(float(value))
+    return result
+
+
+async def download(symbols, interval, days):
+    """
+    Fill the candle store with the history used by the backtest.
+
+    Args:
+        symbols (list): The trading symbols.
+        interval (str): The kline interval.
+        days (float): Number of days of history.
+
+    Returns:
+        None
+    """
+    start_time = int((time.time() - days * 86400) * 1000)
+    try:
+        for symbol in symbols:
+            await candle_store.load(symbol, interval, start_time)
+    finally:
+        await close_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backtest the bot strategies on stored klines')
+    parser.add_argument('strategy', choices=['momentum', 'signals'])
+    parser.add_argument('symbols', nargs='+')
+    parser.add_argument('--interval', default=None, help="kline interval, '1m' for momentum and '1h' for signals by default")
+    parser.add_argument('--days', type=float, default=0, help='download this many days of history first')
+    parser.add_argument('--window', nargs='+', default=['120'])
+    parser.add_argument('--threshold', nargs='+', default=['100000'])
+    parser.add_argument('--sl', nargs='+', default=['0.985'])
+    parser.add_argument('--target', nargs='+', default=['1.02'])
+    parser.add_argument('--buy-level', nargs='+', default=['0.5'])
+    parser.add_argument('--sell-level', nargs='+', default=['-0.5'])
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--top', type=int, default=20, help='number of results to print')
+    args = parser.parse_args()
+
+    interval = to_binance(args.interval or ('1m' if args.strategy == 'momentum' else '1h'))
+    if args.days:
+        asyncio.run(download(args.symbols, interval, args.days))
+
+    started = time.perf_counter()
+    if args.strategy == 'momentum':
+        results = run_momentum_grid(args.symbols, interval,
+                                    windows=[int(window) for window in parse_values(args.window)],
+                                    thresholds=parse_values(args.threshold),
+                                    stop_losses=parse_values(args.sl),
+                                    targets=parse_values(args.target),
+                                    processes=args.processes)
+    else:
+        results = run_signal_grid(args.symbols, interval,
+                                  buy_levels=parse_values(args.buy_level),
+                                  sell_levels=parse_values(args.sell_level),
+                                  processes=args.processes)
+    elapsed = time.perf_counter() - started
+
+    print(f'{len(results)} combinations in {elapsed:.2f} s')
+    for result in results[:args.top]:
+        print('  '.join(f'{key}={value:.4f}' if isinstance(value, float) else f'{key}={value}'
+                        for key, value in result.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+import numpy as np
+
+from APIs.local_analysis import recommendation_series
+
+# Taker fee charged on each side of a trade
+FEE = 0.001
+# Candles compared at once when looking for the exit of a position, doubled for every block
+# without one, so finding an exit costs about as much as the candles the position was held
+EXIT_BLOCK = 256
+
+
+def momentum_entries(close, window=120, threshold=100000):
+    """
+    Evaluate the strategy() entry rule on every candle.
+
+    The rule compares the cumulative return of the last window candles, which is
+    close[t] / close[t - window + 1], with the threshold.
+
+    Args:
+        close (numpy.ndarray): Close prices.
+        window (int, optional): Number of candles in the window. Defaults to 120.
+        threshold (float, optional): Minimum cumulative return. Defaults to 100000.
+
+    Returns:
+        numpy.ndarray: A boolean array, True where a position would be opened.
+    """
+    entries = np.zeros(len(close), dtype=bool)
+    if len(close) >= window:
+        entries[window - 1:] = close[window - 1:] / close[:len(close) - window + 1] > threshold
+    return entries
+
+
+def simulate_exits(entries, high, low, close, SL=0.985, Target=1.02, fee=FEE):
+    """
+    Replay stop-loss/target exits of positions opened on entry candles.
+
+    One position is open at a time. A position is bought at the close of the entry candle
+    and sold at the stop or target price of the first later candle reaching one of them;
+    when a candle reaches both, the stop is assumed first. A position still open at the end
+    is sold at the last close.
+
+    Args:
+        entries (numpy.ndarray): Boolean entry signals.
+        high (numpy.ndarray): High prices.
+        low (numpy.ndarray): Low prices.
+        close (numpy.ndarray): Close prices.
+        SL (float, optional): The stop-loss factor. Defaults to 0.985.
+        Target (float, optional): The take-profit factor. Defaults to 1.02.
+        fee (float, optional): Fee rate per side. Defaults to FEE.
+
+    Returns:
+        tuple: Arrays of entry indices, exit indices and trade returns.
+    """
+    candidates = np.flatnonzero(entries)
+    entry_indices, exit_indices, returns = [], [], []
+    position = 0
+    while True:
+        start = np.searchsorted(candidates, position)
+        if start == len(candidates):
+            break
+        entry = candidates[start]
+        buyprice = close[entry]
+        stop, target = buyprice * SL, buyprice * Target
+        exit_index, stopped = _first_exit(high, low, entry + 1, stop, target)
+        if exit_index is not None:
+            sellprice = stop if stopped else target
+        else:
+            exit_index = len(close) - 1
+            sellprice = close[-1]
+        entry_indices.append(entry)
+        exit_indices.append(exit_index)
+        returns.append(sellprice / buyprice * (1 - fee) ** 2 - 1)
+        position = exit_index + 1
+    return np.array(entry_indices, dtype=int), np.array(exit_indices, dtype=int), np.array(returns)
+
+
+def _first_exit(high, low, start, stop, target):
+    # Scans forward in growing blocks instead of comparing the whole remaining history
+    block = EXIT_BLOCK
+    while start < len(low):
+        end = min(start + block, len(low))
+        stopped = low[start:end] <= stop
+        hits = np.flatnonzero(stopped | (high[start:end] >= target))
+        if len(hits):
+            return start + hits[0], bool(stopped[hits[0]])
+        start = end
+        block *= 2
+    return None, False
+
+
+def signal_trades(value, close, buy_level=0.5, sell_level=-0.5, fee=FEE):
+    """
+    Replay the tw_script flip logic on a recommendation series.
+
+    A position is bought at the close of a STRONG_BUY candle and sold at the close of the
+    next STRONG_SELL candle, like the buy/sell flags of tw_script.
+
+    Args:
+        value (numpy.ndarray): Recommendation values between -1 and 1.
+        close (numpy.ndarray): Close prices.
+        buy_level (float, optional): Value from which the rating is STRONG_BUY. Defaults to 0.5.
+        sell_level (float, optional): Value below which the rating is STRONG_SELL. Defaults to -0.5.
+        fee (float, optional): Fee rate per side. Defaults to FEE.
+
+    Returns:
+        tuple: Arrays of entry indices, exit indices and trade returns.
+    """
+    signal = np.where(value >= buy_level, 1, np.where(value < sell_level, -1, 0))
+    # Carry the last non-neutral signal forward, 1 means a position is held
+    last = np.maximum.accumulate(np.where(signal != 0, np.arange(len(signal)), -1))
+    held = np.where(last >= 0, signal[np.maximum(last, 0)], 0) == 1
+    change = np.diff(held.astype(int), prepend=0)
+    entry_indices = np.flatnonzero(change == 1)
+    exit_indices = np.flatnonzero(change == -1)
+    if len(exit_indices) < len(entry_indices):
+        exit_indices = np.append(exit_indices, len(close) - 1)
+    returns = close[exit_indices] / close[entry_indices] * (1 - fee) ** 2 - 1
+    return entry_indices, exit_indices, returns
+
+
+def trade_stats(returns):
+    """
+    Summarize the trades of a backtest.
+
+    Args:
+        returns (numpy.ndarray): Trade returns in chronological order.
+
+    Returns:
+        dict: Number of trades, compounded PnL, maximum drawdown, win rate and the average,
+            best and worst trade return.
+    """
+    if len(returns) == 0:
+        return {'trades': 0, 'pnl': 0.0, 'max_drawdown': 0.0, 'win_rate': 0.0,
+                'avg_return': 0.0, 'best': 0.0, 'worst': 0.0}
+    equity = np.concatenate([[1.0], np.cumprod(1 + returns)])
+    drawdown = 1 - equity / np.maximum.accumulate(equity)
+    return {
+        'trades': int(len(returns)),
+        'pnl': float(equity[-1] - 1),
+        'max_drawdown': float(drawdown.max()),
+        'win_rate': float(np.mean(returns > 0)),
+        'avg_return': float(returns.mean()),
+        'best': float(returns.max()),
+        'worst': float(returns.min()),
+    }
+
+
+def backtest_momentum(records, window=120, threshold=100000, SL=0.985, Target=1.02, fee=FEE):
+    """
+    Backtest the strategy() momentum entry with stop-loss/target exits.
+
+    Args:
+        records (numpy.ndarray): Candles of the candle store dtype.
+        window (int, optional): Entry window in candles. Defaults to 120.
+        threshold (float, optional): Minimum cumulative return of the window. Defaults to 100000.
+        SL (float, optional): The stop-loss factor. Defaults to 0.985.
+        Target (float, optional): The take-profit factor. Defaults to 1.02.
+        fee (float, optional): Fee rate per side. Defaults to FEE.
+
+    Returns:
+        dict: The trade statistics.
+    """
+    entries = momentum_entries(records['close'], window, threshold)
+    _, _, returns = simulate_exits(entries, records['high'], records['low'], records['close'], SL, Target, fee)
+    return trade_stats(returns)
+
+
+def backtest_signals(records, buy_level=0.5, sell_level=-0.5, fee=FEE):
+    """
+    Backtest the tw_script STRONG_BUY/STRONG_SELL strategy on locally computed ratings.
+
+    Args:
+        records (numpy.ndarray): Candles of the candle store dtype.
+        buy_level (float, optional): Value from which the rating is STRONG_BUY. Defaults to 0.5.
+        sell_level (float, optional): Value below which the rating is STRONG_SELL. Defaults to -0.5.
+        fee (float, optional): Fee rate per side. Defaults to FEE.
+
+    Returns:
+        dict: The trade statistics.
+    """
+    columns = [np.ascontiguousarray(records[name]) for name in ('open', 'high', 'low', 'close', 'volume')]
+    value = recommendation_series(*columns)[0]
+    _, _, returns = signal_trades(value, columns[3], buy_level, sell_level, fee)
+    return trade_stats(returns)
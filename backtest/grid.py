@@ -0,0 +1,98 @@
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+from loader import CANDLE_STORE_DIR
+from APIs.candle_store import CandleStore
+from APIs.local_analysis import recommendation_series
+from backtest.engine import FEE, momentum_entries, simulate_exits, signal_trades, trade_stats
+
+# Candles already read by this worker process, by (directory, symbol, interval)
+_records = {}
+
+
+def _read(directory, symbol, interval):
+    key = (directory, symbol, interval)
+    if key not in _records:
+        _records[key] = CandleStore(directory).read(symbol, interval)
+    return _records[key]
+
+
+def _momentum_task(directory, symbol, interval, window, threshold, SL, targets, fee):
+    records = _read(directory, symbol, interval)
+    entries = momentum_entries(records['close'], window, threshold)
+    results = []
+    for Target in targets:
+        _, _, returns = simulate_exits(entries, records['high'], records['low'], records['close'], SL, Target, fee)
+        results.append({'symbol': symbol, 'window': window, 'threshold': threshold,
+                        'SL': SL, 'Target': Target, **trade_stats(returns)})
+    return results
+
+
+def _signals_task(directory, symbol, interval, buy_levels, sell_levels, fee):
+    records = _read(directory, symbol, interval)
+    columns = [records[name].copy() for name in ('open', 'high', 'low', 'close', 'volume')]
+    # The ratings are computed once and reused for every level combination
+    value = recommendation_series(*columns)[0]
+    results = []
+    for buy_level, sell_level in itertools.product(buy_levels, sell_levels):
+        _, _, returns = signal_trades(value, columns[3], buy_level, sell_level, fee)
+        results.append({'symbol': symbol, 'buy_level': buy_level, 'sell_level': sell_level,
+                        **trade_stats(returns)})
+    return results
+
+
+def _run(tasks, processes):
+    results = []
+    with ProcessPoolExecutor(processes) as pool:
+        futures = [pool.submit(*task) for task in tasks]
+        for future in futures:
+            results.extend(future.result())
+    return sorted(results, key=lambda result: result['pnl'], reverse=True)
+
+
+def run_momentum_grid(symbols, interval='1m', windows=(120,), thresholds=(100000,), stop_losses=(0.985,),
+                      targets=(1.02,), fee=FEE, processes=None, directory=CANDLE_STORE_DIR):
+    """
+    Backtest every combination of momentum strategy parameters on stored candles.
+
+    Tasks are split by symbol, window, threshold and stop-loss and run in a process pool.
+
+    Args:
+        symbols (list): The trading symbols.
+        interval (str, optional): The kline interval. Defaults to '1m'.
+        windows (list, optional): Entry windows in candles.
+        thresholds (list, optional): Entry thresholds of the window cumulative return.
+        stop_losses (list, optional): Stop-loss factors.
+        targets (list, optional): Take-profit factors.
+        fee (float, optional): Fee rate per side. Defaults to FEE.
+        processes (int, optional): Number of worker processes. Defaults to the CPU count.
+        directory (str, optional): The candle store directory.
+
+    Returns:
+        list: One dict of parameters and trade statistics per combination, best PnL first.
+    """
+    tasks = [(_momentum_task, directory, symbol, interval, window, threshold, SL, list(targets), fee)
+             for symbol, window, threshold, SL in itertools.product(symbols, windows, thresholds, stop_losses)]
+    return _run(tasks, processes)
+
+
+def run_signal_grid(symbols, interval='1h', buy_levels=(0.5,), sell_levels=(-0.5,), fee=FEE,
+                    processes=None, directory=CANDLE_STORE_DIR):
+    """
+    Backtest the STRONG_BUY/STRONG_SELL strategy for every combination of rating levels.
+
+    Args:
+        symbols (list): The trading symbols.
+        interval (str, optional): The kline interval. Defaults to '1h'.
+        buy_levels (list, optional): Rating values from which a candle is STRONG_BUY.
+        sell_levels (list, optional): Rating values below which a candle is STRONG_SELL.
+        fee (float, optional): Fee rate per side. Defaults to FEE.
+        processes (int, optional): Number of worker processes. Defaults to the CPU count.
+        directory (str, optional): The candle store directory.
+
+    Returns:
+        list: One dict of parameters and trade statistics per combination, best PnL first.
+    """
+    tasks = [(_signals_task, directory, symbol, interval, list(buy_levels), list(sell_levels), fee)
+             for symbol in symbols]
+    return _run(tasks, processes)
@@ -0,0 +1 @@
+from . import fake_servers
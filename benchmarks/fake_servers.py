@@ -0,0 +1,503 @@
+import asyncio
+import hashlib
+import json
+import math
+import time
+import zlib
+from collections import Counter
+
+from aiohttp import web, WSMsgType, ClientSession
+
+# Kline interval lengths in seconds, a month is counted as 30 days
+INTERVAL_SECONDS = {
+    '1m': 60, '3m': 180, '5m': 300, '15m': 900, '30m': 1800, '1h': 3600, '2h': 7200, '4h': 14400,
+    '6h': 21600, '8h': 28800, '12h': 43200, '1d': 86400, '3d': 259200, '1w': 604800, '1M': 2592000,
+}
+
+
+def _base_price(symbol):
+    return 1 + zlib.crc32(symbol.encode()) % 50000 / 10
+
+
+def _price(symbol, timestamp):
+    # Deterministic price path, the same for every run and every server instance
+    minute = timestamp / 60000
+    return _base_price(symbol) * (1 + 0.02 * math.sin(minute / 50) + 0.005 * math.sin(minute / 7))
+
+
+class FakeBinance:
+    """
+    Local stand-in for the Binance REST and websocket endpoints used by the bot.
+
+    Prices follow a deterministic path per symbol. Every REST request is counted by path, so
+    a benchmark can report API calls per user.
+    """
+
+    def __init__(self, symbol_count=200, push_interval=1.0):
+        self.symbols = ['BTCUSDT', 'ETHUSDT', 'BNBUSDT'] + [f'COIN{i}USDT' for i in range(symbol_count)]
+        self.push_interval = push_interval
+        self.calls = Counter()
+        self.orders = 0
+        self.app = web.Application(middlewares=[self._count])
+        self.app.add_routes([
+            web.get('/api/v3/ping', self.ping),
+            web.get('/api/v3/time', self.server_time),
+            web.get('/api/v3/exchangeInfo', self.exchange_info),
+            web.get('/api/v3/account', self.account),
+            web.get('/api/v3/openOrders', self.open_orders),
+            web.get('/api/v3/ticker/24hr', self.ticker),
+            web.get('/api/v3/klines', self.klines),
+            web.post('/api/v3/order', self.order),
+            web.get('/api/v3/order', self.order_status),
+            web.post('/api/v3/userDataStream', self.listen_key),
+            web.put('/api/v3/userDataStream', self.listen_key),
+            web.post('/api/v1/userDataStream', self.listen_key),
+            web.put('/api/v1/userDataStream', self.listen_key),
+            web.get('/stream', self.stream),
+            web.get('/ws/{listen_key}', self.user_stream),
+        ])
+
+    @web.middleware
+    async def _count(self, request, handler):
+        self.calls[request.path] += 1
+        return await handler(request)
+
+    async def ping(self, request):
+        return web.json_response({})
+
+    async def server_time(self, request):
+        return web.json_response({'serverTime': int(time.time() * 1000)})
+
+    async def exchange_info(self, request):
+        symbols = [{
+            'symbol': symbol,
+            'status': 'TRADING',
+            'baseAsset': symbol[:-4],
+            'quoteAsset': 'USDT',
+            'permissions': ['SPOT'],
+            'filters': [
+                {'filterType': 'PRICE_FILTER', 'minPrice': '0.01', 'maxPrice': '1000000', 'tickSize': '0.01'},
+                {'filterType': 'LOT_SIZE', 'minQty': '0.001', 'maxQty': '100000', 'stepSize': '0.001'},
+                {'filterType': 'NOTIONAL', 'minNotional': '5'},
+            ],
+        } for symbol in self.symbols]
+        return web.json_response({'timezone': 'UTC', 'serverTime': int(time.time() * 1000), 'symbols': symbols})
+
+    async def account(self, request):
+        return web.json_response({'updateTime': int(time.time() * 1000), 'balances': [
+            {'asset': 'USDT', 'free': '1000.0', 'locked': '0.0'},
+            {'asset': 'BTC', 'free': '0.01', 'locked': '0.0'},
+            {'asset': 'ETH', 'free': '0.0', 'locked': '0.0'},
+        ]})
+
+    async def open_orders(self, request):
+        return web.json_response([])
+
+    def _ticker(self, symbol, now):
+        price = _price(symbol, now)
+        change = price / _price(symbol, now - 86400000) - 1
+        return {
+            'symbol': symbol,
+            'priceChangePercent': f'{change * 100:.3f}',
+            'lastPrice': f'{price:.8f}',
+            'volume': '1000.0',
+            'quoteVolume': f'{price * 1000:.2f}',
+        }
+
+    async def ticker(self, request):
+        now = int(time.time() * 1000)
+        symbol = request.query.get('symbol')
+        if symbol:
+            return web.json_response(self._ticker(symbol, now))
+        return web.json_response([self._ticker(symbol, now) for symbol in self.symbols])
+
+    async def klines(self, request):
+        symbol = request.query['symbol']
+        step = INTERVAL_SECONDS[request.query['interval']] * 1000
+        limit = int(request.query.get('limit', 500))
+        now = int(time.time() * 1000)
+        end_time = min(int(request.query.get('endTime', now)), now)
+        start_time = int(request.query.get('startTime', end_time - (limit - 1) * step))
+        open_time = -(-start_time // step) * step
+        rows = []
+        while open_time <= end_time and len(rows) < limit:
+            close_time = min(open_time + step, now)
+            open_price, close_price = _price(symbol, open_time), _price(symbol, close_time)
+            rows.append([open_time, f'{open_price:.8f}', f'{max(open_price, close_price) * 1.001:.8f}',
+                         f'{min(open_price, close_price) * 0.999:.8f}', f'{close_price:.8f}', '10.0',
+                         open_time + step - 1, '0', 10, '0', '0', '0'])
+            open_time += step
+        return web.json_response(rows)
+
+    async def order(self, request):
+        data = await request.post()
+        self.orders += 1
+        price = _price(data['symbol'], time.time() * 1000)
+        qty = float(data.get('quantity', 0))
+        return web.json_response({
+            'symbol': data['symbol'],
+            'orderId': self.orders,
+            'orderListId': -1,
+            'transactTime': int(time.time() * 1000),
+            'status': 'FILLED',
+            'type': data['type'],
+            'side': data['side'],
+            'executedQty': str(qty),
+            'cummulativeQuoteQty': str(qty * price),
+            'fills': [{'price': f'{price:.8f}', 'qty': str(qty), 'commission': '0', 'commissionAsset': 'BNB'}],
+        })
+
+    async def order_status(self, request):
+        return web.json_response({'symbol': request.query['symbol'], 'orderId': int(request.query['orderId']),
+                                  'status': 'NEW', 'type': 'LIMIT', 'executedQty': '0', 'cummulativeQuoteQty': '0'})
+
+    async def listen_key(self, request):
+        return web.json_response({'listenKey': 'benchmark'})
+
+    async def stream(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        streams = set()
+
+        async def push():
+            while True:
+                await asyncio.sleep(self.push_interval)
+                now = int(time.time() * 1000)
+                for stream in list(streams):
+                    if stream == '!ticker@arr':
+                        data = [{'s': t['symbol'], 'P': t['priceChangePercent'], 'c': t['lastPrice'],
+                                 'v': t['volume'], 'q': t['quoteVolume']}
+                                for t in (self._ticker(symbol, now) for symbol in self.symbols)]
+                    elif stream.endswith('@bookTicker'):
+                        symbol = stream.split('@')[0].upper()
+                        price = _price(symbol, now)
+                        data = {'u': now, 's': symbol, 'b': f'{price * 0.9995:.8f}', 'B': '25.0',
+                                'a': f'{price * 1.0005:.8f}', 'A': '25.0'}
+                    else:
+                        symbol = stream.split('@')[0].upper()
+                        open_time = now // 60000 * 60000
+                        price = _price(symbol, now)
+                        data = {'e': 'kline', 'E': now, 's': symbol, 'k': {
+                            't': open_time, 'T': open_time + 59999, 's': symbol, 'i': '1m',
+                            'o': f'{_price(symbol, open_time):.8f}', 'c': f'{price:.8f}',
+                            'h': f'{price * 1.001:.8f}', 'l': f'{price * 0.999:.8f}', 'v': '10.0', 'x': False}}
+                    await ws.send_str(json.dumps({'stream': stream, 'data': data}))
+
+        pusher = asyncio.create_task(push())
+        try:
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                request_data = json.loads(message.data)
+                if request_data['method'] == 'SUBSCRIBE':
+                    streams.update(request_data['params'])
+                elif request_data['method'] == 'UNSUBSCRIBE':
+                    streams.difference_update(request_data['params'])
+                await ws.send_str(json.dumps({'result': None, 'id': request_data['id']}))
+        finally:
+            pusher.cancel()
+        return ws
+
+    async def user_stream(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        async for _ in ws:
+            pass
+        return ws
+
+
+class FakeTelegram:
+    """
+    Local stand-in for the Telegram Bot API.
+
+    Updates pushed with send_text() are served to getUpdates long polling, or posted to the
+    webhook once the bot has set one, and every message sent by the bot is recorded per chat
+    with the time it arrived.
+    """
+
+    def __init__(self):
+        self.calls = Counter()
+        self._updates = []
+        self._update_id = 0
+        self._message_id = 0
+        self._new_update = asyncio.Event()
+        self._replies = {}
+        self._reply_events = {}
+        self._webhook = None
+        self._session = None
+        self._deliveries = set()
+        self.app = web.Application()
+        self.app.add_routes([web.route('*', '/bot{token}/{method}', self.dispatch)])
+
+    def send_text(self, chat_id, text):
+        """
+        Queue a text message from a user.
+
+        Args:
+            chat_id (int): The private chat id, also used as the user id.
+            text (str): The message text.
+
+        Returns:
+            int: The number of replies the chat had received before this message.
+        """
+        self._update_id += 1
+        self._message_id += 1
+        user = {'id': chat_id, 'is_bot': False, 'first_name': f'user{chat_id}'}
+        update = {'update_id': self._update_id, 'message': {
+            'message_id': self._message_id, 'date': int(time.time()), 'text': text,
+            'chat': {'id': chat_id, 'type': 'private'}, 'from': user,
+        }}
+        if self._webhook is not None:
+            self._deliver(update)
+        else:
+            self._updates.append(update)
+            self._new_update.set()
+        return len(self._replies.get(chat_id, ()))
+
+    async def close(self):
+        for task in list(self._deliveries):
+            task.cancel()
+        await asyncio.gather(*self._deliveries, return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+
+    def _deliver(self, update):
+        task = asyncio.create_task(self._post(update))
+        self._deliveries.add(task)
+        task.add_done_callback(self._deliveries.discard)
+
+    async def _post(self, update):
+        url, secret = self._webhook
+        if self._session is None:
+            self._session = ClientSession()
+        headers = {'X-Telegram-Bot-Api-Secret-Token': secret} if secret else {}
+        # Like Telegram, deliver again until the bot accepts the update
+        while True:
+            try:
+                async with self._session.post(url, json=update, headers=headers) as response:
+                    if response.status == 200:
+                        return
+            except OSError:
+                pass
+            await asyncio.sleep(0.1)
+
+    async def wait_reply(self, chat_id, seen, timeout=30):
+        """
+        Wait for a reply after the first seen replies of a chat.
+
+        Args:
+            chat_id (int): The chat id.
+            seen (int): The number of replies already seen.
+            timeout (float, optional): Seconds to wait. Defaults to 30.
+
+        Returns:
+            tuple: The monotonic arrival time and the text of the reply.
+        """
+        while len(self._replies.get(chat_id, ())) <= seen:
+            event = self._reply_events.setdefault(chat_id, asyncio.Event())
+            await asyncio.wait_for(event.wait(), timeout)
+        return self._replies[chat_id][seen]
+
+    def _record_reply(self, chat_id, text):
+        self._replies.setdefault(chat_id, []).append((time.monotonic(), text))
+        event = self._reply_events.pop(chat_id, None)
+        if event is not None:
+            event.set()
+
+    async def _get_updates(self, params):
+        offset = int(params.get('offset', 0))
+        self._updates = [update for update in self._updates if update['update_id'] >= offset]
+        if not self._updates:
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), float(params.get('timeout', 0)) or 0.1)
+            except asyncio.TimeoutError:
+                pass
+        return list(self._updates)
+
+    async def dispatch(self, request):
+        method = request.match_info['method']
+        self.calls[method] += 1
+        params = dict(request.query)
+        if request.method == 'POST':
+            params.update(await request.post())
+        if method == 'getUpdates':
+            result = await self._get_updates(params)
+        elif method == 'setWebhook':
+            self._webhook = (params['url'], params.get('secret_token'))
+            # Updates waiting for getUpdates are delivered to the new webhook
+            for update in self._updates:
+                self._deliver(update)
+            self._updates = []
+            result = True
+        elif method == 'deleteWebhook':
+            self._webhook = None
+            result = True
+        elif method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'Benchmark', 'username': 'benchmark_bot'}
+        elif method in ('sendMessage', 'sendSticker', 'editMessageText'):
+            chat_id = int(params['chat_id'])
+            text = params.get('text', '')
+            self._record_reply(chat_id, text)
+            if method == 'editMessageText':
+                message_id = int(params['message_id'])
+            else:
+                self._message_id += 1
+                message_id = self._message_id
+            result = {'message_id': message_id, 'date': int(time.time()),
+                      'chat': {'id': chat_id, 'type': 'private'}, 'text': text}
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+
+class FakeRedis:
+    """
+    Local stand-in for a Redis server, enough for the FSM storage and its event isolation.
+
+    Speaks RESP and supports PING, SELECT, GET, SET with EX/PX/NX/XX, DEL and EXISTS, plus the
+    lock release script of redis-py through SCRIPT LOAD, EVALSHA and EVAL. Commands are
+    counted by name.
+    """
+
+    def __init__(self):
+        self.calls = Counter()
+        self._values = {}
+        self._scripts = {}
+        self._server = None
+        self._connections = set()
+
+    async def start(self, host='127.0.0.1', port=0):
+        """
+        Start serving on a local port.
+
+        Args:
+            host (str, optional): The host. Defaults to '127.0.0.1'.
+            port (int, optional): The port, 0 for any free port. Defaults to 0.
+
+        Returns:
+            str: The redis:// URL of the server.
+        """
+        self._server = await asyncio.start_server(self._serve, host, port)
+        port = self._server.sockets[0].getsockname()[1]
+        return f'redis://{host}:{port}/0'
+
+    async def close(self):
+        self._server.close()
+        for task in self._connections:
+            task.cancel()
+        await asyncio.gather(*self._connections)
+        await self._server.wait_closed()
+
+    def _get(self, key):
+        value, expires = self._values.get(key, (None, None))
+        if expires is not None and expires <= time.monotonic():
+            del self._values[key]
+            return None
+        return value
+
+    def _set(self, key, value, options):
+        expires = None
+        options = [option.upper() for option in options]
+        for name, seconds in (('EX', 1), ('PX', 0.001)):
+            if name in options:
+                expires = time.monotonic() + float(options[options.index(name) + 1]) * seconds
+        exists = self._get(key) is not None
+        if ('NX' in options and exists) or ('XX' in options and not exists):
+            return None
+        self._values[key] = (value, expires)
+        return 'OK'
+
+    def _eval(self, script, args):
+        if "redis.call('del'" not in script:
+            raise ValueError('only the lock release script is supported')
+        key, token = args[1], args[2]
+        if self._get(key) != token:
+            return 0
+        del self._values[key]
+        return 1
+
+    def _execute(self, command, args):
+        if command == 'PING':
+            return 'PONG'
+        if command in ('SELECT', 'CLIENT'):
+            return 'OK'
+        if command == 'GET':
+            return self._get(args[0])
+        if command == 'SET':
+            return self._set(args[0], args[1], args[2:])
+        if command in ('DEL', 'EXISTS'):
+            found = [key for key in args if self._get(key) is not None]
+            if command == 'DEL':
+                for key in found:
+                    del self._values[key]
+            return len(found)
+        if command == 'SCRIPT' and args[0].upper() == 'LOAD':
+            sha = hashlib.sha1(args[1].encode()).hexdigest()
+            self._scripts[sha] = args[1]
+            return sha
+        if command == 'EVALSHA':
+            if args[0] not in self._scripts:
+                raise LookupError('NOSCRIPT No matching script.')
+            return self._eval(self._scripts[args[0]], args[1:])
+        if command == 'EVAL':
+            return self._eval(args[0], args[1:])
+        raise ValueError(f"ERR unknown command '{command}'")
+
+    @staticmethod
+    def _encode(result):
+        if result is None:
+            return b'$-1\r\n'
+        if isinstance(result, int):
+            return b':%d\r\n' % result
+        if result in ('OK', 'PONG'):
+            return f'+{result}\r\n'.encode()
+        data = result.encode()
+        return b'$%d\r\n%s\r\n' % (len(data), data)
+
+    async def _serve(self, reader, writer):
+        self._connections.add(asyncio.current_task())
+        try:
+            while True:
+                header = await reader.readline()
+                if not header:
+                    break
+                args = []
+                for _ in range(int(header[1:])):
+                    length = int((await reader.readline())[1:])
+                    args.append((await reader.readexactly(length + 2))[:-2].decode())
+                command = args[0].upper()
+                self.calls[command] += 1
+                try:
+                    writer.write(self._encode(self._execute(command, args[1:])))
+                except LookupError as e:
+                    writer.write(f'-{e.args[0]}\r\n'.encode())
+                except ValueError as e:
+                    writer.write(f'-ERR {e}\r\n'.encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # A cancelled connection ends quietly, the server is closing
+            pass
+        finally:
+            self._connections.discard(asyncio.current_task())
+            writer.close()
+
+
+async def start_server(app, host='127.0.0.1', port=0):
+    """
+    Start an aiohttp application on a local port.
+
+    Args:
+        app (aiohttp.web.Application): The application.
+        host (str, optional): The host. Defaults to '127.0.0.1'.
+        port (int, optional): The port, 0 for any free port. Defaults to 0.
+
+    Returns:
+        tuple: The runner, to be cleaned up at the end, and the base URL of the server.
+    """
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f'http://{host}:{port}'
@@ -0,0 +1,205 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import tempfile
+import time
+from statistics import quantiles
+
+from benchmarks.fake_servers import FakeBinance, FakeTelegram, FakeRedis, start_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Conversation steps: the text a user sends and a fragment of the last reply that answers it
+FLOWS = {
+    'my_strategy': [
+        ('/my_strategy', 'Enter USDT amount'),
+        ('10', 'Chosen amount'),
+        ('confirm', 'Starting'),
+    ],
+    'strong_buy': [
+        ('/strong_buy', 'Please enter SYMBOL'),
+        ('BTCUSDT', 'choose one of available intervals'),
+        ('1h', 'enter amount'),
+        ('10', 'Amount:'),
+        ('confirm', 'Starting'),
+    ],
+}
+STOP_STEP = ('q', 'Execution stopped')
+
+# Pause after each answered step, so the handler can store the next state before the user replies
+SETTLE_SECONDS = 0.05
+
+
+async def wait_reply(telegram, chat_id, seen, expect, timeout):
+    """
+    Wait for the first reply containing expect among the replies after the first seen ones.
+
+    Args:
+        telegram (FakeTelegram): The Telegram stand-in.
+        chat_id (int): The chat id.
+        seen (int): The number of replies of the chat before the user message.
+        expect (str): A fragment of the expected reply.
+        timeout (float): Seconds to wait for each reply.
+
+    Returns:
+        float: The monotonic arrival time of the reply.
+    """
+    while True:
+        arrived, text = await telegram.wait_reply(chat_id, seen, timeout)
+        if expect in text:
+            return arrived
+        seen += 1
+
+
+async def run_chat(telegram, chat_id, flow, run_seconds, latencies, timeout):
+    """
+    Drive one simulated chat through a flow, let the strategy run and stop it.
+
+    Args:
+        telegram (FakeTelegram): The Telegram stand-in.
+        chat_id (int): The chat id.
+        flow (str): A key of FLOWS.
+        run_seconds (float): How long the started strategy runs before it is stopped.
+        latencies (list): Receives the update-to-reply latency of every step in seconds.
+        timeout (float): Seconds to wait for each reply.
+
+    Returns:
+        None
+    """
+    steps = FLOWS[flow]
+    for index, (text, expect) in enumerate(steps + [STOP_STEP]):
+        if index == len(steps):
+            await asyncio.sleep(run_seconds)
+        seen = telegram.send_text(chat_id, text)
+        sent = time.monotonic()
+        arrived = await wait_reply(telegram, chat_id, seen, expect, timeout)
+        latencies.append(arrived - sent)
+        await asyncio.sleep(SETTLE_SECONDS)
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def run(chats, flow, run_seconds, timeout, storage='memory', mode='polling'):
+    """
+    Run the bot against the stand-in servers and measure it.
+
+    Args:
+        chats (int): Number of simulated chats.
+        flow (str): 'my_strategy', 'strong_buy' or 'mixed'.
+        run_seconds (float): How long each started strategy runs.
+        timeout (float): Seconds to wait for each reply.
+        storage (str, optional): The FSM storage, 'memory', 'sqlite' or 'redis' against a
+            local stand-in. Defaults to 'memory'.
+        mode (str, optional): How the bot receives updates, 'polling' or 'webhook'. Defaults to 'polling'.
+
+    Returns:
+        dict: The benchmark report.
+    """
+    binance = FakeBinance()
+    telegram = FakeTelegram()
+    binance_runner, binance_url = await start_server(binance.app)
+    telegram_runner, telegram_url = await start_server(telegram.app)
+    redis = FakeRedis()
+    work_dir = tempfile.mkdtemp(prefix='bot-benchmark-')
+    webhook_port = free_port()
+
+    os.environ.update({
+        'BOT_TOKEN': '123456:BENCHMARK',
+        'API_KEY': 'benchmark',
+        'SECRET_KEY': 'benchmark',
+        'TELEGRAM_API_URL': telegram_url,
+        'BINANCE_API_URL': f'{binance_url}/api',
+        'BINANCE_STREAM_URL': binance_url.replace('http', 'ws', 1),
+        'CANDLE_STORE_DIR': os.path.join(work_dir, 'candles'),
+        'FSM_STORAGE': storage,
+        'FSM_SQLITE_PATH': os.path.join(work_dir, 'fsm.sqlite3'),
+        'BOT_MODE': mode,
+        'WEBHOOK_URL': f'http://127.0.0.1:{webhook_port}',
+        'WEBHOOK_HOST': '127.0.0.1',
+        'WEBHOOK_PORT': str(webhook_port),
+        'WEBHOOK_SECRET': 'benchmark',
+    })
+    if storage == 'redis':
+        os.environ['REDIS_URL'] = await redis.start()
+    os.chdir(ROOT)
+    # The bot reads its configuration at import time
+    import bot
+
+    polling = asyncio.create_task(bot.main())
+    latencies = []
+    started = time.monotonic()
+    try:
+        await asyncio.gather(*(
+            run_chat(telegram, 1000 + index,
+                     flow if flow != 'mixed' else list(FLOWS)[index % len(FLOWS)],
+                     run_seconds, latencies, timeout)
+            for index in range(chats)
+        ))
+        elapsed = time.monotonic() - started
+    finally:
+        polling.cancel()
+        await asyncio.gather(polling, return_exceptions=True)
+        await binance_runner.cleanup()
+        await telegram.close()
+        await telegram_runner.cleanup()
+        if storage == 'redis':
+            await redis.close()
+
+    percentiles = quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    return {
+        'commit': current_commit(),
+        'chats': chats,
+        'flow': flow,
+        'storage': storage,
+        'mode': mode,
+        'run_seconds': run_seconds,
+        'updates': len(latencies),
+        'elapsed_s': round(elapsed, 3),
+        'updates_per_s': round(len(latencies) / elapsed, 2),
+        'latency_ms': {
+            'p50': round(percentiles[49] * 1000, 2),
+            'p99': round(percentiles[98] * 1000, 2),
+            'max': round(max(latencies) * 1000, 2),
+        },
+        'binance_calls_per_user': {path: round(count / chats, 2) for path, count in sorted(binance.calls.items())},
+        'telegram_calls_per_user': {method: round(count / chats, 2) for method, count in sorted(telegram.calls.items())},
+        'redis_calls_per_user': {command: round(count / chats, 2) for command, count in sorted(redis.calls.items())},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the bot handlers against local stand-in servers')
+    parser.add_argument('--chats', type=int, default=20)
+    parser.add_argument('--flow', choices=['my_strategy', 'strong_buy', 'mixed'], default='mixed')
+    parser.add_argument('--run-seconds', type=float, default=5)
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--storage', choices=['memory', 'sqlite', 'redis'], default='memory')
+    parser.add_argument('--mode', choices=['polling', 'webhook'], default='polling')
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args.chats, args.flow, args.run_seconds, args.timeout, args.storage, args.mode))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+import argparse
+import json
+import time
+from statistics import median
+
+import pandas as pd
+
+from APIs.klines import Klines, klines_to_records, parse_klines
+from benchmarks.handlers import current_commit
+
+# Window sizes: a price poll and a full klines page
+SIZES = (2, 1000)
+
+
+def make_payload(count, start=1_700_000_000_000, step=60_000):
+    """
+    Build a klines response body like the exchange sends.
+
+    Args:
+        count (int): Number of klines.
+        start (int, optional): Open time of the first kline in milliseconds.
+        step (int, optional): Interval in milliseconds. Defaults to one minute.
+
+    Returns:
+        bytes: The JSON array of klines.
+    """
+    rows = []
+    for index in range(count):
+        price = 100 + index % 17 * 0.125
+        rows.append([start + index * step, f'{price:.8f}', f'{price * 1.001:.8f}', f'{price * 0.999:.8f}',
+                     f'{price + 0.01:.8f}', '12.34500000', start + (index + 1) * step - 1, '1234.50000000',
+                     42, '6.10000000', '610.00000000', '0'])
+    return json.dumps(rows, separators=(',', ':')).encode()
+
+
+def legacy_frame(payload):
+    # The DataFrame pipeline last_data() used before the candle store
+    frame = pd.DataFrame(json.loads(payload))
+    frame = frame.iloc[:, :6]
+    frame.columns = ['Time', 'Open', 'High', 'Low', 'Close', 'Volume']
+    frame = frame.set_index('Time')
+    frame.index = pd.to_datetime(frame.index, unit='ms')
+    return frame.astype(float)
+
+
+def decoded_records(payload):
+    # The candle store before this module: JSON decoded by the client, then one float() per field
+    return klines_to_records(json.loads(payload))
+
+
+def records_frame(payload):
+    return Klines(parse_klines(payload)).frame
+
+
+CASES = {
+    'legacy_dataframe': legacy_frame,
+    'client_json_fromiter': decoded_records,
+    'parse_klines': parse_klines,
+    'parse_klines_with_frame': records_frame,
+}
+
+
+def measure(func, payload, min_seconds):
+    """
+    Time func on payload.
+
+    Args:
+        func (callable): The decoder.
+        payload (bytes): The klines response body.
+        min_seconds (float): Minimum time spent in each of the 5 rounds.
+
+    Returns:
+        float: The median time of one call in microseconds.
+    """
+    rounds = []
+    for _ in range(5):
+        calls = 0
+        started = time.perf_counter()
+        while True:
+            func(payload)
+            calls += 1
+            elapsed = time.perf_counter() - started
+            if elapsed >= min_seconds:
+                break
+        rounds.append(elapsed / calls * 1e6)
+    return median(rounds)
+
+
+def run(min_seconds):
+    """
+    Benchmark the kline decoders for every window size.
+
+    Args:
+        min_seconds (float): Minimum time spent in each round.
+
+    Returns:
+        dict: The benchmark report with microseconds per call by size and decoder.
+    """
+    report = {'commit': current_commit(), 'unit': 'us_per_call'}
+    for size in SIZES:
+        payload = make_payload(size)
+        # Every decoder must return the same candles
+        expected = parse_klines(payload)
+        assert (klines_to_records(json.loads(payload)) == expected).all()
+        assert (legacy_frame(payload)['Close'].to_numpy() == expected['close']).all()
+        report[f'{size}_candles'] = {name: round(measure(func, payload, min_seconds), 2) for name, func in CASES.items()}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark decoding klines responses')
+    parser.add_argument('--min-seconds', type=float, default=0.2)
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    text = json.dumps(run(args.min_seconds), indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(text)
+
+
+if __name__ == '__main__':
+    main()
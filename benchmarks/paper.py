@@ -0,0 +1,112 @@
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.fake_servers import FakeBinance, start_server
+from benchmarks.handlers import current_commit
+
+SYMBOL = 'BTCUSDT'
+QUANTITY = 0.001
+
+
+def quote(exchange, price):
+    exchange.on_quote(SYMBOL, round(price - 0.01, 2), 5.0, round(price + 0.01, 2), 5.0)
+
+
+async def market_orders(exchange, count):
+    # Round trips: a market buy and the market sell of the bought quantity
+    for _ in range(count // 2):
+        await exchange.create_order(symbol=SYMBOL, side='BUY', type='MARKET', quantity=QUANTITY)
+        await exchange.create_order(symbol=SYMBOL, side='SELL', type='MARKET', quantity=QUANTITY)
+
+
+async def limit_orders(exchange, count, price):
+    # Bids resting below the book, all filled by one quote crossing them
+    for index in range(count):
+        await exchange.create_order(symbol=SYMBOL, side='BUY', type='LIMIT', quantity=QUANTITY,
+                                    price=round(price - 1 - index % 100 * 0.01, 2))
+    quote(exchange, price - 5)
+    quote(exchange, price)
+
+
+async def oco_orders(exchange, count, price):
+    # SELL OCO exits of bought positions, all left by the take profit, canceling the stops
+    for _ in range(count):
+        await exchange.create_order(symbol=SYMBOL, side='BUY', type='MARKET', quantity=QUANTITY)
+    for index in range(count):
+        await exchange.create_oco_order(symbol=SYMBOL, side='SELL', quantity=QUANTITY,
+                                        price=round(price * 1.02, 2), stopPrice=round(price * 0.985, 2),
+                                        stopLimitPrice=round(price * 0.98, 2))
+    quote(exchange, price * 1.03)
+
+
+async def run(orders):
+    """
+    Measure the paper exchange on quotes fed in process, without network access.
+
+    Args:
+        orders (int): Orders per case.
+
+    Returns:
+        dict: The benchmark report with orders per second by case.
+    """
+    binance = FakeBinance()
+    runner, url = await start_server(binance.app)
+    os.environ.update({
+        'BINANCE_API_URL': f'{url}/api',
+        'CANDLE_STORE_DIR': os.path.join(tempfile.mkdtemp(prefix='bot-paper-'), 'candles'),
+        'PAPER_BALANCE': '1000000000',
+    })
+    # Imported after the environment is set, the modules read it at import
+    from APIs.exchange_info import exchange_info
+    from APIs.paper import PaperExchange
+    from APIs.streams import market_data
+    from loader import close_client
+
+    report = {'commit': current_commit(), 'orders_per_case': orders, 'unit': 'orders_per_s'}
+    try:
+        await exchange_info.load()
+        price = 30000.0
+        cases = {
+            'market': lambda exchange: market_orders(exchange, orders),
+            'limit_rest_and_match': lambda exchange: limit_orders(exchange, orders, price),
+            'oco_exit': lambda exchange: oco_orders(exchange, orders, price),
+        }
+        for name, case in cases.items():
+            exchange = PaperExchange(market_data)
+            events = []
+            exchange.add_handler('executionReport', events.append)
+            exchange.add_handler('listStatus', events.append)
+            quote(exchange, price)
+            started = time.perf_counter()
+            await case(exchange)
+            elapsed = time.perf_counter() - started
+            orders_placed = sum(1 for event in events if event['e'] == 'executionReport' and event['x'] == 'NEW')
+            # Every order must be done and nothing left locked
+            assert not any(order['status'] == 'NEW' for order in exchange._orders.values()), name
+            assert all(abs(locked) < 1e-6 for _, locked in exchange.balances(None).values()), name
+            report[name] = round(orders_placed / elapsed)
+    finally:
+        await close_client()
+        await runner.cleanup()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the paper trading exchange')
+    parser.add_argument('--orders', type=int, default=10000)
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    text = json.dumps(asyncio.run(run(args.orders)), indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(text)
+
+
+if __name__ == '__main__':
+    main()
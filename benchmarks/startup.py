@@ -0,0 +1,131 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from statistics import median
+
+from benchmarks.fake_servers import FakeBinance, FakeTelegram, start_server
+from benchmarks.handlers import ROOT, current_commit
+
+CHAT_ID = 1000
+
+
+def child():
+    """
+    Import and start the bot, reporting the import times on the first line of stdout.
+
+    Runs in the measured subprocess, configured by the environment of the parent.
+    """
+    started = time.perf_counter()
+    import loader
+    loaded = time.perf_counter()
+    import bot
+    imported = time.perf_counter()
+    print(json.dumps({'import_loader_ms': (loaded - started) * 1000,
+                      'import_bot_ms': (imported - started) * 1000}), flush=True)
+    asyncio.run(bot.main())
+
+
+async def interpreter_ms():
+    spawned = time.monotonic()
+    process = await asyncio.create_subprocess_exec(sys.executable, '-c', 'pass')
+    await process.wait()
+    return (time.monotonic() - spawned) * 1000
+
+
+async def start_once(telegram, timeout):
+    """
+    Start the bot in a new process and measure it until it answers a first message.
+
+    Args:
+        telegram (FakeTelegram): The Telegram stand-in.
+        timeout (float): Seconds to wait for the bot.
+
+    Returns:
+        dict: The import times, the time until the bot polls for updates and until it
+            answers a /start sent before it was spawned, in milliseconds.
+    """
+    seen = telegram.send_text(CHAT_ID, '/start')
+    polls = telegram.calls['getUpdates']
+    spawned = time.monotonic()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, '-m', 'benchmarks.startup', '--child', cwd=ROOT, stdout=asyncio.subprocess.PIPE)
+    try:
+        result = json.loads(await asyncio.wait_for(process.stdout.readline(), timeout))
+        while telegram.calls['getUpdates'] == polls:
+            await asyncio.sleep(0.001)
+        result['polling_ms'] = (time.monotonic() - spawned) * 1000
+        arrived, _ = await telegram.wait_reply(CHAT_ID, seen, timeout)
+        result['first_reply_ms'] = (arrived - spawned) * 1000
+    finally:
+        process.terminate()
+        await process.wait()
+    return result
+
+
+async def run(runs, timeout):
+    """
+    Start the bot several times against the stand-in servers.
+
+    Args:
+        runs (int): Number of starts.
+        timeout (float): Seconds to wait for each start.
+
+    Returns:
+        dict: The benchmark report with the median of every measurement.
+    """
+    binance = FakeBinance()
+    telegram = FakeTelegram()
+    binance_runner, binance_url = await start_server(binance.app)
+    telegram_runner, telegram_url = await start_server(telegram.app)
+    work_dir = tempfile.mkdtemp(prefix='bot-startup-')
+    os.environ.update({
+        'BOT_TOKEN': '123456:BENCHMARK',
+        'API_KEY': 'benchmark',
+        'SECRET_KEY': 'benchmark',
+        'TELEGRAM_API_URL': telegram_url,
+        'BINANCE_API_URL': f'{binance_url}/api',
+        'BINANCE_STREAM_URL': binance_url.replace('http', 'ws', 1),
+        'CANDLE_STORE_DIR': os.path.join(work_dir, 'candles'),
+        'FSM_STORAGE': 'memory',
+        'BOT_MODE': 'polling',
+    })
+    try:
+        interpreter = [await interpreter_ms() for _ in range(runs)]
+        starts = [await start_once(telegram, timeout) for _ in range(runs)]
+    finally:
+        await binance_runner.cleanup()
+        await telegram.close()
+        await telegram_runner.cleanup()
+
+    report = {'commit': current_commit(), 'runs': runs, 'interpreter_ms': round(median(interpreter), 1)}
+    for key in ('import_loader_ms', 'import_bot_ms', 'polling_ms', 'first_reply_ms'):
+        report[key] = round(median(start[key] for start in starts), 1)
+    report['binance_calls_per_start'] = {path: round(count / runs, 2) for path, count in sorted(binance.calls.items())}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the cold start of the bot against local stand-in servers')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child()
+        return
+
+    report = asyncio.run(run(args.runs, args.timeout))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(text)
+
+
+if __name__ == '__main__':
+    main()
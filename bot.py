@@ -1,20 +1,45 @@
 import asyncio
 import logging
 import sys
-from loader import bot
-from handlers import start, strategy, strong_buy
+from loader import get_bot, close_client, preload_modules, BOT_MODE, METRICS_HOST, METRICS_PORT
+from APIs.paper import paper_exchange
+from APIs.scanner import market_scanner
+from APIs.streams import market_data, stream_manager
+from APIs.user_stream import user_stream
+from handlers import start, admin, strategy, strong_buy
 from utils.set_bot_commands import set_default_commands
+from utils.storage import create_storage
+from utils.webhook import run_webhook
+from utils.metrics import TelegramRequestMetrics, UpdateMetrics, start_metrics_server
+from utils.loop_monitor import loop_monitor
+from APIs.notifications import notifier
+from APIs.supervisor import supervisor
 from aiogram import Dispatcher, types
-from aiogram.fsm.storage.memory import MemoryStorage
+
+
+async def run_startup_tasks() -> None:
+    """
+    Set the default commands and import the modules requests need, while updates are received.
+
+    Neither is needed to receive the first updates, so they do not delay them. Failures are logged.
+
+    Returns:
+        None
+    """
+    results = await asyncio.gather(set_default_commands(), preload_modules(), return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logging.error('Startup task failed', exc_info=result)
 
 
 async def main() -> None:
     """
     The main entry point for the bot's execution.
 
-    This function initializes the dispatcher with memory storage, sets default commands,
-    includes routers for different functionalities, deletes any pending webhook updates,
-    and starts polling for updates from the bot.
+    This function initializes the dispatcher with the configured FSM storage, includes routers
+    for different functionalities and receives updates by long polling, after deleting any
+    pending webhook updates, or through a webhook when BOT_MODE is 'webhook'. Default commands
+    are set at the same time.
 
     Args:
         None
@@ -23,22 +48,53 @@ async def main() -> None:
         None
     """
 
-    # Create a Dispatcher instance with MemoryStorage
-    dp = Dispatcher(storage=MemoryStorage())
+    bot = get_bot()
 
-    # Set default commands for the bot
-    await set_default_commands()
+    # Create a Dispatcher instance with the storage selected by FSM_STORAGE
+    storage, events_isolation = create_storage()
+    dp = Dispatcher(storage=storage, events_isolation=events_isolation)
+
+    # Time every Telegram request and every handled update
+    bot.session.middleware(TelegramRequestMetrics())
+    dp.update.outer_middleware(UpdateMetrics())
+    metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT) if METRICS_PORT else None
+    # Log the code blocking the event loop
+    loop_monitor.start()
 
     # Include routers for different parts of the bot's functionality
     dp.include_router(start.router)
+    dp.include_router(admin.router)
     dp.include_router(strategy.router)
     dp.include_router(strong_buy.router)
 
-    # Delete any pending updates from the webhook
-    await bot.delete_webhook(drop_pending_updates=True)
-
-    # Start polling for updates using the dispatcher
-    await dp.start_polling(bot)
+    # Set default commands for the bot alongside the first updates
+    startup = asyncio.create_task(run_startup_tasks())
+    try:
+        if BOT_MODE == 'webhook':
+            # Serve updates pushed by Telegram, pending updates are kept
+            await run_webhook(dp, bot)
+        else:
+            # Delete any pending updates from the webhook
+            await bot.delete_webhook(drop_pending_updates=True)
+
+            # Start polling for updates using the dispatcher
+            await dp.start_polling(bot)
+    finally:
+        # Stop the running strategies and the outbound message queue,
+        # then release the shared Binance stream connection and HTTP session
+        startup.cancel()
+        await asyncio.gather(startup, return_exceptions=True)
+        await supervisor.close()
+        await notifier.close()
+        await market_scanner.close()
+        await paper_exchange.close()
+        await market_data.close()
+        await stream_manager.close()
+        await user_stream.close()
+        await close_client()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await loop_monitor.stop()
 
 
 if __name__ == "__main__":
@@ -1,3 +1,4 @@
 from . import start
+from . import admin
 from . import strategy
-from . import strong_buy
\ No newline at end of file
+from . import strong_buy
@@ -0,0 +1,41 @@
+from aiogram import Router, types, F
+from aiogram.filters import Command
+from loader import ADMIN_IDS
+from utils.metrics import summary
+from utils.loop_monitor import loop_monitor
+
+router = Router()
+# Admin commands are only answered for the users listed in ADMIN_IDS
+router.message.filter(F.from_user.id.in_(ADMIN_IDS))
+
+
+@router.message(Command('stats'))
+async def stats_command(message: types.Message):
+    """
+    Handle the /stats admin command.
+
+    Responds with the latency and request metrics of the running bot.
+
+    Args:
+        message (types.Message): The incoming message object.
+
+    Returns:
+        None
+    """
+    await message.answer(summary())
+
+
+@router.message(Command('stalls'))
+async def stalls_command(message: types.Message):
+    """
+    Handle the /stalls admin command.
+
+    Responds with the handlers and functions that blocked the event loop the longest.
+
+    Args:
+        message (types.Message): The incoming message object.
+
+    Returns:
+        None
+    """
+    await message.answer(loop_monitor.summary())
@@ -1,12 +1,11 @@
 from aiogram import Router, types, F
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
+from APIs.supervisor import supervisor
 
 router = Router()
 
 
-
-
 @router.message(Command('start'))
 async def start_command(message: types.Message, state: FSMContext):
     """
@@ -27,6 +26,7 @@ async def start_command(message: types.Message, state: FSMContext):
                          "\n/start - Return to beginning\n"
                          "\n/strong_buy - Execute the trading strategy based on 'STRONG BUY' and 'STRONG SELL' signals from TradingView\n"
                          "\n/my_strategy - Spot trading using previously configured custom strategy\n"
+                         "\n/status - Show your running strategies\n"
                          "\n/cancel - Use it to terminate any process", reply_markup=types.ReplyKeyboardRemove())
     await state.clear()
 
@@ -36,7 +36,7 @@ async def cancel_command(message: types.Message, state: FSMContext):
     """
     Handle the /cancel command.
 
-    Responds to the cancel command and clears the current state.
+    Responds to the cancel command, stops the running strategies of the chat and clears the current state.
 
     Args:
         message (types.Message): The incoming message object.
@@ -45,5 +45,43 @@ async def cancel_command(message: types.Message, state: FSMContext):
     Returns:
         None
     """
+    await supervisor.cancel(message.chat.id)
     await message.answer('Current process is terminated', reply_markup=types.ReplyKeyboardRemove())
-    await state.clear()
\ No newline at end of file
+    await state.clear()
+
+
+@router.message(Command('status'))
+async def status_command(message: types.Message):
+    """
+    Handle the /status command.
+
+    Lists the strategies running in the chat.
+
+    Args:
+        message (types.Message): The incoming message object.
+
+    Returns:
+        None
+    """
+    sessions = supervisor.list(message.chat.id)
+    if not sessions:
+        await message.answer('No strategies are running')
+        return
+    await message.answer("<b>Running strategies:</b>\n" + "\n".join(session.describe() for session in sessions))
+
+
+@router.message(F.text == 'q')
+async def stop_running(message: types.Message, state: FSMContext):
+    """
+    Stops the running strategies of the chat and clears the state.
+
+    Args:
+        message (types.Message): The incoming message object.
+        state (FSMContext): The state context.
+
+    Returns:
+        None
+    """
+    await supervisor.cancel(message.chat.id)
+    await message.answer(text="Execution stopped", reply_markup=types.ReplyKeyboardRemove())
+    await state.clear()
@@ -3,7 +3,7 @@ from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from states.my_states import AmountState
 from APIs.api import get_balance, strategy
-from loader import client
+from APIs.supervisor import supervisor
 from keyboards.confirm_keyboard import confirm_kb
 
 router = Router()
@@ -24,7 +24,7 @@ async def show_balance(message: types.Message, state: FSMContext):
     Returns:
         None
     """
-    balance = get_balance()
+    balance = await get_balance()
     if balance:
         await message.answer("<b>Your current assets:</b>")
         for item in balance:
@@ -62,7 +62,7 @@ async def start_trading(message: types.Message, state: FSMContext):
     """
     Start the trading strategy with the chosen amount.
 
-    Initiates the trading strategy with the user's chosen amount and clears the state.
+    Starts the trading strategy with the user's chosen amount as a background task and clears the state.
 
     Args:
         message (types.Message): The incoming message object.
@@ -71,27 +71,16 @@ async def start_trading(message: types.Message, state: FSMContext):
     Returns:
         None
     """
-    await message.answer(text="Starting..."
-                              "\nto stop execution print 'q'", reply_markup=types.ReplyKeyboardRemove())
     user_data = await state.get_data()
-    await strategy(message, state, int(user_data['chosen_amount']))
-    await state.clear()
-
-
-@router.message(AmountState.confirm_input, F.text == 'q')
-async def stop_running(message: types.Message, state: FSMContext):
-    """
-    Stops the running strategy and clears the state.
-
-    Args:
-        message (types.Message): The incoming message object.
-        state (FSMContext): The state context.
-
-    Returns:
-        None
-    """
-    await message.answer(text="Execution stopped")
     await state.clear()
+    amount = int(user_data['chosen_amount'])
+    session = supervisor.start(message.chat.id, f'my_strategy {amount} USDT', strategy, message.chat.id, amount)
+    if session is None:
+        await message.answer(f"You already run {supervisor.max_per_chat} strategies."
+                             "\nSee them with /status or stop them with 'q'", reply_markup=types.ReplyKeyboardRemove())
+        return
+    await message.answer(text="Starting..."
+                              "\nto stop execution print 'q'", reply_markup=types.ReplyKeyboardRemove())
 
 
 @router.message(AmountState.confirm_input)
@@ -2,9 +2,11 @@ from aiogram import Router, types, F
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from states.my_states import SBuyState
-from APIs.api import get_balance, get_symbols
+from APIs.api import get_balance
+from APIs.exchange_info import exchange_info
 from APIs.trading_view import tw_script
-from keyboards.intervals_keyboard import intervals_kb
+from APIs.supervisor import supervisor
+from keyboards.intervals_keyboard import intervals_kb, INTERVALS
 from keyboards.confirm_keyboard import confirm_kb
 
 router = Router()
@@ -25,15 +27,15 @@ async def get_symb(message: types.Message, state: FSMContext):
     Returns:
         None
     """
-    balance = get_balance()
+    balance = await get_balance()
     if balance:
+        # Load the shared symbol index once, before the user enters a symbol
+        await exchange_info.load()
         await message.answer("<b>Your current assets:</b>")
         for item in balance:
             await state.set_state(SBuyState.symbol_input)
             await message.answer(
                 f"Asset: {item['asset']}\nTotal Balance: {item['total_balance']}\nLocked balance: {item['locked_balance']}\n")
-            spot_symbols = get_symbols()
-            await state.update_data(spot_symbols=spot_symbols)
             await message.answer("Please enter SYMBOL: ")
     else:
         await message.answer('\nNot enough funds. Please check your spot wallet')
@@ -53,12 +55,10 @@ async def get_intervals(message: types.Message, state: FSMContext):
     Returns:
         None
     """
-    user_data = await state.get_data()
     symbol = message.text.upper()
-    if symbol in user_data['spot_symbols']:
-        ints = ['1m', '5m', '15m', '30m', '1h', '2h', '4h', '1d', '1w', '1mon']
+    await exchange_info.load()
+    if exchange_info.is_spot_symbol(symbol):
         await state.update_data(symbol=symbol)
-        await state.update_data(ints=ints)
         await state.set_state(SBuyState.interval_input)
         await message.answer("Please choose one of available intervals", reply_markup=intervals_kb())
     else:
@@ -80,8 +80,7 @@ async def get_qnty(message: types.Message, state: FSMContext):
         None
     """
     intrv = message.text
-    user_data = await state.get_data()
-    if intrv in user_data['ints']:
+    if intrv in INTERVALS:
         await state.update_data(intrv=intrv)
         await state.set_state(SBuyState.qnty_input)
         await message.answer('Please enter amount for trading:', reply_markup=types.ReplyKeyboardRemove())
@@ -116,7 +115,7 @@ async def start_trading(message: types.Message, state: FSMContext):
     """
     Start the strong buy trading process.
 
-    Initiates the strong buy trading process and clears the state.
+    Starts the strong buy trading process as a background task and clears the state.
 
     Args:
         message (types.Message): The incoming message object.
@@ -126,26 +125,16 @@ async def start_trading(message: types.Message, state: FSMContext):
         None
     """
     user_data = await state.get_data()
+    await state.clear()
+    name = f"strong_buy {user_data['symbol']} {user_data['intrv']}"
+    session = supervisor.start(message.chat.id, name, tw_script, message.chat.id,
+                               user_data['symbol'], user_data['intrv'], int(user_data['qnty']))
+    if session is None:
+        await message.answer(f"You already run {supervisor.max_per_chat} strategies."
+                             "\nSee them with /status or stop them with 'q'", reply_markup=types.ReplyKeyboardRemove())
+        return
     await message.answer(text="Starting..."
                               "\nto stop execution print 'q'", reply_markup=types.ReplyKeyboardRemove())
-    await tw_script(message, state, user_data['symbol'], user_data['intrv'], int(user_data['qnty']))
-    await state.clear()
-
-
-@router.message(SBuyState.conf_input, F.text == 'q')
-async def stop_running(message: types.Message, state: FSMContext):
-    """
-    Stops the running strong buy process and clears the state.
-
-    Args:
-        message (types.Message): The incoming message object.
-        state (FSMContext): The state context.
-
-    Returns:
-        None
-    """
-    await message.answer(text="Execution stopped")
-    await state.clear()
 
 
 @router.message(SBuyState.conf_input)
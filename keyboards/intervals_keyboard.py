@@ -1,6 +1,8 @@
 from aiogram.types import ReplyKeyboardMarkup
 from aiogram.utils.keyboard import ReplyKeyboardBuilder
 
+# Intervals offered by the /strong_buy dialogue
+INTERVALS = ('1m', '5m', '15m', '30m', '1h', '2h', '4h', '1d', '1w', '1mon')
 
 
 def intervals_kb() -> ReplyKeyboardMarkup:
@@ -13,15 +15,7 @@ def intervals_kb() -> ReplyKeyboardMarkup:
         ReplyKeyboardMarkup: The reply keyboard markup with interval options.
     """
     kb = ReplyKeyboardBuilder()  # Create a ReplyKeyboardBuilder instance
-    kb.button(text="1m")          # Add interval buttons
-    kb.button(text="5m")
-    kb.button(text="15m")
-    kb.button(text="30m")
-    kb.button(text="1h")
-    kb.button(text="2h")
-    kb.button(text="4h")
-    kb.button(text="1d")
-    kb.button(text="1w")
-    kb.button(text="1mon")
+    for interval in INTERVALS:    # Add interval buttons
+        kb.button(text=interval)
     kb.adjust(5)                  # Adjust the keyboard layout
     return kb.as_markup(resize_keyboard=True)  # Return the markup with resize_keyboard option
\ No newline at end of file
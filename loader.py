@@ -1,5 +1,5 @@
-from aiogram import Bot
-from binance.client import Client
+import asyncio
+import importlib
 import os
 from dotenv import load_dotenv
 
@@ -10,11 +10,171 @@ TOKEN = os.getenv('BOT_TOKEN')
 API_KEY = os.getenv('API_KEY')
 SECRET_KEY = os.getenv('SECRET_KEY')
 
+# Endpoint overrides, used to point the bot at local stand-in servers
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL')
+BINANCE_API_URL = os.getenv('BINANCE_API_URL')
+BINANCE_STREAM_URL = os.getenv('BINANCE_STREAM_URL', 'wss://stream.binance.com:9443')
 
+# Seconds a market stream nobody watches any more is kept open, in case it is watched again
+STREAM_IDLE_TIMEOUT = float(os.getenv('STREAM_IDLE_TIMEOUT', '60'))
 
-# Create a Bot instance using the provided token with HTML parsing mode
-bot = Bot(TOKEN, parse_mode='HTML')
+# Directory of the local kline store shared by all strategies
+CANDLE_STORE_DIR = os.getenv('CANDLE_STORE_DIR', 'data/candles')
 
-# Create a Client instance using the provided API key and secret key
-client = Client(API_KEY, SECRET_KEY)
+# Source of the technical analysis used by /strong_buy: 'local' or 'tradingview'
+TA_SOURCE = os.getenv('TA_SOURCE', 'local')
 
+# Share of the interval a TradingView analysis is cached for, at most until the next candle opens
+TV_CACHE_FRACTION = float(os.getenv('TV_CACHE_FRACTION', '0.1'))
+
+# How strategy() exits a position: 'monitor' sells from the bot, 'oco' leaves it to an exchange OCO order
+EXIT_MODE = os.getenv('EXIT_MODE', 'monitor')
+# Distance of the stop-limit price below the stop trigger of OCO exits
+OCO_STOP_LIMIT_GAP = float(os.getenv('OCO_STOP_LIMIT_GAP', '0.002'))
+
+# Coins strategy() enters: 'top' checks the top coin by 24h change, 'market' every USDT pair
+# through the shared market scanner
+ENTRY_SCOPE = os.getenv('ENTRY_SCOPE', 'top')
+# Ranking scores of the market scanner, the first one orders the candidates
+SCANNER_SCORES = tuple(name.strip() for name in os.getenv('SCANNER_SCORES', 'growth,momentum').split(',') if name.strip())
+# Worker processes computing the heavier scanner scores, 0 computes them in the bot process
+SCANNER_WORKERS = int(os.getenv('SCANNER_WORKERS', '0'))
+
+# Where orders go: 'live' sends them to Binance, 'paper' to the simulated exchange
+TRADING_MODE = os.getenv('TRADING_MODE', 'live')
+# Telegram user ids always trading on the simulated exchange, separated by commas
+PAPER_USER_IDS = {int(user_id) for user_id in os.getenv('PAPER_USER_IDS', '').split(',') if user_id.strip()}
+# Starting USDT balance of every simulated account and the fee rate of simulated fills
+PAPER_BALANCE = float(os.getenv('PAPER_BALANCE', '10000'))
+PAPER_FEE_RATE = float(os.getenv('PAPER_FEE_RATE', '0.001'))
+
+# Maximum number of strategies running at the same time in one chat
+MAX_TASKS_PER_USER = int(os.getenv('MAX_TASKS_PER_USER', '3'))
+
+# FSM storage of the dispatcher: 'memory', 'sqlite' or 'redis'
+FSM_STORAGE = os.getenv('FSM_STORAGE', 'memory')
+FSM_SQLITE_PATH = os.getenv('FSM_SQLITE_PATH', 'data/fsm.sqlite3')
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+# Seconds after which Redis forgets an abandoned dialogue, unset to keep it forever
+FSM_TTL = int(os.getenv('FSM_TTL')) if os.getenv('FSM_TTL') else None
+
+# How updates are received: 'polling' or 'webhook'
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+# Public base URL Telegram sends updates to, and the local server receiving them
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+# Webhook update processing: queued updates, concurrent workers and seconds to finish the queue on shutdown
+UPDATE_QUEUE_SIZE = int(os.getenv('UPDATE_QUEUE_SIZE', '1024'))
+UPDATE_WORKERS = int(os.getenv('UPDATE_WORKERS', '16'))
+DRAIN_TIMEOUT = float(os.getenv('DRAIN_TIMEOUT', '30'))
+
+# Prometheus metrics endpoint, disabled when METRICS_PORT is not set
+METRICS_HOST = os.getenv('METRICS_HOST', '0.0.0.0')
+METRICS_PORT = int(os.getenv('METRICS_PORT')) if os.getenv('METRICS_PORT') else None
+# Telegram user ids allowed to use admin commands such as /stats, separated by commas
+ADMIN_IDS = {int(user_id) for user_id in os.getenv('ADMIN_IDS', '').split(',') if user_id.strip()}
+
+# Seconds the event loop may be blocked before the stall is logged with its stack, 0 disables the monitor
+STALL_THRESHOLD = float(os.getenv('STALL_THRESHOLD', '0.1'))
+
+# Modules only needed once requests are handled, imported in the background after startup
+PRELOAD_MODULES = ('binance',)
+
+# The Telegram bot and the Binance client are created on first use, so importing this module
+# only reads the configuration and does not import aiogram or python-binance
+_bot = None
+# Shared by every coroutine, so all Binance requests go through a single HTTP session
+_client = None
+_client_lock = asyncio.Lock()
+# Module name: the future of its import in a worker thread
+_imports = {}
+
+
+def get_bot():
+    """
+    Get the shared Telegram bot.
+
+    Creates the Bot with HTML parsing mode on the first call and returns the same instance afterwards.
+
+    Returns:
+        aiogram.Bot: The shared bot.
+    """
+    global _bot
+    if _bot is None:
+        from aiogram import Bot
+        if TELEGRAM_API_URL:
+            from aiogram.client.session.aiohttp import AiohttpSession
+            from aiogram.client.telegram import TelegramAPIServer
+            session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL))
+            _bot = Bot(TOKEN, session=session, parse_mode='HTML')
+        else:
+            _bot = Bot(TOKEN, parse_mode='HTML')
+    return _bot
+
+
+async def get_client():
+    """
+    Get the shared asynchronous Binance client.
+
+    Creates the AsyncClient on the first call and returns the same instance afterwards.
+
+    Returns:
+        AsyncClient: The shared Binance client.
+    """
+    global _client
+    if _client is None:
+        AsyncClient = (await import_module('binance')).AsyncClient
+        async with _client_lock:
+            if _client is None and BINANCE_API_URL:
+                # Skip the ping of AsyncClient.create() and send everything to the override
+                client = AsyncClient(API_KEY, SECRET_KEY)
+                client.API_URL = BINANCE_API_URL
+                _client = client
+            elif _client is None:
+                _client = await AsyncClient.create(API_KEY, SECRET_KEY)
+    return _client
+
+
+async def close_client():
+    """
+    Close the shared Binance client and its HTTP session.
+
+    Returns:
+        None
+    """
+    global _client
+    if _client is not None:
+        await _client.close_connection()
+        _client = None
+
+
+async def import_module(name):
+    """
+    Import a module in a worker thread, so the event loop keeps running meanwhile.
+
+    Importing python-binance or pandas takes hundreds of milliseconds. Every caller waits for
+    the same import, later calls return at once.
+
+    Args:
+        name (str): The module name.
+
+    Returns:
+        module: The imported module.
+    """
+    if name not in _imports:
+        _imports[name] = asyncio.ensure_future(asyncio.to_thread(importlib.import_module, name))
+    return await _imports[name]
+
+
+async def preload_modules():
+    """
+    Import PRELOAD_MODULES one after another in a worker thread.
+
+    Returns:
+        None
+    """
+    for name in PRELOAD_MODULES:
+        await import_module(name)
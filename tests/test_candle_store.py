@@ -0,0 +1,67 @@
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from APIs import candle_store as candle_store_module
+from APIs.candle_store import KLINES_LIMIT, CandleStore
+from APIs.klines import KLINE_DTYPE
+
+MINUTE_MS = 60 * 1000
+# Candles the fake exchange has, by index of their minute
+AVAILABLE = 10000
+
+
+def candles(first, last):
+    open_times = np.arange(first, last + 1) * MINUTE_MS
+    records = np.zeros(len(open_times), dtype=KLINE_DTYPE)
+    records['open_time'] = open_times
+    records['close'] = open_times / MINUTE_MS
+    return records
+
+
+class FakeRateLimiter:
+    """Answers klines requests from AVAILABLE one-minute candles, like the exchange."""
+
+    async def call(self, endpoint, func, client, symbol, interval, startTime, limit, endTime=None):
+        first = -(-startTime // MINUTE_MS)
+        last = AVAILABLE - 1 if endTime is None else min(AVAILABLE - 1, endTime // MINUTE_MS)
+        last = min(last, first + limit - 1)
+        rows = [[int(record['open_time']), str(record['open']), str(record['high']), str(record['low']),
+                 str(record['close']), str(record['volume']), 0, '0', 0, '0', '0', '0']
+                for record in candles(first, last)] if first <= last else []
+        return json.dumps(rows).encode()
+
+
+async def get_client():
+    return None
+
+
+def test_backfill_of_many_chunks_keeps_newer_candles(tmp_path, monkeypatch):
+    monkeypatch.setattr(candle_store_module, 'rate_limiter', FakeRateLimiter())
+    monkeypatch.setattr(candle_store_module, 'get_client', get_client)
+    store = CandleStore(str(tmp_path), max_staleness=3600)
+    store.write('BTCUSDT', '1m', candles(9500, AVAILABLE - 1))
+    # Stored candles count as fresh, so only the backfill is downloaded
+    store._synced_at[('BTCUSDT', '1m')] = time.monotonic()
+
+    first = 9500 - 2 * KLINES_LIMIT - 500
+    records = asyncio.run(store.load('BTCUSDT', '1m', first * MINUTE_MS))
+
+    expected = candles(first, AVAILABLE - 1)
+    assert np.array_equal(records['open_time'], expected['open_time'])
+    assert np.array_equal(records['close'], expected['close'])
+
+
+def test_write_inside_stored_candles_merges_them(tmp_path):
+    store = CandleStore(str(tmp_path))
+    store.write('BTCUSDT', '1m', candles(0, 99))
+    replaced = candles(10, 19)
+    replaced['close'] = -1.0
+    store.write('BTCUSDT', '1m', replaced)
+
+    records = store.read('BTCUSDT', '1m')
+    assert np.array_equal(records['open_time'], candles(0, 99)['open_time'])
+    assert (records['close'][10:20] == -1.0).all()
+    assert np.array_equal(records['close'][20:], candles(20, 99)['close'])
@@ -1 +1,5 @@
 from . import set_bot_commands
+from . import storage
+from . import webhook
+from . import metrics
+from . import loop_monitor
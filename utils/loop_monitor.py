@@ -0,0 +1,173 @@
+import asyncio
+import html
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from loader import STALL_THRESHOLD
+from utils.metrics import registry
+
+# Seconds between two heartbeats of the event loop
+TICK_INTERVAL = 0.05
+
+# Modules of the bot, frames of other modules belong to libraries
+BOT_PACKAGES = ('APIs', 'handlers', 'keyboards', 'states', 'utils', 'loader', 'bot', '__main__')
+# Modules running the code of others, skipped when looking for the handler of a stall
+RUNNER_MODULES = ('utils.metrics', 'utils.webhook', 'utils.loop_monitor', 'APIs.supervisor')
+
+loop_lag = registry.histogram(
+    'event_loop_lag_seconds', 'Delay of the event loop in running a scheduled callback')
+loop_stalls = registry.counter(
+    'event_loop_stalls_total', 'Times the event loop was blocked for longer than the stall threshold')
+
+
+def _frame_name(frame):
+    module = frame.f_globals.get('__name__', '?')
+    return f'{module}.{frame.f_code.co_qualname}'
+
+
+def _is_bot_frame(frame):
+    module = frame.f_globals.get('__name__', '')
+    return module.split('.', 1)[0] in BOT_PACKAGES
+
+
+def attribute(frame):
+    """
+    Find the code responsible for a stack.
+
+    Args:
+        frame (frame): The innermost frame of the stack of the event loop thread.
+
+    Returns:
+        tuple: The handler and the function, each '?' if the stack has no bot frames. The
+            handler is the outermost bot function outside RUNNER_MODULES, or the outermost bot
+            function when all are in them. The function is the innermost bot function with its
+            line number.
+    """
+    handler = function = outermost = '?'
+    # Frames below the callback the event loop is running belong to the loop itself
+    while frame is not None and frame.f_globals.get('__name__') != 'asyncio.events':
+        if _is_bot_frame(frame):
+            if function == '?':
+                function = f'{_frame_name(frame)}:{frame.f_lineno}'
+            outermost = _frame_name(frame)
+            if frame.f_globals.get('__name__') not in RUNNER_MODULES:
+                handler = outermost
+        frame = frame.f_back
+    return handler if handler != '?' else outermost, function
+
+
+class LoopMonitor:
+    """
+    Detects when the event loop is blocked.
+
+    A task on the loop wakes up every TICK_INTERVAL and records how late it was. A watchdog
+    thread checks those heartbeats, and when the loop is late by more than the threshold it
+    captures the stack of the loop thread, so the stall is attributed to the handler and the
+    function that blocked it while it is still blocking. Stalls are logged and aggregated per
+    handler and function.
+    """
+
+    def __init__(self, threshold=STALL_THRESHOLD):
+        self.threshold = threshold
+        # (handler, function): [stalls, total seconds, longest seconds, last stack]
+        self.offenders = {}
+        self._beat = 0.0
+        self._capture = None
+        self._lock = threading.Lock()
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """
+        Start monitoring the running event loop.
+
+        Returns:
+            None
+        """
+        if self._task is not None or not self.threshold:
+            return
+        self._beat = time.perf_counter()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._tick())
+        self._thread = threading.Thread(target=self._watch, args=(threading.get_ident(),),
+                                        name='loop-watchdog', daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        """
+        Stop monitoring.
+
+        Returns:
+            None
+        """
+        if self._task is None:
+            return
+        self._stop.set()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        await asyncio.to_thread(self._thread.join)
+        self._task = self._thread = None
+
+    async def _tick(self):
+        while True:
+            expected = time.perf_counter() + TICK_INTERVAL
+            await asyncio.sleep(TICK_INTERVAL)
+            now = time.perf_counter()
+            lag = max(0.0, now - expected)
+            with self._lock:
+                self._beat = now
+                capture, self._capture = self._capture, None
+            loop_lag.observe(lag)
+            if lag >= self.threshold:
+                self._record(lag, capture)
+
+    def _watch(self, loop_thread):
+        frames = sys._current_frames
+        while not self._stop.wait(self.threshold / 2):
+            with self._lock:
+                if self._capture is not None or time.perf_counter() - self._beat < TICK_INTERVAL + self.threshold:
+                    continue
+                frame = frames().get(loop_thread)
+                if frame is None:
+                    continue
+                # The loop is still blocked, so this is the stack of the blocking code
+                handler, function = attribute(frame)
+                self._capture = handler, function, traceback.format_stack(frame)
+            del frame
+
+    def _record(self, lag, capture):
+        handler, function, stack = capture or ('?', '?', [])
+        loop_stalls.inc()
+        offender = self.offenders.setdefault((handler, function), [0, 0.0, 0.0, []])
+        offender[0] += 1
+        offender[1] += lag
+        offender[2] = max(offender[2], lag)
+        offender[3] = stack
+        logging.warning('Event loop blocked for %.0f ms by %s in %s', lag * 1000, handler, function)
+        logging.debug('Stack of the blocked event loop:\n%s', ''.join(stack))
+
+    def summary(self, top=10):
+        """
+        Summarize the worst stalls for a chat message.
+
+        Args:
+            top (int, optional): The number of offenders to list. Defaults to 10.
+
+        Returns:
+            str: The handlers and functions that blocked the loop longest in total.
+        """
+        if not self.offenders:
+            return f'No event loop stalls over {self.threshold * 1000:.0f} ms'
+        worst = sorted(self.offenders.items(), key=lambda item: item[1][1], reverse=True)[:top]
+        lines = [f'<b>Event loop stalls over {self.threshold * 1000:.0f} ms</b>']
+        for (handler, function), (stalls, total, longest, _) in worst:
+            lines.append(f'{html.escape(handler)} in {html.escape(function)}: {stalls} stalls, '
+                         f'{total:.1f} s total, longest {longest * 1000:.0f} ms')
+        return '\n'.join(lines)
+
+
+loop_monitor = LoopMonitor()
@@ -0,0 +1,255 @@
+import bisect
+import contextvars
+import time
+from collections import Counter as _Tally
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiohttp import web
+
+# Default histogram buckets in seconds, from 1 ms to 1 minute
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# The Telegram user an update, and every call made while handling it, belongs to
+current_user = contextvars.ContextVar('current_user', default=None)
+
+
+def _label_text(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, values)) + '}'
+
+
+class Counter:
+    """
+    Monotonic counter with labels.
+    """
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.values = {}
+
+    def inc(self, *label_values, amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for label_values, value in sorted(self.values.items()):
+            lines.append(f'{self.name}{_label_text(self.labels, label_values)} {value}')
+        return lines
+
+
+class Histogram:
+    """
+    Histogram with labels and fixed buckets.
+
+    An observation is a bisect and three additions, cheap enough for every external call.
+    """
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # Label values: [bucket counts with a last +Inf bucket, sum, count]
+        self.values = {}
+
+    def observe(self, value, *label_values):
+        series = self.values.get(label_values)
+        if series is None:
+            series = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def quantile(self, q, *label_values):
+        """
+        Estimate a quantile by linear interpolation inside its bucket.
+
+        Args:
+            q (float): The quantile between 0 and 1.
+            *label_values: The label values of the series.
+
+        Returns:
+            float or None: The estimate, None without observations.
+        """
+        series = self.values.get(label_values)
+        if not series or not series[2]:
+            return None
+        rank = q * series[2]
+        seen = 0
+        for index, count in enumerate(series[0]):
+            if count and seen + count >= rank:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for label_values, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                labels = _label_text(self.labels + ('le',), label_values + (bound,))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _label_text(self.labels, label_values)
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Registry:
+    """
+    The metrics of the process, rendered in the Prometheus text format.
+
+    Calls to external services are also tallied per Telegram user, taken from current_user.
+    The per-user tally is kept out of the exported metrics to keep their cardinality low.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.user_calls = _Tally()
+
+    def counter(self, name, help_text, labels=()):
+        metric = Counter(name, help_text, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help_text, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def count_user_call(self):
+        user = current_user.get()
+        if user is not None:
+            self.user_calls[user] += 1
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+binance_requests = registry.counter(
+    'binance_requests_total', 'Binance REST requests by endpoint and outcome', ('endpoint', 'outcome'))
+binance_latency = registry.histogram(
+    'binance_request_seconds', 'Binance REST request latency, without the rate limiter wait', ('endpoint',))
+binance_wait = registry.histogram(
+    'binance_rate_limit_wait_seconds', 'Time Binance requests waited for the rate limiter', ('endpoint',))
+tradingview_latency = registry.histogram(
+    'tradingview_request_seconds', 'TradingView analysis request latency', ('outcome',))
+telegram_requests = registry.counter(
+    'telegram_requests_total', 'Telegram Bot API requests by method and outcome', ('method', 'outcome'))
+telegram_latency = registry.histogram(
+    'telegram_request_seconds', 'Telegram Bot API request latency', ('method',))
+update_latency = registry.histogram(
+    'telegram_update_seconds', 'Time to handle an incoming update', ('event',))
+order_fill_latency = registry.histogram(
+    'order_fill_seconds', 'Time from sending an order until it is filled', ('kind',),
+    buckets=LATENCY_BUCKETS + (300, 900, 3600, 14400, 86400))
+
+
+class TelegramRequestMetrics(BaseRequestMiddleware):
+    """
+    Bot session middleware timing every Telegram Bot API request.
+    """
+
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        registry.count_user_call()
+        started = time.perf_counter()
+        outcome = 'ok'
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter:
+            outcome = 'retry_after'
+            raise
+        except Exception as e:
+            outcome = type(e).__name__
+            raise
+        finally:
+            telegram_latency.observe(time.perf_counter() - started, name)
+            telegram_requests.inc(name, outcome)
+
+
+class UpdateMetrics(BaseMiddleware):
+    """
+    Dispatcher middleware timing the handling of every update.
+
+    It also sets current_user, so the external calls made while handling the update, and by
+    strategy tasks started from it, are tallied for the user.
+    """
+
+    async def __call__(self, handler, event, data):
+        user = data.get('event_from_user')
+        token = current_user.set(user.id if user is not None else None)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            update_latency.observe(time.perf_counter() - started, event.event_type)
+            current_user.reset(token)
+
+
+async def start_metrics_server(host, port):
+    """
+    Serve the metrics in the Prometheus text format at /metrics.
+
+    Args:
+        host (str): The host to listen on.
+        port (int): The port.
+
+    Returns:
+        aiohttp.web.AppRunner: The runner, to be cleaned up on shutdown.
+    """
+    async def metrics(request):
+        return web.Response(text=registry.render(), content_type='text/plain', charset='utf-8')
+
+    app = web.Application()
+    app.router.add_get('/metrics', metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def _seconds(value):
+    return '-' if value is None else f'{value * 1000:.0f} ms' if value < 1 else f'{value:.1f} s'
+
+
+def summary(top_users=10):
+    """
+    Summarize the metrics for a chat message.
+
+    Args:
+        top_users (int, optional): The number of users with the most calls to list. Defaults to 10.
+
+    Returns:
+        str: Count, p50 and p99 of every latency series, request outcomes and the busiest users.
+    """
+    lines = []
+    for metric in registry.metrics:
+        if isinstance(metric, Histogram) and metric.values:
+            lines.append(f'<b>{metric.name}</b>')
+            for label_values, series in sorted(metric.values.items()):
+                lines.append(f"{' '.join(map(str, label_values)) or 'all'}: n={series[2]} "
+                             f"p50={_seconds(metric.quantile(0.5, *label_values))} "
+                             f"p99={_seconds(metric.quantile(0.99, *label_values))}")
+        elif isinstance(metric, Counter) and metric.values:
+            errors = {key: value for key, value in metric.values.items() if key[-1] != 'ok'}
+            lines.append(f'<b>{metric.name}</b>: {sum(metric.values.values())} total, '
+                         f'{sum(errors.values())} failed')
+    if registry.user_calls:
+        lines.append('<b>Calls per user</b>')
+        lines.extend(f'{user}: {count}' for user, count in registry.user_calls.most_common(top_users))
+    return '\n'.join(lines) or 'No metrics yet'
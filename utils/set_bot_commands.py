@@ -1,5 +1,5 @@
 from aiogram import types
-from loader import bot
+from loader import get_bot
 
 
 async def set_default_commands():
@@ -24,4 +24,4 @@ async def set_default_commands():
     bot_commands = [types.BotCommand(command=cmd_desc[0], description=cmd_desc[1]) for cmd_desc in commands]
 
     # Set the parsed commands as default commands for the bot
-    await bot.set_my_commands(bot_commands)
+    await get_bot().set_my_commands(bot_commands)
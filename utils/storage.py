@@ -0,0 +1,113 @@
+import asyncio
+import json
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.memory import MemoryStorage, SimpleEventIsolation
+
+from loader import FSM_STORAGE, FSM_SQLITE_PATH, REDIS_URL, FSM_TTL
+
+
+def dumps(data):
+    # Compact JSON, FSM data is small and written on every step of a dialogue
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+
+
+def storage_key(key):
+    """
+    Build the string key of an FSM storage key.
+
+    Args:
+        key (aiogram.fsm.storage.base.StorageKey): The storage key.
+
+    Returns:
+        str: The bot, chat, user and thread ids and the destiny joined by colons.
+    """
+    return f'{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ""}:{key.destiny}'
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM storage in a SQLite database file.
+
+    States and data survive a restart, and several bot processes on one host can share the
+    file: the database runs in WAL mode, so readers do not block the writer. Queries run on a
+    single worker thread that owns the connection.
+    """
+
+    def __init__(self, path=FSM_SQLITE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='fsm-sqlite')
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS fsm ('
+                                 'key TEXT PRIMARY KEY, state TEXT, data TEXT)')
+
+    async def _read(self, query, *params):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._fetch, query, params)
+
+    async def _write(self, query, key, value):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._upsert, query, key, value)
+
+    def _fetch(self, query, params):
+        return self._connection.execute(query, params).fetchone()
+
+    def _upsert(self, query, key, value):
+        self._connection.execute(query, (key, value))
+        if value is None:
+            # Keys without a state and data are not kept
+            self._connection.execute('DELETE FROM fsm WHERE key = ? AND state IS NULL AND data IS NULL', (key,))
+
+    async def set_state(self, key, state=None):
+        state = state.state if isinstance(state, State) else state
+        await self._write('INSERT INTO fsm (key, state) VALUES (?, ?) '
+                          'ON CONFLICT (key) DO UPDATE SET state = excluded.state', storage_key(key), state)
+
+    async def get_state(self, key):
+        row = await self._read('SELECT state FROM fsm WHERE key = ?', storage_key(key))
+        return row[0] if row else None
+
+    async def set_data(self, key, data):
+        await self._write('INSERT INTO fsm (key, data) VALUES (?, ?) '
+                          'ON CONFLICT (key) DO UPDATE SET data = excluded.data',
+                          storage_key(key), dumps(data) if data else None)
+
+    async def get_data(self, key):
+        row = await self._read('SELECT data FROM fsm WHERE key = ?', storage_key(key))
+        return json.loads(row[0]) if row and row[0] else {}
+
+    async def close(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._connection.close)
+        self._executor.shutdown()
+
+
+def create_storage(backend=FSM_STORAGE):
+    """
+    Create the FSM storage and event isolation of the dispatcher.
+
+    Args:
+        backend (str, optional): 'memory', 'sqlite' or 'redis'. Defaults to FSM_STORAGE.
+
+    Returns:
+        tuple: The storage and the event isolation. Redis storage isolates the events of a
+            chat with a lock in Redis, so several bot processes can serve the same users.
+    """
+    if backend == 'memory':
+        return MemoryStorage(), SimpleEventIsolation()
+    if backend == 'sqlite':
+        return SQLiteStorage(), SimpleEventIsolation()
+    if backend == 'redis':
+        # Imported here, redis is only needed by deployments using it
+        from aiogram.fsm.storage.redis import RedisStorage
+        storage = RedisStorage.from_url(REDIS_URL, state_ttl=FSM_TTL, data_ttl=FSM_TTL, json_dumps=dumps)
+        return storage, storage.create_isolation()
+    raise ValueError(f'Unknown FSM storage: {backend}')
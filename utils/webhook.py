@@ -0,0 +1,168 @@
+import asyncio
+import hmac
+import logging
+import signal
+
+from aiogram.types import Update
+from aiohttp import web
+
+from loader import (WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT,
+                    UPDATE_QUEUE_SIZE, UPDATE_WORKERS, DRAIN_TIMEOUT)
+
+# Seconds a webhook request waits for queue space before Telegram is asked to retry
+ENQUEUE_TIMEOUT = 5
+
+
+def update_chat_id(update):
+    """
+    Get the chat an update belongs to.
+
+    Args:
+        update (aiogram.types.Update): The update.
+
+    Returns:
+        int: The chat id, or the user id or update id for updates without a chat.
+    """
+    event = update.event
+    chat = getattr(event, 'chat', None) or getattr(getattr(event, 'message', None), 'chat', None)
+    if chat is not None:
+        return chat.id
+    user = getattr(event, 'from_user', None)
+    return user.id if user is not None else update.update_id
+
+
+class UpdateWorkerPool:
+    """
+    Bounded queue of incoming updates processed by a fixed number of workers.
+
+    Updates are sharded by chat, so the updates of a chat are processed one after another
+    in the order they arrived while different chats are processed concurrently.
+    """
+
+    def __init__(self, dp, bot, workers=UPDATE_WORKERS, queue_size=UPDATE_QUEUE_SIZE):
+        if workers < 1:
+            raise ValueError(f'UPDATE_WORKERS must be at least 1, got {workers}')
+        self.dp = dp
+        self.bot = bot
+        # The same handler data start_polling() provides
+        self.workflow_data = {'dispatcher': dp, 'bots': [bot], **dp.workflow_data}
+        self._queues = [asyncio.Queue(max(1, queue_size // workers)) for _ in range(workers)]
+        self._tasks = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._work(queue)) for queue in self._queues]
+
+    async def put(self, update, timeout=ENQUEUE_TIMEOUT):
+        """
+        Queue an update, waiting for space in the queue of its chat.
+
+        Args:
+            update (aiogram.types.Update): The update.
+            timeout (float, optional): Seconds to wait for space. Defaults to ENQUEUE_TIMEOUT.
+
+        Returns:
+            bool: False if the queue stayed full.
+        """
+        queue = self._queues[hash(update_chat_id(update)) % len(self._queues)]
+        try:
+            await asyncio.wait_for(queue.put(update), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def drain(self, timeout=DRAIN_TIMEOUT):
+        """
+        Wait until the queued updates are processed, then stop the workers.
+
+        Args:
+            timeout (float, optional): Seconds to wait for the queues. Defaults to DRAIN_TIMEOUT.
+
+        Returns:
+            None
+        """
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self._queues)), timeout)
+        except asyncio.TimeoutError:
+            left = sum(queue.qsize() for queue in self._queues)
+            logging.warning('Update queue not drained in %s s, %s updates left', timeout, left)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _work(self, queue):
+        while True:
+            update = await queue.get()
+            try:
+                await self.dp.feed_update(self.bot, update, **self.workflow_data)
+            except Exception:
+                logging.exception('Failed to process update %s', update.update_id)
+            finally:
+                queue.task_done()
+
+
+def webhook_app(pool, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET):
+    """
+    Create the aiohttp application receiving updates from Telegram.
+
+    Args:
+        pool (UpdateWorkerPool): The pool processing the updates.
+        path (str, optional): The webhook path. Defaults to WEBHOOK_PATH.
+        secret (str, optional): The secret token Telegram sends with every update. Defaults to WEBHOOK_SECRET.
+
+    Returns:
+        aiohttp.web.Application: The application.
+    """
+    async def receive(request):
+        token = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+        if secret and not hmac.compare_digest(token, secret):
+            return web.Response(status=401)
+        update = Update.model_validate(await request.json(), context={'bot': pool.bot})
+        if not await pool.put(update):
+            # Telegram delivers the update again later
+            return web.Response(status=503)
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(path, receive)
+    return app
+
+
+async def run_webhook(dp, bot):
+    """
+    Serve updates through a webhook until SIGINT or SIGTERM.
+
+    Registers the webhook without dropping the updates Telegram holds for the bot, processes
+    updates with an UpdateWorkerPool and on shutdown stops accepting updates and processes
+    the queued ones before returning.
+
+    Args:
+        dp (aiogram.Dispatcher): The dispatcher.
+        bot (aiogram.Bot): The bot.
+
+    Returns:
+        None
+    """
+    pool = UpdateWorkerPool(dp, bot)
+    runner = web.AppRunner(webhook_app(pool))
+    await runner.setup()
+    await dp.emit_startup(bot=bot, **pool.workflow_data)
+    pool.start()
+    try:
+        await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+        await bot.set_webhook(WEBHOOK_URL + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET or None,
+                              allowed_updates=dp.resolve_used_update_types(), drop_pending_updates=False)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except NotImplementedError:
+                # Not available on Windows, KeyboardInterrupt cancels the run instead
+                pass
+        await stop.wait()
+    finally:
+        # Refuse new requests first, Telegram keeps them until the next start
+        await runner.cleanup()
+        await pool.drain()
+        await dp.emit_shutdown(bot=bot, **pool.workflow_data)
+        await bot.session.close()